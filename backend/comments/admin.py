@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Comment
+from lookbook.response_cache import bump_generation_on_commit
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
@@ -18,11 +19,13 @@ class CommentAdmin(admin.ModelAdmin):
     def hide_comments(self, request, queryset):
         """Bulk action to hide comments"""
         updated = queryset.update(is_hidden=True)
+        bump_generation_on_commit('posts')
         self.message_user(request, f'{updated} comment(s) hidden successfully.')
     hide_comments.short_description = 'Hide selected comments'
     
     def unhide_comments(self, request, queryset):
         """Bulk action to unhide comments"""
         updated = queryset.update(is_hidden=False)
+        bump_generation_on_commit('posts')
         self.message_user(request, f'{updated} comment(s) unhidden successfully.')
     unhide_comments.short_description = 'Unhide selected comments'
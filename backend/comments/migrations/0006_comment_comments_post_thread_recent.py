@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0005_comment_is_deleted'),
+        ('posts', '0009_post_posts_post_recent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'parent', '-created_at', '-id'], name='comments_post_thread_recent'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+PATH_STEP = 10
+
+
+def backfill_paths(apps, schema_editor):
+    Comment = apps.get_model('comments', 'Comment')
+    parents = dict(Comment.objects.values_list('id', 'parent_id'))
+    paths = {}
+
+    def build(comment_id):
+        if comment_id not in paths:
+            parent_id = parents[comment_id]
+            segment = str(comment_id).zfill(PATH_STEP)
+            paths[comment_id] = build(parent_id) + '/' + segment if parent_id else segment
+        return paths[comment_id]
+
+    batch = []
+    for comment_id in parents:
+        path = build(comment_id)
+        batch.append(Comment(id=comment_id, path=path, depth=path.count('/')))
+    Comment.objects.bulk_update(batch, ['path', 'depth'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0006_comment_comments_post_thread_recent'),
+        ('posts', '0009_post_posts_post_recent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=231),
+        ),
+        migrations.RunPython(backfill_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comments_post_path'),
+        ),
+    ]
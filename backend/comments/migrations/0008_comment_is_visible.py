@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def hide_inactive_authors(apps, schema_editor):
+    Comment = apps.get_model('comments', 'Comment')
+    Comment.objects.filter(author__is_active=False).update(is_visible=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0007_comment_path'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='is_visible',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.RunPython(hide_inactive_authors, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,35 @@ from django.db import models
 from django.conf import settings
 from posts.models import Post
 
+# Materialized path: one zero-padded id per level, so sorting by path walks
+# a thread depth-first and a subtree is the single range
+# `prefix < path < prefix + '0'` ('0' is the character after the separator;
+# unlike LIKE, a plain btree index serves it under any collation)
+PATH_STEP = 10
+PATH_SEPARATOR = '/'
+PATH_SEPARATOR_NEXT = chr(ord(PATH_SEPARATOR) + 1)
+MAX_DEPTH = 20
+
+
+def path_segment(comment_id):
+    return str(comment_id).zfill(PATH_STEP)
+
+
+class CommentQuerySet(models.QuerySet):
+    def thread(self, post_id):
+        """Every comment of a post in thread (depth-first) order"""
+        return self.filter(post_id=post_id).order_by('path')
+
+    def subtree(self, comment):
+        """All descendants of `comment` in thread order"""
+        return self.filter(
+            post_id=comment.post_id, path__gt=comment.path, path__lt=comment.path + PATH_SEPARATOR_NEXT
+        ).order_by('path')
+
+    def children(self, comment):
+        return self.subtree(comment).filter(depth=comment.depth + 1)
+
+
 class Comment(models.Model):
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='comments')
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
@@ -9,11 +38,38 @@ class Comment(models.Model):
     content = models.TextField()
     is_hidden = models.BooleanField(default=False)
     is_deleted = models.BooleanField(default=False)
+    # False while the author is deactivated (see users.moderation)
+    is_visible = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    path = models.CharField(max_length=(PATH_STEP + 1) * (MAX_DEPTH + 1), blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    objects = CommentQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.author.username} - {self.content[:50]}"
 
+    def save(self, *args, **kwargs):
+        creating = self._state.adding
+        if creating:
+            self.is_visible = self.author.is_active
+        super().save(*args, **kwargs)
+        # The path ends with our own id, which only exists after the insert
+        if creating and not self.path:
+            if self.parent_id:
+                parent = self.parent
+                self.path = parent.path + PATH_SEPARATOR + path_segment(self.pk)
+                self.depth = parent.depth + 1
+            else:
+                self.path = path_segment(self.pk)
+            Comment.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of a post's top-level comments
+            models.Index(fields=['post', 'parent', '-created_at', '-id'], name='comments_post_thread_recent'),
+            # Whole threads and subtrees as one ordered range scan
+            models.Index(fields=['post', 'path'], name='comments_post_path'),
+        ]
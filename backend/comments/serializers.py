@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Comment
+from .models import Comment, MAX_DEPTH
 from users.serializers import UserSerializer
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -9,19 +9,33 @@ class CommentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Comment
-        fields = ['id', 'author', 'post', 'parent', 'content', 'created_at', 'updated_at', 'replies', 'replies_count', 'is_hidden', 'is_deleted']
-        read_only_fields = ['id', 'created_at', 'updated_at', 'is_hidden', 'is_deleted']
+        fields = ['id', 'author', 'post', 'parent', 'content', 'created_at', 'updated_at', 'replies', 'replies_count', 'is_hidden', 'is_deleted', 'depth']
+        read_only_fields = ['id', 'created_at', 'updated_at', 'is_hidden', 'is_deleted', 'depth']
+
+    def validate(self, attrs):
+        parent = attrs.get('parent')
+        if parent is not None:
+            if parent.post_id != attrs.get('post', getattr(self.instance, 'post', None)).id:
+                raise serializers.ValidationError({'parent': 'Reply must belong to the same post'})
+            if parent.depth >= MAX_DEPTH:
+                raise serializers.ValidationError({'parent': 'Reply thread is too deep'})
+        return attrs
 
     def get_author(self, obj):
         return UserSerializer(obj.author, context=self.context).data
 
     def get_replies(self, obj):
-        # Include all replies for top-level comments from active users (including hidden/deleted)
-        if obj.parent is None:
-            replies = obj.replies.filter(author__is_active=True)
+        # Preloaded by comments.threads.load_replies on list endpoints
+        if hasattr(obj, 'loaded_replies'):
+            return CommentSerializer(obj.loaded_replies, many=True, context=self.context).data
+        # Include all visible replies (active authors) for top-level comments, including hidden/deleted
+        if obj.parent_id is None:
+            replies = obj.replies.filter(is_visible=True)
             return CommentSerializer(replies, many=True, context=self.context).data
         return []
 
     def get_replies_count(self, obj):
-        # Count all replies from active users (including hidden/deleted)
-        return obj.replies.filter(author__is_active=True).count()
+        # Count all visible replies (including hidden/deleted)
+        if hasattr(obj, 'replies_total'):
+            return obj.replies_total
+        return obj.replies.filter(is_visible=True).count()
@@ -1,3 +1,121 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from posts.models import Post
+from .models import Comment
+
+User = get_user_model()
+
+
+class CommentThreadTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.viewer = User.objects.create(username='viewer')
+        self.post = Post.objects.create(author=self.viewer, content='hello')
+        self.url = f'/api/comments/post/{self.post.id}/'
+        self.client.force_authenticate(self.viewer)
+
+    def _thread(self, top_level, replies_each):
+        for i in range(top_level):
+            author = User.objects.create(username=f'c{Comment.objects.count()}')
+            parent = Comment.objects.create(author=author, post=self.post, content=f'top {i}')
+            for j in range(replies_each):
+                replier = User.objects.create(username=f'r{Comment.objects.count()}')
+                reply = Comment.objects.create(author=replier, post=self.post, parent=parent, content=f'reply {j}')
+                Comment.objects.create(author=author, post=self.post, parent=reply, content='nested')
+
+    def _queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.data
+
+    def test_thread_query_count_is_constant(self):
+        self._thread(1, 1)
+        self.client.get(self.url)  # warm the viewer's block set
+        small, _ = self._queries()
+
+        self._thread(9, 5)
+        large, data = self._queries()
+
+        self.assertEqual(len(data['results']), 10)
+        self.assertEqual(small, large)
+        # ETag state, top-level page, replies
+        self.assertEqual(large, 3)
+
+    def test_tree_matches_per_comment_queries(self):
+        self._thread(3, 2)
+        inactive = User.objects.create(username='gone', is_active=False)
+        top = Comment.objects.filter(parent__isnull=True).first()
+        Comment.objects.create(author=inactive, post=self.post, parent=top, content='hidden author')
+
+        _, data = self._queries()
+        for item in data['results']:
+            comment = Comment.objects.get(pk=item['id'])
+            expected = list(
+                comment.replies.filter(author__is_active=True).order_by('-created_at', '-id').values_list('id', flat=True)
+            )
+            self.assertEqual([reply['id'] for reply in item['replies']], expected)
+            self.assertEqual(item['replies_count'], len(expected))
+            for reply in item['replies']:
+                self.assertEqual(reply['replies'], [])
+                self.assertEqual(reply['replies_count'], 1)
+
+
+class CommentPathTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='user')
+        self.post = Post.objects.create(author=self.user, content='hello')
+        self.client.force_authenticate(self.user)
+
+    def _comment(self, parent=None):
+        return Comment.objects.create(author=self.user, post=self.post, parent=parent, content='x')
+
+    def test_subtree_is_one_ordered_range(self):
+        a = self._comment()
+        b = self._comment()
+        a1 = self._comment(a)
+        b1 = self._comment(b)
+        a1x = self._comment(a1)
+        a2 = self._comment(a)
+
+        self.assertEqual((a.depth, a1.depth, a1x.depth), (0, 1, 2))
+        self.assertEqual(list(Comment.objects.thread(self.post.id)), [a, a1, a1x, a2, b, b1])
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(list(Comment.objects.subtree(a)), [a1, a1x, a2])
+        self.assertEqual(len(ctx.captured_queries), 1)
+        # A range, not LIKE, so the (post, path) index serves it under any collation
+        self.assertNotIn('LIKE', ctx.captured_queries[0]['sql'].upper())
+        self.assertEqual(list(Comment.objects.children(a)), [a1, a2])
+
+    def test_load_more_replies(self):
+        parent = self._comment()
+        replies = [self._comment(parent) for _ in range(5)]
+        nested = self._comment(replies[0])
+        url = f'/api/comments/{parent.id}/replies/?page_size=3'
+
+        first = self.client.get(url)
+        self.assertEqual([r['id'] for r in first.data['results']], [r.id for r in replies[:3]])
+        self.assertEqual(first.data['results'][0]['replies_count'], 1)
+        second = self.client.get(first.data['next'])
+        self.assertEqual([r['id'] for r in second.data['results']], [r.id for r in replies[3:]])
+
+        everything = self.client.get(f'/api/comments/{parent.id}/replies/?all=1')
+        self.assertEqual([r['id'] for r in everything.data['results']][:2], [replies[0].id, nested.id])
+
+    def test_parent_must_share_post_and_cannot_move(self):
+        other_post = Post.objects.create(author=self.user, content='other')
+        parent = self._comment()
+        response = self.client.post(
+            f'/api/comments/post/{other_post.id}/', {'post': other_post.id, 'parent': parent.id, 'content': 'x'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+        reply = self._comment(parent)
+        self.client.patch(f'/api/comments/{reply.id}/', {'parent': '', 'content': 'edited'})
+        reply.refresh_from_db()
+        self.assertEqual((reply.parent_id, reply.content), (parent.id, 'edited'))
@@ -0,0 +1,54 @@
+"""
+Batched loading of comment threads.
+
+A page of top-level comments gets all of its replies in one query (authors
+joined, reply counts annotated) and the tree is assembled in memory, so a
+thread costs the same number of queries however many comments it has.
+"""
+from collections import defaultdict
+
+from django.db.models import Count, Q
+
+from .models import Comment
+
+
+def visible_replies_count():
+    return Count('replies', filter=Q(replies__is_visible=True))
+
+
+def load_replies(comments):
+    """Attach `loaded_replies` to each top-level comment in `comments`"""
+    comments = list(comments)
+    if not comments:
+        return comments
+    return _attach_replies(comments, _replies_of(comments))
+
+
+async def aload_replies(comments):
+    """load_replies() with the async ORM"""
+    comments = list(comments)
+    if not comments:
+        return comments
+    return _attach_replies(comments, [reply async for reply in _replies_of(comments)])
+
+
+def _replies_of(comments):
+    return (
+        Comment.objects.filter(parent_id__in=[c.id for c in comments], is_visible=True)
+        .select_related('author')
+        .annotate(replies_total=visible_replies_count())
+        .order_by('-created_at', '-id')
+    )
+
+
+def _attach_replies(comments, replies):
+    by_parent = defaultdict(list)
+    for reply in replies:
+        # Only top-level comments show their replies inline
+        reply.loaded_replies = []
+        by_parent[reply.parent_id].append(reply)
+
+    for comment in comments:
+        comment.loaded_replies = by_parent[comment.id]
+        comment.replies_total = len(comment.loaded_replies)
+    return comments
@@ -1,7 +1,8 @@
 from django.urls import path
-from .views import CommentListCreateView, CommentDetailView
+from .views import CommentListCreateView, CommentDetailView, CommentRepliesView
 
 urlpatterns = [
     path('post/<int:post_id>/', CommentListCreateView.as_view(), name='comment-list-create'),
     path('<int:pk>/', CommentDetailView.as_view(), name='comment-detail'),
+    path('<int:pk>/replies/', CommentRepliesView.as_view(), name='comment-replies'),
 ]
@@ -1,10 +1,29 @@
 from rest_framework import generics, permissions
+from django.db import transaction
+from django.db.models import Count, F, Max, Q
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from lookbook.asyncviews import AsyncListMixin
+from lookbook.conditional import ConditionalGetMixin
+from lookbook.events import post_channel, publish
+from lookbook.metrics import InstrumentedViewMixin
+from lookbook.response_cache import CachedResponseMixin, bump_generation_on_commit
+from posts.models import Post
 from .models import Comment
 from .serializers import CommentSerializer
+from .threads import visible_replies_count, load_replies, aload_replies
 
-class CommentListCreateView(generics.ListCreateAPIView):
+def _publish_comments(comment, event):
+    """Push the comment's id and place in the thread; clients fetch the content if they show it"""
+    comments_count = Post.objects.filter(pk=comment.post_id).values_list('comments_count', flat=True).first()
+    publish(post_channel(comment.post_id), event, post=comment.post_id, comment=comment.pk,
+            parent=comment.parent_id, depth=comment.depth, actor=comment.author_id, comments_count=comments_count)
+
+class CommentListCreateView(AsyncListMixin, InstrumentedViewMixin, ConditionalGetMixin, CachedResponseMixin, generics.ListCreateAPIView):
+    query_budget = 4
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    cache_scopes = ('posts',)
 
     def get_queryset(self):
         post_id = self.kwargs.get('post_id')
@@ -12,23 +31,78 @@ class CommentListCreateView(generics.ListCreateAPIView):
         return Comment.objects.filter(
             post_id=post_id, 
             parent__isnull=True,
-            author__is_active=True
+            is_visible=True
+        ).select_related('author')
+
+    def paginate_queryset(self, queryset):
+        # Paginate top-level comments, then load their replies in one query
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            load_replies(page)
+        return page
+
+    async def aload_page(self, rows):
+        return await aload_replies(rows)
+
+    def get_etag_state(self, request, rows=None):
+        # Replies are nested in their parent, so fingerprint the whole thread.
+        # Moderation flips the flags with queryset.update(), leaving updated_at alone.
+        return Comment.objects.filter(post_id=self.kwargs.get('post_id'), is_visible=True).aggregate(
+            count=Count('id'),
+            hidden=Count('id', filter=Q(is_hidden=True)),
+            deleted=Count('id', filter=Q(is_deleted=True)),
+            updated=Max('updated_at'),
+            authors_updated=Max('author__updated_at'),
         )
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        with transaction.atomic():
+            comment = serializer.save(author=self.request.user)
+            Post.objects.filter(pk=comment.post_id).update(comments_count=F('comments_count') + 1)
+            _publish_comments(comment, 'comment')
 
-class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Comment.objects.all()
+class CommentRepliesView(InstrumentedViewMixin, generics.ListAPIView):
+    """
+    "Load more replies" under a comment, in thread order. Direct replies by
+    default; `?all=1` returns the whole subtree with `depth` for indenting.
+    """
+    query_budget = 3
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    keyset_ordering = ('path',)
+
+    def get_queryset(self):
+        parent = get_object_or_404(Comment.objects.only('post_id', 'path', 'depth'), pk=self.kwargs['pk'])
+        if self.request.query_params.get('all') in ('1', 'true'):
+            queryset = Comment.objects.subtree(parent)
+        else:
+            queryset = Comment.objects.children(parent)
+        return (
+            queryset.filter(is_visible=True)
+            .select_related('author')
+            .annotate(replies_total=visible_replies_count())
+        )
+
+class CommentDetailView(InstrumentedViewMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Comment.objects.select_related('author').annotate(replies_total=visible_replies_count())
+    serializer_class = CommentSerializer
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    query_budget = 3
+
+    def get_object(self):
+        # Nest the replies of a top-level comment with one query, as the lists do
+        comment = super().get_object()
+        if self.request.method == 'GET' and comment.parent_id is None:
+            load_replies([comment])
+        return comment
 
     def perform_update(self, serializer):
         # Only allow author to edit
         if serializer.instance.author != self.request.user:
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("You can only edit your own comments")
-        serializer.save()
+        # Comments can't be moved: their path and the post counters depend on it
+        serializer.save(post=serializer.instance.post, parent=serializer.instance.parent)
 
     def perform_destroy(self, instance):
         # Only allow author or admin to delete
@@ -36,5 +110,12 @@ class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("You can only delete your own comments")
         # Soft delete: mark as deleted instead of actually deleting
-        instance.is_deleted = True
-        instance.save()
+        # (conditional UPDATE so concurrent deletes only decrement once)
+        with transaction.atomic():
+            updated = Comment.objects.filter(pk=instance.pk, is_deleted=False).update(
+                is_deleted=True, updated_at=timezone.now()
+            )
+            if updated:
+                Post.objects.filter(pk=instance.post_id).update(comments_count=F('comments_count') - 1)
+                bump_generation_on_commit('posts')
+                _publish_comments(instance, 'comment_deleted')
@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from friends.suggestions import refresh_suggestions
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Recompute ranked friend suggestions for all active users (run periodically)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Users whose neighbourhoods are loaded and scored together')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        user_ids = User.objects.filter(is_active=True).order_by('pk').values_list('pk', flat=True)
+        batch = []
+        total = 0
+        for user_id in user_ids.iterator():
+            batch.append(user_id)
+            if len(batch) >= batch_size:
+                refresh_suggestions(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            refresh_suggestions(batch)
+            total += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt suggestions for {total} user(s)'))
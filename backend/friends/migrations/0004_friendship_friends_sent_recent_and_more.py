@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('friends', '0003_alter_friendship_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(fields=['from_user', 'status', '-created_at', '-id'], name='friends_sent_recent'),
+        ),
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(fields=['to_user', 'status', '-created_at', '-id'], name='friends_received_recent'),
+        ),
+    ]
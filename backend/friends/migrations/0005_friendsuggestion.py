@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('friends', '0004_friendship_friends_sent_recent_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FriendSuggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.PositiveIntegerField(default=0)),
+                ('mutual_friends', models.PositiveIntegerField(default=0)),
+                ('shared_groups', models.PositiveIntegerField(default=0)),
+                ('shared_pages', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('suggested', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='friend_suggestions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-score', 'suggested'],
+                'indexes': [models.Index(fields=['user', '-score'], name='friends_suggestion_rank')],
+                'unique_together': {('user', 'suggested')},
+            },
+        ),
+    ]
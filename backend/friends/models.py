@@ -1,6 +1,14 @@
 from django.db import models
 from django.conf import settings
 
+class FriendshipQuerySet(models.QuerySet):
+    def friend_ids(self, user_id):
+        """Ids of users with an accepted friendship with user_id, in either direction"""
+        accepted = self.filter(status='accepted')
+        sent = accepted.filter(from_user_id=user_id).values_list('to_user_id', flat=True)
+        received = accepted.filter(to_user_id=user_id).values_list('from_user_id', flat=True)
+        return set(sent) | set(received)
+
 class Friendship(models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
@@ -15,9 +23,38 @@ class Friendship(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = FriendshipQuerySet.as_manager()
+
     class Meta:
         unique_together = ('from_user', 'to_user')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['from_user', 'status', '-created_at', '-id'], name='friends_sent_recent'),
+            models.Index(fields=['to_user', 'status', '-created_at', '-id'], name='friends_received_recent'),
+        ]
 
     def __str__(self):
         return f"{self.from_user.username} -> {self.to_user.username} ({self.status})"
+
+class FriendSuggestion(models.Model):
+    """
+    Precomputed "people you may know" row, ranked by mutual friends and
+    shared groups/pages. Maintained by friends.suggestions.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='friend_suggestions')
+    suggested = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    score = models.PositiveIntegerField(default=0)
+    mutual_friends = models.PositiveIntegerField(default=0)
+    shared_groups = models.PositiveIntegerField(default=0)
+    shared_pages = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'suggested')
+        ordering = ['-score', 'suggested']
+        indexes = [
+            models.Index(fields=['user', '-score'], name='friends_suggestion_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.suggested_id} suggested to {self.user_id} ({self.score})"
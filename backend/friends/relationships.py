@@ -0,0 +1,34 @@
+from django.db.models import Q
+
+from users.blocks import block_set_for
+from .models import Friendship
+
+
+class RelationshipSnapshot:
+    """
+    The request user's friendships (both directions, with both users joined)
+    and block set, loaded once so a view can answer any number of
+    relationship questions without further queries.
+    """
+
+    def __init__(self, request, friendships=None):
+        self.user = request.user
+        if friendships is None:
+            friendships = list(self._friendships_of(request.user))
+        self.friendships = friendships
+        blocks = block_set_for(request)
+        self.blocked_ids = blocks.blocked_ids
+        self.blocked_me_ids = blocks.blocked_me_ids
+
+    @classmethod
+    async def aload(cls, request):
+        """RelationshipSnapshot(request) with the async ORM; the block set must be memoized already"""
+        return cls(request, [f async for f in cls._friendships_of(request.user)])
+
+    @staticmethod
+    def _friendships_of(user):
+        return Friendship.objects.filter(Q(from_user=user) | Q(to_user=user)).select_related('from_user', 'to_user')
+
+    def other(self, friendship):
+        """The user on the other side of friendship"""
+        return friendship.to_user if friendship.from_user_id == self.user.id else friendship.from_user
@@ -0,0 +1,194 @@
+"""
+Friend suggestions ranked by mutual friends and shared groups/pages.
+
+Candidates are the user's friends-of-friends plus co-members of their
+groups and co-followers of their pages. The neighbourhood of a batch of
+users is loaded into sparse adjacency sets with a handful of queries per
+batch, scored in memory, and the top FRIEND_SUGGESTIONS_LIMIT per user are
+stored in FriendSuggestion. Serving is then one indexed query.
+
+Accepting or removing a friend re-ranks both users with schedule_refresh(),
+in a background thread after the transaction commits, so the request
+doesn't wait for their neighbourhood to load.
+"""
+import logging
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Q
+
+from groups.models import GroupMember
+from pages.models import PageFollower
+from users.blocks import get_block_sets
+from .models import Friendship, FriendSuggestion
+
+User = get_user_model()
+
+logger = logging.getLogger(__name__)
+
+MUTUAL_FRIEND_WEIGHT = 3
+SHARED_GROUP_WEIGHT = 1
+SHARED_PAGE_WEIGHT = 1
+
+# Keeps `IN (...)` lists under SQLite's bound-parameter limit
+CHUNK_SIZE = 500
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+def _accepted_edges(user_ids):
+    """Adjacency sets of accepted friendships touching user_ids"""
+    adjacency = defaultdict(set)
+    for chunk in _chunks(user_ids):
+        rows = Friendship.objects.filter(
+            Q(from_user_id__in=chunk) | Q(to_user_id__in=chunk), status='accepted'
+        ).values_list('from_user_id', 'to_user_id')
+        for a, b in rows:
+            adjacency[a].add(b)
+            adjacency[b].add(a)
+    return adjacency
+
+
+def _memberships(model, container, user_ids):
+    """
+    (user -> containers, container -> users) for groups or pages the users
+    belong to, skipping containers above FRIEND_SUGGESTIONS_MAX_GROUP_SIZE
+    """
+    counter = 'members_count' if container == 'group' else 'followers_count'
+    max_size = settings.FRIEND_SUGGESTIONS_MAX_GROUP_SIZE
+    containers_of = defaultdict(set)
+    for chunk in _chunks(user_ids):
+        rows = model.objects.filter(
+            user_id__in=chunk, **{f'{container}__{counter}__lte': max_size}
+        ).values_list('user_id', f'{container}_id')
+        for user_id, container_id in rows:
+            containers_of[user_id].add(container_id)
+
+    users_of = defaultdict(set)
+    for chunk in _chunks(set().union(*containers_of.values())):
+        rows = model.objects.filter(**{f'{container}_id__in': chunk}).values_list(f'{container}_id', 'user_id')
+        for container_id, user_id in rows:
+            users_of[container_id].add(user_id)
+    return containers_of, users_of
+
+
+def _excluded_pairs(user_ids):
+    """Anyone the users already have a friendship row or a block with"""
+    excluded = defaultdict(set)
+    for chunk in _chunks(user_ids):
+        rows = Friendship.objects.filter(
+            Q(from_user_id__in=chunk) | Q(to_user_id__in=chunk)
+        ).values_list('from_user_id', 'to_user_id')
+        for a, b in rows:
+            excluded[a].add(b)
+            excluded[b].add(a)
+        for user_id, blocks in get_block_sets(chunk).items():
+            excluded[user_id] |= blocks.hidden_ids
+    return excluded
+
+
+def rank_suggestions(user_ids, limit=None):
+    """
+    Score candidates for each of user_ids.
+    Returns {user_id: [(candidate_id, score, mutual, groups, pages), ...]} best first.
+    """
+    limit = limit or settings.FRIEND_SUGGESTIONS_LIMIT
+    user_ids = set(user_ids)
+
+    friends = _accepted_edges(user_ids)
+    friends_of_friends = _accepted_edges(set().union(*(friends[u] for u in user_ids)))
+    groups_of, group_members = _memberships(GroupMember, 'group', user_ids)
+    pages_of, page_followers = _memberships(PageFollower, 'page', user_ids)
+    excluded = _excluded_pairs(user_ids)
+
+    scored = {}
+    for user_id in user_ids:
+        mutual = Counter()
+        for friend_id in friends[user_id]:
+            mutual.update(friends_of_friends[friend_id])
+        groups = Counter()
+        for group_id in groups_of[user_id]:
+            groups.update(group_members[group_id])
+        pages = Counter()
+        for page_id in pages_of[user_id]:
+            pages.update(page_followers[page_id])
+
+        skip = excluded[user_id] | friends[user_id] | {user_id}
+        candidates = (set(mutual) | set(groups) | set(pages)) - skip
+        scored[user_id] = sorted(
+            (
+                (c, MUTUAL_FRIEND_WEIGHT * mutual[c] + SHARED_GROUP_WEIGHT * groups[c] + SHARED_PAGE_WEIGHT * pages[c],
+                 mutual[c], groups[c], pages[c])
+                for c in candidates
+            ),
+            key=lambda row: (-row[1], row[0]),
+        )
+
+    # Drop inactive candidates, then keep the top `limit`
+    candidate_ids = {row[0] for rows in scored.values() for row in rows}
+    inactive = set()
+    for chunk in _chunks(candidate_ids):
+        inactive.update(User.objects.filter(id__in=chunk, is_active=False).values_list('id', flat=True))
+    return {
+        user_id: [row for row in rows if row[0] not in inactive][:limit]
+        for user_id, rows in scored.items()
+    }
+
+
+def refresh_suggestions(user_ids):
+    """Recompute and store suggestions for user_ids (incremental update)"""
+    ranked = rank_suggestions(user_ids)
+    with transaction.atomic():
+        FriendSuggestion.objects.filter(user_id__in=list(ranked)).delete()
+        FriendSuggestion.objects.bulk_create([
+            FriendSuggestion(user_id=user_id, suggested_id=candidate, score=score,
+                             mutual_friends=mutual, shared_groups=groups, shared_pages=pages)
+            for user_id, rows in ranked.items()
+            for candidate, score, mutual, groups, pages in rows
+        ])
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='suggestions')
+        return _executor
+
+
+def _refresh_in_worker(user_ids):
+    try:
+        refresh_suggestions(user_ids)
+    except Exception:
+        logger.exception('Suggestion refresh failed for %s', user_ids)
+    finally:
+        # Worker threads get their own connection; don't leak it
+        connection.close()
+
+
+def schedule_refresh(user_ids):
+    """refresh_suggestions() off the request, once the friendship change commits"""
+    user_ids = list(user_ids)
+    if not settings.FRIEND_SUGGESTIONS_ASYNC:
+        refresh_suggestions(user_ids)
+        return
+    transaction.on_commit(lambda: _get_executor().submit(_refresh_in_worker, user_ids))
+
+
+def discard_suggestion(user_a, user_b):
+    """Forget a pair immediately, e.g. once one of them blocks the other"""
+    FriendSuggestion.objects.filter(
+        Q(user_id=user_a, suggested_id=user_b) | Q(user_id=user_b, suggested_id=user_a)
+    ).delete()
@@ -1,3 +1,134 @@
-from django.test import TestCase
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from users.models import BlockedUser
+from groups.models import Group, GroupMember
+from .models import Friendship, FriendSuggestion
+from .suggestions import _refresh_in_worker, rank_suggestions, refresh_suggestions
+
+User = get_user_model()
+
+
+class FriendCategoriesTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='me')
+        self.client.force_authenticate(self.user)
+
+    def _add_relationships(self, count):
+        start = User.objects.count()
+        others = User.objects.bulk_create([User(username=f'u{start + i}') for i in range(count * 3)])
+        Friendship.objects.bulk_create(
+            [Friendship(from_user=self.user, to_user=u, status='accepted') for u in others[:count]] +
+            [Friendship(from_user=u, to_user=self.user, status='pending') for u in others[count:count * 2]]
+        )
+        BlockedUser.objects.bulk_create([BlockedUser(blocker=u, blocked=self.user) for u in others[::5]])
+
+    def _categories(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/friends/categories/')
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.data
+
+    def test_query_count_is_flat_as_friends_grow(self):
+        counts = []
+        for count in (1, 10, 100):
+            self._add_relationships(count)
+            # bulk_create skips the signals that invalidate block sets
+            cache.clear()
+            queries, _ = self._categories()
+            counts.append(queries)
+        # friendships, blocks, ranked suggestions, cold-start fallback
+        self.assertEqual(counts, [4, 4, 4])
+        # The block set is now served from the cache
+        self.assertEqual(self._categories()[0], 3)
+
+        # Once ranked suggestions exist the fallback query is skipped
+        friend = Friendship.objects.filter(from_user=self.user, status='accepted').first().to_user
+        Friendship.objects.create(from_user=friend, to_user=User.objects.create(username='fof'), status='accepted')
+        refresh_suggestions([self.user.id])
+        self.assertEqual(self._categories()[0], 2)
+
+    def test_categories_content(self):
+        friend = User.objects.create(username='friend')
+        sent = User.objects.create(username='sent')
+        received = User.objects.create(username='received')
+        stranger = User.objects.create(username='stranger')
+        BlockedUser.objects.create(blocker=User.objects.create(username='blocker'), blocked=self.user)
+        Friendship.objects.create(from_user=friend, to_user=self.user, status='accepted')
+        Friendship.objects.create(from_user=self.user, to_user=sent, status='pending')
+        Friendship.objects.create(from_user=received, to_user=self.user, status='pending')
+        BlockedUser.objects.create(blocker=friend, blocked=self.user)
+        BlockedUser.objects.create(blocker=self.user, blocked=stranger)
+
+        _, data = self._categories()
+        self.assertEqual([(f['username'], f['has_blocked_me']) for f in data['friends']], [('friend', True)])
+        self.assertEqual(
+            [(p['username'], p['request_type']) for p in data['pending']],
+            [('sent', 'sent'), ('received', 'received')],
+        )
+        # Users blocked either way are not suggested, even by the cold-start fallback
+        self.assertEqual(data['suggestions'], [])
+        BlockedUser.objects.filter(blocker=self.user, blocked=stranger).delete()
+        _, data = self._categories()
+        self.assertEqual([(s['username'], s['i_have_blocked']) for s in data['suggestions']], [('stranger', False)])
+
+
+class FriendSuggestionEngineTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.me, self.a, self.b, self.c, self.d, self.e = User.objects.bulk_create(
+            [User(username=name) for name in ('me', 'a', 'b', 'c', 'd', 'e')]
+        )
+        # me - a, me - b; c is friends with both a and b, d only with a
+        for x, y in ((self.me, self.a), (self.me, self.b), (self.a, self.c), (self.b, self.c), (self.a, self.d)):
+            Friendship.objects.create(from_user=x, to_user=y, status='accepted')
+        group = Group.objects.create(name='G', created_by=self.me, members_count=2)
+        GroupMember.objects.create(group=group, user=self.me)
+        GroupMember.objects.create(group=group, user=self.e)
+
+    def test_ranks_by_mutual_friends_then_shared_groups(self):
+        ranked = rank_suggestions([self.me.id])[self.me.id]
+        self.assertEqual(
+            [(row[0], row[2], row[3]) for row in ranked],
+            [(self.c.id, 2, 0), (self.d.id, 1, 0), (self.e.id, 0, 1)],
+        )
+
+    def test_excludes_pending_blocked_and_inactive(self):
+        Friendship.objects.create(from_user=self.me, to_user=self.c)
+        BlockedUser.objects.create(blocker=self.d, blocked=self.me)
+        User.objects.filter(pk=self.e.pk).update(is_active=False)
+        self.assertEqual(rank_suggestions([self.me.id])[self.me.id], [])
+
+    @override_settings(FRIEND_SUGGESTIONS_ASYNC=False)
+    def test_served_from_table_and_refreshed_on_accept(self):
+        refresh_suggestions([self.me.id])
+        self.client.force_authenticate(self.me)
+        data = self.client.get('/api/friends/categories/').data
+        self.assertEqual([s['id'] for s in data['suggestions']], [self.c.id, self.d.id, self.e.id])
+        self.assertEqual(data['suggestions'][0]['mutual_friends'], 2)
+
+        request = Friendship.objects.create(from_user=self.c, to_user=self.me)
+        self.client.post(f'/api/friends/accept/{request.id}/')
+        self.assertFalse(FriendSuggestion.objects.filter(user=self.me, suggested=self.c).exists())
+        # c's friends-of-friends now include d through a
+        self.assertTrue(FriendSuggestion.objects.filter(user=self.c, suggested=self.d).exists())
+
+    def test_refresh_runs_after_commit_off_the_request(self):
+        request = Friendship.objects.create(from_user=self.c, to_user=self.me)
+        self.client.force_authenticate(self.me)
+        with mock.patch('friends.suggestions._get_executor') as executor:
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.client.post(f'/api/friends/accept/{request.id}/')
+            executor.assert_not_called()
+            self.assertFalse(FriendSuggestion.objects.exists())
+            for callback in callbacks:
+                callback()
+        executor.return_value.submit.assert_called_once_with(_refresh_in_worker, [self.c.id, self.me.id])
 
-# Create your tests here.
@@ -1,139 +1,119 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.views import APIView
 from django.contrib.auth import get_user_model
 from django.db.models import Q
-from .models import Friendship
+from .models import Friendship, FriendSuggestion
+from .relationships import RelationshipSnapshot
+from .suggestions import schedule_refresh
 from .serializers import FriendshipSerializer
+from lookbook.asyncviews import AsyncReadMixin
+from lookbook.events import publish, user_channel
+from lookbook.metrics import InstrumentedViewMixin
 from users.serializers import UserSerializer
+from posts.timeline import sync_timeline
 
 User = get_user_model()
 
-class FriendshipListView(generics.ListAPIView):
+SUGGESTIONS_SHOWN = 20
+
+class FriendshipListView(InstrumentedViewMixin, generics.ListAPIView):
+    query_budget = 2
     serializer_class = FriendshipSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Friendship.objects.filter(
+        return (Friendship.objects.filter(
             from_user=self.request.user, status='accepted'
         ) | Friendship.objects.filter(
             to_user=self.request.user, status='accepted'
-        )
+        )).select_related('from_user', 'to_user')
 
-@api_view(['GET'])
-@permission_classes([permissions.IsAuthenticated])
-def get_friend_categories(request):
+def _category_entry(other, snapshot, **extra):
+    return {
+        'id': other.id,
+        'username': other.username,
+        'first_name': other.first_name,
+        'last_name': other.last_name,
+        'profile_picture': other.profile_picture.url if other.profile_picture else None,
+        **extra,
+        'is_active': other.is_active,
+        'has_blocked_me': other.id in snapshot.blocked_me_ids,
+    }
+
+class FriendCategoriesView(AsyncReadMixin, InstrumentedViewMixin, APIView):
     """
     Returns three categories of users:
     1. Already friends (accepted)
     2. Pending requests (sent or received)
     3. Suggested users (not friends, no pending request)
     """
-    user = request.user
-    
-    # Category 1: Already Friends (accepted friendships)
-    accepted_friendships = Friendship.objects.filter(
-        Q(from_user=user, status='accepted') | Q(to_user=user, status='accepted')
-    )
-    
-    friends = []
-    from users.models import BlockedUser
-    for friendship in accepted_friendships:
-        friend = friendship.to_user if friendship.from_user == user else friendship.from_user
-        has_blocked_me = BlockedUser.objects.filter(blocker=friend, blocked=user).exists()
-        friends.append({
-            'id': friend.id,
-            'username': friend.username,
-            'first_name': friend.first_name,
-            'last_name': friend.last_name,
-            'profile_picture': friend.profile_picture.url if friend.profile_picture else None,
-            'friendship_id': friendship.id,
-            'status': 'accepted',
-            'category': 'friends',
-            'is_active': friend.is_active,
-            'has_blocked_me': has_blocked_me
-        })
-    
-    # Category 2: Pending Requests
-    # Sent by me
-    sent_requests = Friendship.objects.filter(from_user=user, status='pending')
-    # Received by me
-    received_requests = Friendship.objects.filter(to_user=user, status='pending')
-    
-    pending = []
-    for friendship in sent_requests:
-        has_blocked_me = BlockedUser.objects.filter(blocker=friendship.to_user, blocked=user).exists()
-        pending.append({
-            'id': friendship.to_user.id,
-            'username': friendship.to_user.username,
-            'first_name': friendship.to_user.first_name,
-            'last_name': friendship.to_user.last_name,
-            'profile_picture': friendship.to_user.profile_picture.url if friendship.to_user.profile_picture else None,
-            'friendship_id': friendship.id,
-            'status': 'pending',
-            'request_type': 'sent',
-            'category': 'pending',
-            'is_active': friendship.to_user.is_active,
-            'has_blocked_me': has_blocked_me
-        })
-    
-    for friendship in received_requests:
-        has_blocked_me = BlockedUser.objects.filter(blocker=friendship.from_user, blocked=user).exists()
-        pending.append({
-            'id': friendship.from_user.id,
-            'username': friendship.from_user.username,
-            'first_name': friendship.from_user.first_name,
-            'last_name': friendship.from_user.last_name,
-            'profile_picture': friendship.from_user.profile_picture.url if friendship.from_user.profile_picture else None,
-            'friendship_id': friendship.id,
-            'status': 'pending',
-            'request_type': 'received',
-            'category': 'pending',
-            'is_active': friendship.from_user.is_active,
-            'has_blocked_me': has_blocked_me
-        })
-    
-    # Category 3: Suggested Users (no relationship)
-    # Get all user IDs that have any relationship with current user
-    related_user_ids = set()
-    all_relationships = Friendship.objects.filter(
-        Q(from_user=user) | Q(to_user=user)
-    )
-    for rel in all_relationships:
-        if rel.from_user == user:
-            related_user_ids.add(rel.to_user.id)
-        else:
-            related_user_ids.add(rel.from_user.id)
-    
-    # Exclude self, related users, and blocked/inactive users
-    suggested_users = User.objects.filter(is_active=True).exclude(id=user.id).exclude(id__in=related_user_ids)[:20]
-    
-    suggestions = []
-    from users.models import BlockedUser
-    for suggested_user in suggested_users:
-        # Check if this user has blocked me
-        has_blocked_me = BlockedUser.objects.filter(blocker=suggested_user, blocked=user).exists()
-        # Check if I have blocked this user
-        i_have_blocked = BlockedUser.objects.filter(blocker=user, blocked=suggested_user).exists()
+    query_budget = 4
+    permission_classes = [permissions.IsAuthenticated]
+
+    async def aread(self, request, *args, **kwargs):
+        user = request.user
+        # All friendships and blocks loaded once, then everything is in memory
+        snapshot = await RelationshipSnapshot.aload(request)
+        
+        # Category 1: Already Friends (accepted friendships)
+        friends = [
+            _category_entry(snapshot.other(f), snapshot, friendship_id=f.id, status='accepted', category='friends')
+            for f in snapshot.friendships if f.status == 'accepted'
+        ]
+        
+        # Category 2: Pending Requests (sent by me, then received by me)
+        pending = [
+            _category_entry(f.to_user, snapshot, friendship_id=f.id, status='pending',
+                            request_type='sent', category='pending')
+            for f in snapshot.friendships if f.status == 'pending' and f.from_user_id == user.id
+        ] + [
+            _category_entry(f.from_user, snapshot, friendship_id=f.id, status='pending',
+                            request_type='received', category='pending')
+            for f in snapshot.friendships if f.status == 'pending' and f.to_user_id == user.id
+        ]
         
-        suggestions.append({
-            'id': suggested_user.id,
-            'username': suggested_user.username,
-            'first_name': suggested_user.first_name,
-            'last_name': suggested_user.last_name,
-            'profile_picture': suggested_user.profile_picture.url if suggested_user.profile_picture else None,
-            'status': 'none',
-            'category': 'suggestions',
-            'is_active': suggested_user.is_active,
-            'has_blocked_me': has_blocked_me,
-            'i_have_blocked': i_have_blocked
+        # Category 3: Suggested Users (no relationship)
+        # Precomputed by friends.suggestions; re-check against the snapshot in
+        # case a relationship changed since they were ranked
+        related_ids = {snapshot.other(f).id for f in snapshot.friendships}
+        skip_ids = related_ids | snapshot.blocked_ids | snapshot.blocked_me_ids
+        ranked = FriendSuggestion.objects.filter(
+            user=user, suggested__is_active=True
+        ).select_related('suggested')[:SUGGESTIONS_SHOWN * 2]
+        suggested_users = [
+            (s.suggested, s.mutual_friends) async for s in ranked if s.suggested_id not in skip_ids
+        ][:SUGGESTIONS_SHOWN]
+        
+        if not suggested_users:
+            # Cold start (no friends, groups or pages yet): newest active users
+            # Exclude self, related users, and blocked/inactive users
+            recent_users = User.objects.filter(is_active=True).exclude(id=user.id).exclude(
+                id__in=Friendship.objects.filter(from_user=user).values('to_user_id')
+            ).exclude(
+                id__in=Friendship.objects.filter(to_user=user).values('from_user_id')
+            ).exclude(
+                id__in=snapshot.blocked_ids | snapshot.blocked_me_ids
+            )[:SUGGESTIONS_SHOWN]
+            suggested_users = [(u, 0) async for u in recent_users]
+        
+        suggestions = [
+            _category_entry(u, snapshot, status='none', category='suggestions',
+                            mutual_friends=mutual, i_have_blocked=u.id in snapshot.blocked_ids)
+            for u, mutual in suggested_users
+        ]
+        
+        return Response({
+            'friends': friends,
+            'pending': pending,
+            'suggestions': suggestions
         })
-    
-    return Response({
-        'friends': friends,
-        'pending': pending,
-        'suggestions': suggestions
-    })
+
+def _publish_friendship(friendship, event, actor, to):
+    """Tell the other side, e.g. to update the friend categories without refetching them"""
+    publish(user_channel(to), event, friendship=friendship.pk, status=friendship.status, actor=actor.pk,
+            user={'id': actor.pk, 'username': actor.username})
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
@@ -156,12 +136,13 @@ def send_friend_request(request, user_id):
         print(f"User {to_user.username} is blocked/inactive")
         return Response({'error': 'Cannot send friend request to this user'}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Check if either user has blocked the other
+    # Check if either user has blocked the other (in the database: a cached
+    # block set could predate a block made through another worker)
     from users.models import BlockedUser
     blocked_relationship = BlockedUser.objects.filter(
         (Q(blocker=request.user, blocked=to_user) | Q(blocker=to_user, blocked=request.user))
     ).first()
-    
+
     if blocked_relationship:
         print(f"Users have blocked each other")
         return Response({'error': 'Cannot send friend request to this user'}, status=status.HTTP_400_BAD_REQUEST)
@@ -188,6 +169,7 @@ def send_friend_request(request, user_id):
             existing_friendship.from_user = request.user
             existing_friendship.to_user = to_user
             existing_friendship.save()
+            _publish_friendship(existing_friendship, 'friend_request', request.user, to=to_user.pk)
             return Response(FriendshipSerializer(existing_friendship).data, status=status.HTTP_200_OK)
     
     # Create new friendship request
@@ -199,6 +181,7 @@ def send_friend_request(request, user_id):
             status='pending'
         )
         print(f"Friendship created successfully: {friendship.id}")
+        _publish_friendship(friendship, 'friend_request', request.user, to=to_user.pk)
         return Response(FriendshipSerializer(friendship).data, status=status.HTTP_201_CREATED)
     except Exception as e:
         print(f"Error creating friendship: {str(e)}")
@@ -214,6 +197,10 @@ def accept_friend_request(request, friendship_id):
     
     friendship.status = 'accepted'
     friendship.save()
+    sync_timeline(friendship.from_user_id, author_ids=[friendship.to_user_id])
+    sync_timeline(friendship.to_user_id, author_ids=[friendship.from_user_id])
+    schedule_refresh([friendship.from_user_id, friendship.to_user_id])
+    _publish_friendship(friendship, 'friend_request_accepted', request.user, to=friendship.from_user_id)
     
     return Response(FriendshipSerializer(friendship).data, status=status.HTTP_200_OK)
 
@@ -257,5 +244,8 @@ def unfriend(request, friendship_id):
     
     # Delete the friendship
     friendship.delete()
+    sync_timeline(friendship.from_user_id, author_ids=[friendship.to_user_id])
+    sync_timeline(friendship.to_user_id, author_ids=[friendship.from_user_id])
+    schedule_refresh([friendship.from_user_id, friendship.to_user_id])
     
     return Response({'message': 'Unfriended successfully'}, status=status.HTTP_200_OK)
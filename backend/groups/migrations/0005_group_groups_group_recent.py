@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0004_group_members_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['-created_at', '-id'], name='groups_group_recent'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0005_group_groups_group_recent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='cover_photo_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='profile_picture_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
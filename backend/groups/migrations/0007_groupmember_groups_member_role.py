@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0006_group_cover_photo_renditions_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='groupmember',
+            index=models.Index(fields=['group', 'role'], name='groups_member_role'),
+        ),
+    ]
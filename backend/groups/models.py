@@ -1,6 +1,19 @@
 from django.db import models
+from django.db.models import Exists, OuterRef
 from django.conf import settings
 
+class GroupQuerySet(models.QuerySet):
+    def for_viewer(self, user):
+        """Groups with their creator and the viewer's is_member/is_admin flags, so GroupSerializer makes no query per group"""
+        queryset = self.select_related('created_by')
+        if user.is_authenticated:
+            membership = GroupMember.objects.filter(group=OuterRef('pk'), user=user)
+            queryset = queryset.annotate(
+                viewer_is_member=Exists(membership),
+                viewer_is_admin=Exists(membership.filter(role='admin')),
+            )
+        return queryset
+
 class Group(models.Model):
     PRIVACY_CHOICES = (
         ('public', 'Public'),
@@ -28,16 +41,26 @@ class Group(models.Model):
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES, default='general')
     profile_picture = models.ImageField(upload_to='group_profiles/', null=True, blank=True)
     cover_photo = models.ImageField(upload_to='group_covers/', null=True, blank=True)
+    # Resized copies, filled in by lookbook.images
+    profile_picture_renditions = models.JSONField(default=dict, blank=True, editable=False)
+    cover_photo_renditions = models.JSONField(default=dict, blank=True, editable=False)
     privacy = models.CharField(max_length=20, choices=PRIVACY_CHOICES, default='public')
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='created_groups')
+    # Denormalized counter, kept in sync by join_group/leave_group
+    members_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = GroupQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='groups_group_recent'),
+        ]
 
 class GroupMember(models.Model):
     ROLE_CHOICES = (
@@ -53,6 +76,10 @@ class GroupMember(models.Model):
     class Meta:
         unique_together = ('group', 'user')
         ordering = ['-joined_at']
+        indexes = [
+            # A group's admins (or members) without touching the rest
+            models.Index(fields=['group', 'role'], name='groups_member_role'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} in {self.group.name}"
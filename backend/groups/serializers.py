@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import Group, GroupMember
 from users.serializers import UserSerializer
+from lookbook.images import RenditionsField
 
 class GroupMemberSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
@@ -12,28 +13,33 @@ class GroupMemberSerializer(serializers.ModelSerializer):
 
 class GroupSerializer(serializers.ModelSerializer):
     created_by = UserSerializer(read_only=True)
-    members_count = serializers.SerializerMethodField()
     is_member = serializers.SerializerMethodField()
     is_admin = serializers.SerializerMethodField()
+    profile_picture_renditions = RenditionsField()
+    cover_photo_renditions = RenditionsField()
     
     class Meta:
         model = Group
-        fields = ['id', 'name', 'description', 'category', 'profile_picture', 'cover_photo', 'privacy', 
+        fields = ['id', 'name', 'description', 'category', 'profile_picture', 'cover_photo', 
+                  'profile_picture_renditions', 'cover_photo_renditions', 'privacy', 
                   'created_by', 'created_at', 'updated_at', 'members_count', 
                   'is_member', 'is_admin']
-        read_only_fields = ['id', 'created_at', 'updated_at']
-    
-    def get_members_count(self, obj):
-        return obj.members.count()
+        read_only_fields = ['id', 'created_at', 'updated_at', 'members_count']
     
     def get_is_member(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            if hasattr(obj, 'viewer_is_member'):
+                return obj.viewer_is_member
             return obj.members.filter(user=request.user).exists()
         return False
     
     def get_is_admin(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.members.filter(user=request.user, role='admin').exists() or obj.created_by == request.user
+            if obj.created_by_id == request.user.id:
+                return True
+            if hasattr(obj, 'viewer_is_admin'):
+                return obj.viewer_is_admin
+            return obj.members.filter(user=request.user, role='admin').exists()
         return False
@@ -1,3 +1,26 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from .models import Group
+
+User = get_user_model()
+
+
+class GroupMemberCounterTests(APITestCase):
+    def test_create_join_and_leave_maintain_members_count(self):
+        creator = User.objects.create(username='creator')
+        member = User.objects.create(username='member')
+        self.client.force_authenticate(creator)
+        response = self.client.post('/api/groups/', {'name': 'Group'})
+        group = Group.objects.get(pk=response.data['id'])
+        self.assertEqual(group.members_count, 1)
+
+        self.client.force_authenticate(member)
+        self.client.post(f'/api/groups/{group.id}/join/')
+        self.client.post(f'/api/groups/{group.id}/join/')
+        group.refresh_from_db()
+        self.assertEqual(group.members_count, 2)
+
+        self.client.post(f'/api/groups/{group.id}/leave/')
+        group.refresh_from_db()
+        self.assertEqual(group.members_count, 1)
@@ -1,23 +1,42 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
+from django.db import transaction
+from django.db.models import F
+from lookbook.conditional import ConditionalGetMixin
+from lookbook.events import group_channel, publish
+from lookbook.metrics import InstrumentedViewMixin
+from lookbook.response_cache import CachedResponseMixin
 from .models import Group, GroupMember
 from .serializers import GroupSerializer, GroupMemberSerializer
 
-class GroupListCreateView(generics.ListCreateAPIView):
-    queryset = Group.objects.all()
+GROUP_ETAG_FIELDS = ('id', 'updated_at', 'members_count', 'created_by__updated_at')
+
+class GroupListCreateView(InstrumentedViewMixin, ConditionalGetMixin, CachedResponseMixin, generics.ListCreateAPIView):
+    query_budget = 2
     serializer_class = GroupSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    cache_scopes = ('groups',)
+    etag_fields = GROUP_ETAG_FIELDS
+
+    def get_queryset(self):
+        return Group.objects.for_viewer(self.request.user)
     
     def perform_create(self, serializer):
-        group = serializer.save(created_by=self.request.user)
-        # Auto-add creator as admin
-        GroupMember.objects.create(group=group, user=self.request.user, role='admin')
+        with transaction.atomic():
+            group = serializer.save(created_by=self.request.user, members_count=1)
+            # Auto-add creator as admin
+            GroupMember.objects.create(group=group, user=self.request.user, role='admin')
 
-class GroupDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Group.objects.all()
+class GroupDetailView(InstrumentedViewMixin, ConditionalGetMixin, CachedResponseMixin, generics.RetrieveUpdateDestroyAPIView):
+    query_budget = 2
     serializer_class = GroupSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    cache_scopes = ('groups',)
+    etag_fields = GROUP_ETAG_FIELDS
+
+    def get_queryset(self):
+        return Group.objects.for_viewer(self.request.user)
     
     def perform_update(self, serializer):
         if serializer.instance.created_by != self.request.user:
@@ -29,6 +48,10 @@ class GroupDetailView(generics.RetrieveUpdateDestroyAPIView):
             return Response({'error': 'Only creator can delete'}, status=status.HTTP_403_FORBIDDEN)
         instance.delete()
 
+def _publish_members(group, user, event):
+    members_count = Group.objects.filter(pk=group.pk).values_list('members_count', flat=True).first()
+    publish(group_channel(group.pk), event, group=group.pk, actor=user.pk, members_count=members_count)
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def join_group(request, pk):
@@ -37,7 +60,11 @@ def join_group(request, pk):
     except Group.DoesNotExist:
         return Response({'error': 'Group not found'}, status=status.HTTP_404_NOT_FOUND)
     
-    member, created = GroupMember.objects.get_or_create(group=group, user=request.user)
+    with transaction.atomic():
+        member, created = GroupMember.objects.get_or_create(group=group, user=request.user)
+        if created:
+            Group.objects.filter(pk=group.pk).update(members_count=F('members_count') + 1)
+            _publish_members(group, request.user, 'group_join')
     
     if created:
         return Response({'message': 'Joined group'}, status=status.HTTP_201_CREATED)
@@ -52,8 +79,12 @@ def leave_group(request, pk):
         return Response({'error': 'Group not found'}, status=status.HTTP_404_NOT_FOUND)
     
     try:
-        member = GroupMember.objects.get(group=group, user=request.user)
-        member.delete()
+        with transaction.atomic():
+            member = GroupMember.objects.get(group=group, user=request.user)
+            deleted, _ = member.delete()
+            if deleted:
+                Group.objects.filter(pk=group.pk).update(members_count=F('members_count') - 1)
+                _publish_members(group, request.user, 'group_leave')
         return Response({'message': 'Left group'}, status=status.HTTP_200_OK)
     except GroupMember.DoesNotExist:
         return Response({'error': 'Not a member'}, status=status.HTTP_400_BAD_REQUEST)
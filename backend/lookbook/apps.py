@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+
+
+class LookbookConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'lookbook'
+
+    def ready(self):
+        from .images import connect_rendition_signals
+        from .metrics import connect_query_counter
+        from .response_cache import connect_invalidation_signals
+        connect_invalidation_signals()
+        connect_rendition_signals()
+        connect_query_counter()
@@ -12,5 +12,10 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lookbook.settings')
+# Django runs each ASGI request's sync code (async ORM included) in a thread
+# of its own, so a persistent connection would be left open in a finished
+# thread; close connections at the end of every request instead (DB_POOL
+# keeps PostgreSQL connections warm)
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -0,0 +1,147 @@
+"""
+Async GET handling for the read-heavy DRF views.
+
+Under the ASGI application (lookbook.asgi on uvicorn workers) a sync view
+holds a thread for the whole request, database waits included, so a
+worker serves at most as many requests at once as it has threads. Views
+that mix in AsyncListMixin or AsyncRetrieveMixin (or implement `aread()`
+on AsyncReadMixin) answer GET and HEAD with a coroutine instead: rows are
+read with the async ORM, and the sync code shared with the other methods
+(authentication, block sets, ETag checks, the response cache) runs through
+sync_to_async. Other methods still go to the sync DRF handlers.
+
+Responses are the same as the sync path's: the same querysets,
+serializers, keyset pagination, ETags, response cache and query budgets.
+Under WSGI (gunicorn, the test client) Django runs the coroutine with
+async_to_sync.
+"""
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.response import Response
+
+from users.blocks import block_set_for
+from .conditional import ConditionalGetMixin
+from .response_cache import CachedResponseMixin
+
+
+class AsyncReadMixin:
+    """
+    Serves GET/HEAD with `aread()`, a coroutine returning the Response.
+    List it before the other mixins and the DRF base class.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        sync_view = sync_to_async(super().as_view(**initkwargs))
+
+        async def view(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await sync_view(request, *args, **kwargs)
+            self = cls(**initkwargs)
+            self.setup(request, *args, **kwargs)
+            return await self.adispatch(request, *args, **kwargs)
+
+        # As on DRF's views: budget_for() and the schema generator read these
+        view.cls = cls
+        view.initkwargs = initkwargs
+        return csrf_exempt(view)
+
+    async def adispatch(self, request, *args, **kwargs):
+        """APIView.dispatch() for GET/HEAD"""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        def initial():
+            self.initial(request, *args, **kwargs)
+            # Memoize the block set here; serializers and ETags read it in the event loop
+            block_set_for(request)
+
+        try:
+            await sync_to_async(initial)()
+            response = await self.aget(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def aget(self, request, *args, **kwargs):
+        """What ConditionalGetMixin and CachedResponseMixin's get() do around the read"""
+        state = None
+        if request.headers.get('If-None-Match') or not request.user.is_authenticated:
+            response, state = await sync_to_async(self.early_response)(request)
+            if response is not None:
+                return response
+        self._etag_rows = None
+        response = await self.aread(request, *args, **kwargs)
+        if isinstance(self, ConditionalGetMixin):
+            response = await sync_to_async(self.add_validators)(request, response, state)
+        return response
+
+    def get(self, request, *args, **kwargs):
+        # GETs dispatched by the sync view (none through as_view())
+        return async_to_sync(self.aget)(request, *args, **kwargs)
+
+    def early_response(self, request):
+        """
+        (a 304 or cached response, or None; the ETag state read for it, or
+        None), as ConditionalGetMixin and CachedResponseMixin's get() answer
+        before loading any rows
+        """
+        response = state = None
+        if isinstance(self, ConditionalGetMixin):
+            response, state = self.check_not_modified(request)
+        if response is None and isinstance(self, CachedResponseMixin):
+            response = self.cached_response(request)
+        return response, state
+
+    async def aread(self, request, *args, **kwargs):
+        raise NotImplementedError
+
+    def read_queryset(self):
+        # get_queryset() may query too (e.g. the timeline's pulled pages)
+        return self.filter_queryset(self.get_queryset())
+
+
+class AsyncListMixin(AsyncReadMixin):
+    """ListModelMixin.list() on the async ORM, for generic list views"""
+
+    async def aread(self, request, *args, **kwargs):
+        queryset = await sync_to_async(self.read_queryset)()
+        if self.paginator is None:
+            rows = [obj async for obj in queryset]
+        else:
+            rows = await self.paginator.apaginate_queryset(queryset, request, view=self)
+        self._etag_rows = rows
+        rows = await self.aload_page(rows)
+        serializer = self.get_serializer(rows, many=True)
+        if self.paginator is None:
+            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
+
+    async def aload_page(self, rows):
+        """Load anything else the serializer reads, as paginate_queryset() overrides do in the sync path"""
+        return rows
+
+
+class AsyncRetrieveMixin(AsyncReadMixin):
+    """RetrieveModelMixin.retrieve() on the async ORM, for generic detail views"""
+
+    async def aread(self, request, *args, **kwargs):
+        return Response(self.get_serializer(await self.aget_object()).data)
+
+    async def aget_object(self):
+        """GenericAPIView.get_object() with the async ORM"""
+        queryset = await sync_to_async(self.read_queryset)()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        await sync_to_async(self.check_object_permissions)(self.request, obj)
+        self._etag_rows = [obj]
+        return obj
@@ -0,0 +1,102 @@
+"""
+Synthetic data and request scenarios for the API benchmark
+(`manage.py benchmark_api`).
+
+generate() fills an empty database at one of the SCALES with
+lookbook.seed (the seed_lookbook generator), including the derived
+tables (timelines, friend suggestions, search index).
+
+Scenarios are plain URLs requested as the best-connected user, so the
+numbers reflect the heaviest realistic viewer rather than an empty feed.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Q
+
+from posts.models import Post
+
+from . import seed as seeding
+
+User = get_user_model()
+
+# Keyword arguments for seeding.seed()
+SCALES = {
+    # Seconds to build; what CI runs against the stored baseline
+    'tiny': dict(users=60, posts=180, avg_friends=8, pages=10, avg_followers=10, groups=6, avg_members=10,
+                 avg_likes=4, avg_comments=4),
+    'small': dict(users=1_000, posts=10_000, avg_friends=30, pages=100, avg_followers=50, groups=50,
+                  avg_members=40, avg_likes=10, avg_comments=6),
+    'medium': dict(users=10_000, posts=200_000, avg_friends=60, pages=1_000, avg_followers=200, groups=500,
+                   avg_members=100, avg_likes=20, avg_comments=8),
+}
+
+
+def generate(scale, seed=0, password='benchmark'):
+    """Fill an empty database at `scale` (a SCALES key or seed() kwargs). Returns row counts."""
+    scale = SCALES[scale] if isinstance(scale, str) else scale
+    seeder = seeding.seed(**scale, seed=seed, prefix='bench', password=password)
+    seeding.rebuild_derived(seeder.user_ids)
+    return dict(seeder.counts)
+
+
+def viewer():
+    """The user with the most accepted friendships"""
+    return User.objects.annotate(
+        friend_count=Count('friendships_sent', filter=Q(friendships_sent__status='accepted'), distinct=True)
+        + Count('friendships_received', filter=Q(friendships_received__status='accepted'), distinct=True)
+    ).order_by('-friend_count', 'pk').first()
+
+
+def scenarios(user):
+    """Scenario name -> URL, for `user` as the viewer"""
+    busiest_post = (
+        Post.objects.for_feed(user).filter(is_visible=True, visibility='public')
+        .order_by('-comments_count', 'pk').values_list('pk', flat=True).first()
+    )
+    return {
+        'posts': '/api/posts/',
+        'comments': f'/api/comments/post/{busiest_post}/',
+        'friend_categories': '/api/friends/categories/',
+        'pages': '/api/pages/',
+    }
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def summarize(timings, queries, elapsed):
+    """Report entry for one scenario: latencies in ms, queries per request, throughput"""
+    timings = sorted(timings)
+    return {
+        'requests': len(timings),
+        'p50_ms': round(percentile(timings, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 2),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        'max_queries': max(queries) if queries else None,
+        'requests_per_second': round(len(timings) / elapsed, 1),
+    }
+
+
+def compare(results, baseline, latency_tolerance):
+    """
+    Regressions of `results` against `baseline` (same shape): any scenario
+    making more queries per request, or with a p95 more than
+    `latency_tolerance` (a fraction) slower. Scenarios missing from the
+    baseline are not compared.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if current['max_queries'] is not None and current['max_queries'] > previous['max_queries']:
+            regressions.append(f'{name}: {current["max_queries"]} queries per request, baseline {previous["max_queries"]}')
+        limit = previous['p95_ms'] * (1 + latency_tolerance)
+        if current['p95_ms'] > limit:
+            regressions.append(f'{name}: p95 {current["p95_ms"]}ms, baseline {previous["p95_ms"]}ms (limit {limit:.2f}ms)')
+    return regressions
+
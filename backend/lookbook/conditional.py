@@ -0,0 +1,147 @@
+"""
+ETag / conditional GET support.
+
+The ETag is a digest of a few cheap columns (updated_at and the
+denormalized counters) of exactly the rows a response contains, plus the
+viewer and their block set. On a normal 200 the state is read from the
+instances the view already loaded, so it costs no extra query. When the
+client sends If-None-Match the same columns are fetched with one narrow
+`values()` query first and a match is answered with 304 without loading
+model instances or serializing anything.
+
+Counters are maintained with queryset.update() and do not touch
+updated_at, so If-Modified-Since alone cannot be trusted; Last-Modified is
+sent for information but only If-None-Match produces a 304.
+"""
+import hashlib
+import json
+from datetime import datetime
+
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags
+
+from users.blocks import block_set_for
+
+
+class ConditionalGetMixin:
+    """
+    Adds ETag/Last-Modified to GET responses and answers If-None-Match with
+    304. Views list the columns their output depends on in `etag_fields`
+    (related columns use `__` as in values()), or override get_etag_state()
+    for anything else.
+    """
+    etag_fields = ('id', 'updated_at')
+
+    def get_etag_state(self, request, rows=None):
+        """
+        JSON-serializable state that changes whenever the response body
+        would, or None to skip conditional handling. `rows` are the
+        instances the response was built from, when already loaded.
+        """
+        if rows is not None:
+            return [{field: self._resolve(obj, field) for field in self.etag_fields} for obj in rows]
+
+        queryset = self.get_queryset()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if lookup_url_kwarg in self.kwargs:
+            state = list(
+                queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+                .order_by().values(*self.etag_fields)[:1]
+            )
+            # Not found: let the normal 404 path handle it
+            return state or None
+
+        if self.paginator is None:
+            return list(queryset.values(*self.etag_fields))
+        # Same window as the real page, but only the ETag columns
+        paginator = self.pagination_class()
+        ordering = getattr(self, 'keyset_ordering', getattr(paginator, 'ordering', ()))
+        key_fields = [field.lstrip('-') for field in ordering if field.lstrip('-') not in self.etag_fields]
+        page = paginator.paginate_queryset(queryset.values(*self.etag_fields, *key_fields), request, view=self)
+        return [{field: row[field] for field in self.etag_fields} for row in page]
+
+    def get_object(self):
+        obj = super().get_object()
+        self._etag_rows = [obj]
+        return obj
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        self._etag_rows = page
+        return page
+
+    def get(self, request, *args, **kwargs):
+        response, state = self.check_not_modified(request)
+        if response is not None:
+            return response
+        self._etag_rows = None
+        return self.add_validators(request, super().get(request, *args, **kwargs), state)
+
+    def check_not_modified(self, request):
+        """
+        (304 response or None, ETag state or None) for an If-None-Match
+        request; the state, when read, is reused by add_validators().
+        """
+        if not request.headers.get('If-None-Match'):
+            return None, None
+        state = self.get_etag_state(request)
+        if state is None:
+            return None, None
+        etag = self._make_etag(request, state)
+        if etag in parse_etags(request.headers['If-None-Match']):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            patch_vary_headers(response, ['Authorization'])
+            return response, state
+        return None, state
+
+    def add_validators(self, request, response, state=None):
+        # Cached responses already carry the ETag they were stored with
+        if response.status_code != 200 or response.has_header('ETag'):
+            return response
+        if state is None:
+            state = self.get_etag_state(request, rows=self._etag_rows)
+            if state is None:
+                return response
+
+        response['ETag'] = self._make_etag(request, state)
+        last_modified = self._last_modified(state)
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    @staticmethod
+    def _resolve(obj, field):
+        for name in field.split('__'):
+            if obj is None:
+                return None
+            obj = getattr(obj, name)
+        return obj
+
+    @staticmethod
+    def _make_etag(request, state):
+        blocks = block_set_for(request)
+        payload = json.dumps(
+            [
+                request.get_full_path(),
+                request.accepted_renderer.format,
+                request.user.id,
+                sorted(blocks.blocked_ids),
+                sorted(blocks.blocked_me_ids),
+                state,
+            ],
+            default=str,
+            sort_keys=True,
+        )
+        return f'W/"{hashlib.sha1(payload.encode()).hexdigest()}"'
+
+    @staticmethod
+    def _last_modified(state):
+        rows = state if isinstance(state, list) else [state]
+        stamps = [
+            value for row in rows if isinstance(row, dict)
+            for value in row.values() if isinstance(value, datetime)
+        ]
+        return max(stamps, default=None)
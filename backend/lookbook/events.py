@@ -0,0 +1,316 @@
+"""
+Live updates over server-sent events.
+
+Views publish small deltas (a like, a new comment, a friend request, a
+group join) once their transaction commits; clients hold one
+`GET /api/events/` stream open and apply them instead of polling the
+list endpoints.
+
+Channels:
+- `user:<id>`: friend requests to and from the user, always subscribed
+- `post:<id>`: likes and comments, for the posts a client has on screen
+  (`?posts=1,2,3`)
+- `group:<id>`: joins and leaves (`?groups=4`)
+
+Each stream is an asyncio task in the ASGI application, so it holds no
+thread while idle. The broker delivers published messages to the streams:
+InProcessBroker reaches this process only (a single ASGI worker, tests);
+RedisBroker relays through Redis pub/sub so views in any process reach
+streams in every other. Deltas are best-effort: a client that reconnects,
+or falls EVENTS_QUEUE_SIZE messages behind, gets a `reset` and should
+refetch what it shows.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+from rest_framework import permissions
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.response import Response
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+TICKET_SALT = 'lookbook.events.ticket'
+RESET = {'type': 'reset'}
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def post_channel(post_id):
+    return f'post:{post_id}'
+
+
+def group_channel(group_id):
+    return f'group:{group_id}'
+
+
+# -- brokers ----------------------------------------------------------------
+
+class Subscription:
+    """One stream's queue, filled from any thread and read in its event loop"""
+
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = frozenset(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+
+    def push(self, message):
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # The stream's loop is gone
+            self.broker.unsubscribe(self)
+
+    def _put(self, message):
+        if self.queue.full():
+            # A slow client: drop what it missed and make it refetch
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            message = RESET
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """Delivers messages to streams in this process only"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, channel, message):
+        self.deliver(channel, message)
+
+    def deliver(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.push(message)
+
+    def deliver_all(self, message):
+        with self._lock:
+            subscribers = {s for channel_subscribers in self._subscribers.values() for s in channel_subscribers}
+        for subscription in subscribers:
+            subscription.push(message)
+
+    def subscribe(self, channels):
+        """Call from the stream's event loop"""
+        subscription = Subscription(self, channels)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+
+class RedisBroker(InProcessBroker):
+    """
+    Publishes to Redis; one listener thread per process relays every
+    message to the streams subscribed here.
+    """
+    PREFIX = 'lookbook:events:'
+
+    def __init__(self):
+        super().__init__()
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured('EVENTS_BROKER=redis needs the redis package')
+        self._redis = redis.Redis.from_url(settings.EVENTS_REDIS_URL)
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def publish(self, channel, message):
+        self._redis.publish(self.PREFIX + channel, json.dumps(message))
+
+    def subscribe(self, channels):
+        with self._listener_lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='events-redis', daemon=True)
+                self._listener.start()
+        return super().subscribe(channels)
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(self.PREFIX + '*')
+                for item in pubsub.listen():
+                    channel = item['channel'].decode()[len(self.PREFIX):]
+                    self.deliver(channel, json.loads(item['data']))
+            except Exception:
+                logger.exception('Lost the events subscription to Redis; reconnecting')
+                # Anything published meanwhile is lost to these streams
+                self.deliver_all(RESET)
+                time.sleep(1)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(settings.EVENTS_BROKERS[settings.EVENTS_BROKER])()
+        return _broker
+
+
+def publish(channel, event, **data):
+    """Push {'type': event, **data} to channel's streams once the current transaction commits"""
+    message = {'type': event, **data}
+
+    def send():
+        try:
+            get_broker().publish(channel, message)
+        except Exception:
+            # Live updates are best-effort; never fail the request that caused them
+            logger.exception('Could not publish %s to %s', event, channel)
+    transaction.on_commit(send)
+
+
+# -- stream -----------------------------------------------------------------
+
+def _format(message):
+    return f'data: {json.dumps(message, separators=(",", ":"))}\n\n'
+
+
+def _ids(value):
+    ids = []
+    for part in (value or '').split(','):
+        if part.strip().isdigit():
+            ids.append(int(part))
+    return ids[:settings.EVENTS_MAX_SUBSCRIPTIONS]
+
+
+def _authenticate(request):
+    """The user behind a ?ticket= (EventSource) or a JWT Authorization header, else None"""
+    ticket = request.GET.get('ticket')
+    if ticket:
+        try:
+            user_id = signing.loads(ticket, salt=TICKET_SALT, max_age=settings.EVENTS_TICKET_MAX_AGE)
+        except signing.BadSignature:
+            return None
+        return User.objects.filter(pk=user_id, is_active=True).first()
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return authenticated[0] if authenticated else None
+
+
+def _subscribe_channels(user, params):
+    """Channels user may follow: their own, plus the requested posts and groups they can see"""
+    from friends.models import Friendship
+    from groups.models import Group
+    from posts.models import Post
+    from users.blocks import get_block_set
+
+    block_set = get_block_set(user.pk)
+    post_ids = []
+    requested = _ids(params.get('posts'))
+    if requested:
+        # The posts the viewer may read, as in search.views.visible_queryset
+        friend_ids = Friendship.objects.friend_ids(user.pk)
+        post_ids = Post.objects.for_feed(user).filter(pk__in=requested, is_visible=True).exclude(
+            author_id__in=block_set.hidden_ids
+        ).filter(
+            Q(visibility='public') | Q(author=user) | Q(visibility='friends', author_id__in=friend_ids)
+        ).values_list('pk', flat=True)
+    group_ids = Group.objects.filter(pk__in=_ids(params.get('groups'))).filter(
+        Q(privacy='public') | Q(members__user=user)
+    ).values_list('pk', flat=True).distinct()
+    channels = [user_channel(user.pk)]
+    channels += [post_channel(pk) for pk in post_ids]
+    channels += [group_channel(pk) for pk in group_ids]
+    return channels, block_set.hidden_ids
+
+
+async def _stream(subscription, hidden_ids):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.EVENTS_STREAM_TIMEOUT
+    try:
+        # Reconnect after 3s; whatever happened meanwhile was missed, hence the reset
+        yield 'retry: 3000\n' + _format({'type': 'ready', 'channels': sorted(subscription.channels)})
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                message = await asyncio.wait_for(subscription.get(), min(settings.EVENTS_HEARTBEAT, remaining))
+            except asyncio.TimeoutError:
+                # Comment line: keeps proxies from closing an idle connection
+                yield ': ping\n\n'
+                continue
+            if message.get('actor') in hidden_ids:
+                continue
+            yield _format(message)
+    finally:
+        subscription.close()
+
+
+async def event_stream(request):
+    """
+    GET /api/events/?ticket=...&posts=1,2&groups=3: a text/event-stream of
+    JSON deltas. Authenticate with a ticket from /api/events/ticket/
+    (EventSource cannot send headers) or a Bearer token. Streams end after
+    EVENTS_STREAM_TIMEOUT seconds; clients reconnect with a fresh ticket.
+    """
+    if not isinstance(request, ASGIRequest):
+        # WSGI would buffer the whole stream in a worker thread
+        return JsonResponse({'error': 'Live updates are served by the ASGI application (lookbook.asgi)'}, status=501)
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    user = await sync_to_async(_authenticate)(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    channels, hidden_ids = await sync_to_async(_subscribe_channels)(user, request.GET)
+
+    response = StreamingHttpResponse(_stream(get_broker().subscribe(channels), hidden_ids),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx and similar proxies would otherwise buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def event_ticket(request):
+    """A short-lived credential for opening /api/events/ with EventSource"""
+    return Response({
+        'ticket': signing.dumps(request.user.pk, salt=TICKET_SALT),
+        'expires_in': settings.EVENTS_TICKET_MAX_AGE,
+    })
@@ -0,0 +1,237 @@
+"""
+Responsive image renditions.
+
+Uploaded images are kept as-is, and after the upload commits a background
+worker pool renders resized WebP and JPEG copies ('avatar', 'feed',
+'full'), EXIF orientation applied and metadata stripped. Their names and
+sizes are stored in a `<field>_renditions` JSON column next to the image,
+so serializers expose them without extra queries and clients can pick the
+smallest rendition that fits.
+
+The column is written with a conditional UPDATE on the source file name,
+so a rendition job that finishes after the image was replaced is dropped.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.utils import timezone
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+# Model -> image fields that get renditions
+IMAGE_FIELDS = {
+    'posts.Post': ('image',),
+    'users.User': ('profile_picture', 'cover_photo'),
+    'pages.Page': ('profile_picture', 'cover_photo'),
+    'groups.Group': ('profile_picture', 'cover_photo'),
+}
+
+# Rendition -> (max width, max height, square crop). Never upscaled.
+RENDITIONS = {
+    'avatar': (160, 160, True),
+    'feed': (1080, 1350, False),
+    'full': (2048, 2048, False),
+}
+
+# Extension -> (Pillow format, save options)
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+RENDITIONS_DIR = 'renditions'
+
+
+def renditions_field(field_name):
+    return f'{field_name}_renditions'
+
+
+def rendition_names(data):
+    for rendition in (data or {}).get('renditions', {}).values():
+        for ext in FORMATS:
+            if rendition.get(ext):
+                yield rendition[ext]
+
+
+def _delete_files(storage, names):
+    for name in names:
+        try:
+            storage.delete(name)
+        except OSError:
+            logger.warning('Could not delete rendition %s', name)
+
+
+def _resize(image, width, height, crop):
+    if crop:
+        side = min(image.width, image.height, width)
+        return ImageOps.fit(image, (side, side), Image.Resampling.LANCZOS)
+    resized = image.copy()
+    resized.thumbnail((width, height), Image.Resampling.LANCZOS)
+    return resized
+
+
+def _flatten(image):
+    """JPEG has no alpha channel: composite transparent images onto white"""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_renditions(source, storage):
+    """Render every rendition of `source` (a storage name) and save them"""
+    stem = os.path.splitext(source)[0]
+    with storage.open(source, 'rb') as fh:
+        image = Image.open(fh)
+        # Let the JPEG decoder downscale while decoding when it can
+        largest = max(max(width, height) for width, height, _ in RENDITIONS.values())
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if image.mode in ('LA', 'P', 'PA') else 'RGB')
+
+    renditions = {}
+    for name, (width, height, crop) in RENDITIONS.items():
+        resized = _resize(image, width, height, crop)
+        entry = {'width': resized.width, 'height': resized.height}
+        for ext, (fmt, options) in FORMATS.items():
+            buffer = BytesIO()
+            # No exif/icc arguments: metadata is not carried over
+            (resized if fmt == 'WEBP' else _flatten(resized)).save(buffer, fmt, **options)
+            entry[ext] = storage.save(f'{RENDITIONS_DIR}/{stem}-{name}.{ext}', ContentFile(buffer.getvalue()))
+        renditions[name] = entry
+    return renditions
+
+
+def process_image(model_label, pk, field_name, source):
+    """Render `source` and attach the renditions if it is still the current image"""
+    model = apps.get_model(model_label)
+    storage = model._meta.get_field(field_name).storage
+    column = renditions_field(field_name)
+
+    previous = model.objects.filter(pk=pk).values_list(column, flat=True).first()
+    try:
+        # Only shared storage can reuse: elsewhere renditions are deleted with their image.
+        # Its manifests find the renditions of a re-uploaded picture without scanning tables.
+        content_addressed = getattr(storage, 'content_addressed', False)
+        reused = storage.get_renditions(source) if content_addressed else None
+        renditions = reused or render_renditions(source, storage)
+        if content_addressed and not reused:
+            storage.set_renditions(source, renditions)
+    except (OSError, Image.DecompressionBombError, ValueError):
+        logger.warning('Could not render %s for %s %s', source, model_label, pk, exc_info=True)
+        return False
+
+    data = {'source': source, 'renditions': renditions}
+    updated = model.objects.filter(pk=pk, **{field_name: source}).update(
+        **{column: data, 'updated_at': timezone.now()}
+    )
+    if not updated:
+        # Replaced or deleted while rendering
+        _delete_files(storage, rendition_names(data))
+        return False
+    _delete_files(storage, set(rendition_names(previous)) - set(rendition_names(data)))
+    _bump_response_cache(model_label)
+    return True
+
+
+def clear_renditions(instance, field_name):
+    model = type(instance)
+    column = renditions_field(field_name)
+    data = getattr(instance, column)
+    model.objects.filter(pk=instance.pk).update(**{column: {}})
+    setattr(instance, column, {})
+    _delete_files(model._meta.get_field(field_name).storage, rendition_names(data))
+
+
+def _bump_response_cache(model_label):
+    from .response_cache import INVALIDATION_SCOPES, bump_generation
+    for scope, models in INVALIDATION_SCOPES.items():
+        if model_label in models:
+            bump_generation(scope)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_RENDITION_WORKERS, thread_name_prefix='renditions'
+            )
+        return _executor
+
+
+def _run_in_worker(*args):
+    try:
+        process_image(*args)
+    except Exception:
+        logger.exception('Rendition job failed for %s', args)
+    finally:
+        # Worker threads get their own connection; don't leak it
+        connection.close()
+
+
+def schedule_renditions(model_label, pk, field_name, source):
+    args = (model_label, pk, field_name, source)
+    if not settings.IMAGE_RENDITIONS_ASYNC:
+        process_image(*args)
+        return
+    # Only after commit, so the worker can see the row and the file
+    transaction.on_commit(lambda: _get_executor().submit(_run_in_worker, *args))
+
+
+def _on_save(sender, instance, **kwargs):
+    model_label = sender._meta.label
+    for field_name in IMAGE_FIELDS[model_label]:
+        image = getattr(instance, field_name)
+        current = getattr(instance, renditions_field(field_name)) or {}
+        if image and current.get('source') != image.name:
+            schedule_renditions(model_label, instance.pk, field_name, image.name)
+        elif not image and current:
+            clear_renditions(instance, field_name)
+
+
+def connect_rendition_signals():
+    for model_label in IMAGE_FIELDS:
+        post_save.connect(_on_save, sender=model_label, dispatch_uid=f'renditions:{model_label}')
+
+
+class RenditionsField(serializers.Field):
+    """
+    Read-only `{name: {width, height, webp, jpeg}}` with absolute URLs,
+    empty until the renditions have been rendered
+    """
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        from django.core.files.storage import default_storage
+
+        request = self.context.get('request')
+        result = {}
+        for name, rendition in (value or {}).get('renditions', {}).items():
+            entry = {'width': rendition['width'], 'height': rendition['height']}
+            for ext in FORMATS:
+                url = default_storage.url(rendition[ext])
+                entry[ext] = request.build_absolute_uri(url) if request else url
+            result[name] = entry
+        return result
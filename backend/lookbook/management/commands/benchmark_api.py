@@ -0,0 +1,260 @@
+import http.client
+import json
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from lookbook import benchmark
+
+DEFAULT_BASELINE = Path(__file__).resolve().parents[2] / 'benchmark_baseline.json'
+# Query count reported by lookbook.metrics in the Server-Timing header
+QUERIES_RE = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+def database_url(settings_dict):
+    """DATABASE_URL for the benchmark database, handed to gunicorn"""
+    if connection.vendor == 'sqlite':
+        return f'sqlite:///{settings_dict["NAME"]}'
+    credentials = quote(settings_dict['USER'], safe='')
+    if settings_dict['PASSWORD']:
+        credentials += ':' + quote(settings_dict['PASSWORD'], safe='')
+    host = settings_dict['HOST'] or 'localhost'
+    port = f':{settings_dict["PORT"]}' if settings_dict['PORT'] else ''
+    return f'postgres://{credentials}@{host}{port}/{settings_dict["NAME"]}'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the hot API endpoints on a throwaway database filled with synthetic data, '
+        'through the test client or a local gunicorn (WSGI threads or ASGI uvicorn workers), '
+        'and compare with a stored baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=benchmark.SCALES, default='tiny')
+        parser.add_argument('--target', choices=('client', 'gunicorn', 'uvicorn'), default='client',
+                            help='uvicorn: gunicorn with uvicorn workers serving lookbook.asgi')
+        parser.add_argument('--requests', type=int, default=200, help='Timed requests per scenario')
+        parser.add_argument('--warmup', type=int, default=20, help='Untimed requests per scenario first')
+        parser.add_argument('--concurrency', type=int, default=8, help='Client threads (server targets)')
+        parser.add_argument('--workers', type=int, default=2, help='Server worker processes (as in the Procfile)')
+        parser.add_argument('--threads', type=int, default=4, help='Threads per worker (gunicorn target)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE),
+                            help='JSON baseline to compare with (a missing file is skipped)')
+        parser.add_argument('--save-baseline', action='store_true', help='Write the results to --baseline')
+        parser.add_argument('--latency-tolerance', type=float, default=1.0,
+                            help='Allowed p95 slowdown as a fraction of the baseline (query counts must not grow)')
+        parser.add_argument('--output', help='Also write the report as JSON to this file')
+
+    def handle(self, *args, **options):
+        # A scratch database next to the real one, as the test runner makes;
+        # SQLite gets a file so gunicorn workers can open it too
+        workdir = tempfile.mkdtemp(prefix='lookbook-bench-')
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        if connection.vendor == 'sqlite':
+            test_settings['NAME'] = os.path.join(workdir, 'benchmark.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            started = time.perf_counter()
+            counts = benchmark.generate(options['scale'], seed=options['seed'])
+            self.stdout.write(
+                f'{options["scale"]} data in {time.perf_counter() - started:.1f}s: '
+                + ', '.join(f'{count} {name}' for name, count in counts.items())
+            )
+            viewer = benchmark.viewer()
+            urls = benchmark.scenarios(viewer)
+            memory = None
+            if options['target'] == 'client':
+                results = self.run_client(viewer, urls, options)
+            else:
+                results, memory = self.run_server(viewer, urls, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        report = {'scale': options['scale'], 'target': options['target'], 'scenarios': results}
+        self.print_report(results)
+        if memory is not None:
+            report['workers_rss_mb'] = memory
+            self.stdout.write(f'worker memory (RSS, all workers) after the run: {memory} MB')
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2) + '\n')
+        self.check_baseline(report, options)
+
+    # -- targets ------------------------------------------------------------
+
+    def run_client(self, viewer, urls, options):
+        """Sequential requests through the Django test client, in process"""
+        client = APIClient()
+        client.force_authenticate(viewer)
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for name, url in urls.items():
+                for _ in range(options['warmup']):
+                    client.get(url, secure=True)
+                timings, queries = [], []
+                began = time.perf_counter()
+                for _ in range(options['requests']):
+                    with CaptureQueriesContext(connection) as ctx:
+                        started = time.perf_counter()
+                        response = client.get(url, secure=True)
+                        timings.append(time.perf_counter() - started)
+                    if response.status_code != 200:
+                        raise CommandError(f'{url} answered {response.status_code}')
+                    queries.append(len(ctx.captured_queries))
+                results[name] = benchmark.summarize(timings, queries, time.perf_counter() - began)
+        return results
+
+    def run_server(self, viewer, urls, options):
+        """
+        Concurrent keep-alive HTTP requests against a local gunicorn on the
+        benchmark database; returns the results and the workers' memory
+        """
+        port = free_port()
+        env = dict(
+            os.environ,
+            DATABASE_URL=database_url(connection.settings_dict),
+            DJANGO_ALLOWED_HOSTS='127.0.0.1',
+            SERVER_TIMING='1',
+            PYTHONUNBUFFERED='1',
+        )
+        # A file rather than a pipe, which would block gunicorn once full
+        log = tempfile.TemporaryFile()
+        command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(options['workers'])]
+        if options['target'] == 'uvicorn':
+            command += ['--worker-class', 'uvicorn_worker.UvicornWorker', 'lookbook.asgi:application']
+        else:
+            command += ['--threads', str(options['threads']), 'lookbook.wsgi:application']
+        server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=log)
+        try:
+            self.wait_for(server, port, log)
+            headers = {'Authorization': f'Bearer {AccessToken.for_user(viewer)}'}
+            results = {}
+            for name, url in urls.items():
+                results[name] = self.load(port, url, headers, options)
+            return results, self.workers_rss(server.pid)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+            log.close()
+
+    @staticmethod
+    def workers_rss(pid):
+        """Resident memory of the server's worker processes in MB (Linux /proc), or None"""
+        try:
+            children = Path(f'/proc/{pid}/task/{pid}/children').read_text().split()
+            total_kb = 0
+            for child in children:
+                status = Path(f'/proc/{child}/status').read_text()
+                total_kb += int(re.search(r'^VmRSS:\s+(\d+) kB', status, re.M).group(1))
+        except (OSError, AttributeError):
+            return None
+        return round(total_kb / 1024, 1)
+
+    def wait_for(self, server, port, log, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                log.seek(0)
+                raise CommandError(f'gunicorn exited: {log.read().decode()[-2000:]}')
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+                conn.request('GET', '/healthz/')
+                if conn.getresponse().status == 200:
+                    return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError('gunicorn did not start in time')
+
+    def load(self, port, url, headers, options):
+        remaining = {'warmup': options['warmup'], 'timed': options['requests']}
+        timings, queries, errors = [], [], []
+        lock = threading.Lock()
+
+        def take():
+            with lock:
+                for phase in ('warmup', 'timed'):
+                    if remaining[phase]:
+                        remaining[phase] -= 1
+                        return phase
+            return None
+
+        def worker():
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            while (phase := take()) is not None:
+                started = time.perf_counter()
+                conn.request('GET', url, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                elapsed = time.perf_counter() - started
+                if response.status != 200:
+                    errors.append(response.status)
+                    continue
+                if phase == 'timed':
+                    match = QUERIES_RE.search(response.getheader('Server-Timing', ''))
+                    with lock:
+                        timings.append(elapsed)
+                        if match:
+                            queries.append(int(match.group(1)))
+            conn.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['concurrency'])]
+        began = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise CommandError(f'{url}: {len(errors)} non-200 response(s), e.g. {errors[0]}')
+        return benchmark.summarize(timings, queries, time.perf_counter() - began)
+
+    # -- reporting ----------------------------------------------------------
+
+    def print_report(self, results):
+        self.stdout.write(f'{"scenario":18} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"queries":>8} {"req/s":>8}')
+        for name, row in results.items():
+            self.stdout.write(
+                f'{name:18} {row["p50_ms"]:8.2f} {row["p95_ms"]:8.2f} {row["p99_ms"]:8.2f} '
+                f'{row["queries_per_request"]:8} {row["requests_per_second"]:8.1f}'
+            )
+
+    def check_baseline(self, report, options):
+        path = Path(options['baseline'])
+        baselines = json.loads(path.read_text()) if path.exists() else {}
+        key = f'{report["scale"]}/{report["target"]}'
+        if options['save_baseline']:
+            baselines[key] = report['scenarios']
+            path.write_text(json.dumps(baselines, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Saved baseline {key} to {path}'))
+            return
+        if key not in baselines:
+            self.stdout.write(self.style.WARNING(f'No {key} baseline in {path}; nothing to compare'))
+            return
+        regressions = benchmark.compare(report['scenarios'], baselines[key], options['latency_tolerance'])
+        if regressions:
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(f'  {regression}'))
+            raise CommandError(f'{len(regressions)} regression(s) against the {key} baseline')
+        self.stdout.write(self.style.SUCCESS(f'Within the {key} baseline'))
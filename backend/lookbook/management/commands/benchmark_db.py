@@ -0,0 +1,108 @@
+import random
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections, transaction
+
+# Scratch tables in plain SQL both SQLite and PostgreSQL accept
+SETUP = [
+    'CREATE TABLE bench_counter (id INTEGER PRIMARY KEY, value INTEGER NOT NULL)',
+    'CREATE TABLE bench_event (id INTEGER PRIMARY KEY, counter_id INTEGER NOT NULL, payload VARCHAR(64) NOT NULL)',
+    'CREATE INDEX bench_event_counter ON bench_event (counter_id)',
+]
+TEARDOWN = ['DROP TABLE IF EXISTS bench_event', 'DROP TABLE IF EXISTS bench_counter']
+COUNTERS = 100
+
+
+def write(cursor, rng, seq):
+    """A like: bump a hot counter and record the event, in one transaction"""
+    counter = rng.randrange(COUNTERS)
+    with transaction.atomic():
+        cursor.execute('UPDATE bench_counter SET value = value + 1 WHERE id = %s', [counter])
+        cursor.execute('INSERT INTO bench_event (id, counter_id, payload) VALUES (%s, %s, %s)',
+                       [seq, counter, 'x' * 64])
+
+
+def read(cursor, rng, seq):
+    """A timeline-ish read: a counter and its latest events"""
+    counter = rng.randrange(COUNTERS)
+    cursor.execute('SELECT value FROM bench_counter WHERE id = %s', [counter])
+    cursor.fetchone()
+    cursor.execute('SELECT id, payload FROM bench_event WHERE counter_id = %s ORDER BY id DESC LIMIT 20', [counter])
+    cursor.fetchall()
+
+
+class Command(BaseCommand):
+    help = 'Measure throughput and latency of concurrent reads and writes against the configured database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent workers (gunicorn runs 2 x 4)')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds to run')
+        parser.add_argument('--write-ratio', type=float, default=0.2, help='Share of operations that write')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        settings_dict = connection.settings_dict
+        self.stdout.write(
+            f'{connection.vendor} {settings_dict["NAME"]}, options {settings_dict["OPTIONS"]}, '
+            f'{options["threads"]} threads, {options["duration"]:.0f}s, {options["write_ratio"]:.0%} writes'
+        )
+        with connection.cursor() as cursor:
+            for sql in TEARDOWN + SETUP:
+                cursor.execute(sql)
+            cursor.executemany('INSERT INTO bench_counter (id, value) VALUES (%s, 0)', [[i] for i in range(COUNTERS)])
+
+        results = {'read': [], 'write': [], 'errors': 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options['duration']
+
+        def worker(number):
+            rng = random.Random(options['seed'] * 1000 + number)
+            timings = {'read': [], 'write': []}
+            errors = 0
+            seq = number
+            try:
+                with connection.cursor() as cursor:
+                    while time.perf_counter() < deadline:
+                        kind = 'write' if rng.random() < options['write_ratio'] else 'read'
+                        started = time.perf_counter()
+                        try:
+                            (write if kind == 'write' else read)(cursor, rng, seq)
+                        except OperationalError:
+                            # "database is locked" and friends: the request would 500
+                            errors += 1
+                            continue
+                        timings[kind].append(time.perf_counter() - started)
+                        seq += options['threads']
+            finally:
+                connections.close_all()
+            with lock:
+                results['read'].extend(timings['read'])
+                results['write'].extend(timings['write'])
+                results['errors'] += errors
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        with connection.cursor() as cursor:
+            for sql in TEARDOWN:
+                cursor.execute(sql)
+
+        total = len(results['read']) + len(results['write'])
+        self.stdout.write(f'{total / elapsed:.0f} ops/s, {results["errors"]} failed with OperationalError')
+        for kind in ('read', 'write'):
+            timings = sorted(results[kind])
+            if not timings:
+                continue
+            p50 = statistics.median(timings) * 1000
+            p95 = timings[int(len(timings) * 0.95)] * 1000
+            p99 = timings[int(len(timings) * 0.99)] * 1000
+            self.stdout.write(f'  {kind:5} n={len(timings):6}  p50 {p50:.2f}ms  p95 {p95:.2f}ms  p99 {p99:.2f}ms')
+        self.stdout.write(self.style.SUCCESS('Done'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from lookbook.storage import collect_garbage
+
+
+class Command(BaseCommand):
+    help = 'Delete stored media blobs that no row references any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report without deleting')
+        parser.add_argument('--grace-hours', type=float,
+                            help='Keep unreferenced blobs newer than this (default MEDIA_GC_GRACE_HOURS)')
+
+    def handle(self, *args, **options):
+        grace = options['grace_hours']
+        seen, removed, freed = collect_garbage(
+            grace_seconds=grace * 3600 if grace is not None else None,
+            dry_run=options['dry_run'],
+        )
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {removed} of {seen} blob(s), {freed / 1024 ** 2:.1f} MiB'
+        ))
@@ -0,0 +1,153 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from comments.models import Comment
+from groups.models import Group
+from pages.models import Page
+from posts.models import Post
+from search import typeahead
+
+User = get_user_model()
+
+# Hot read endpoints; {placeholders} are filled from existing rows
+ENDPOINTS = [
+    '/api/posts/',
+    '/api/posts/timeline/',
+    '/api/posts/{post}/',
+    '/api/comments/post/{post}/',
+    '/api/comments/{comment}/replies/',
+    '/api/friends/',
+    '/api/friends/categories/',
+    '/api/pages/',
+    '/api/pages/my/',
+    '/api/pages/{page_username}/',
+    '/api/pages/{page}/followers/',
+    '/api/groups/',
+    '/api/groups/{group}/',
+    '/api/users/profile/',
+    '/api/users/{user}/',
+    '/api/users/blocked/',
+    '/api/search/?q={word}&type=posts',
+    '/api/search/autocomplete/?q={prefix}',
+]
+
+# Plan lines that read a whole table: SQLite "SCAN t" without an index,
+# PostgreSQL "Seq Scan on t"
+SQLITE_SCAN_RE = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+POSTGRES_SCAN_RE = re.compile(r'Seq Scan on (\w+)')
+
+
+class Rollback(Exception):
+    pass
+
+
+def placeholders(viewer):
+    """Values for the ENDPOINTS placeholders, from the newest matching rows"""
+    values = {'prefix': viewer.username[:2]}
+    post = Post.objects.filter(is_visible=True, visibility='public').order_by('-created_at').first()
+    if post:
+        values['post'] = post.pk
+        words = re.findall(r'\w{3,}', post.content)
+        if words:
+            values['word'] = words[0]
+    comment = Comment.objects.filter(parent__isnull=True, replies__isnull=False).order_by('-created_at').first()
+    if comment:
+        values['comment'] = comment.pk
+    page = Page.objects.order_by('-created_at').first()
+    if page:
+        values['page'], values['page_username'] = page.pk, page.username
+    group = Group.objects.order_by('-created_at').first()
+    if group:
+        values['group'] = group.pk
+    other = User.objects.filter(is_active=True).exclude(pk=viewer.pk).order_by('-pk').first()
+    if other:
+        values['user'] = other.pk
+    return values
+
+
+def explain(sql):
+    """Plan lines for a SELECT, and the tables it reads with a full scan"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            lines = [row[3] for row in cursor.fetchall()]
+            pattern = SQLITE_SCAN_RE
+        else:
+            cursor.execute('EXPLAIN ' + sql)
+            lines = [row[0] for row in cursor.fetchall()]
+            pattern = POSTGRES_SCAN_RE
+    tables = set(connection.introspection.table_names())
+    scans = []
+    for line in lines:
+        match = pattern.search(line.strip())
+        # Only real tables: subqueries, CTEs and virtual tables are fine
+        if match and match.group(1) in tables:
+            scans.append(match.group(1))
+    return lines, scans
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the queries behind the hot API endpoints and flag full table scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Viewer user id (default: the first active user)')
+        parser.add_argument('--ignore', action='append', default=[],
+                            help='Table whose scans are expected, e.g. a tiny lookup table (repeatable)')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan, not only flagged ones')
+
+    def handle(self, *args, **options):
+        viewers = User.objects.filter(is_active=True).order_by('pk')
+        viewer = viewers.filter(pk=options['user']).first() if options['user'] else viewers.first()
+        if viewer is None:
+            raise CommandError('No active user to make the requests as')
+
+        values = placeholders(viewer)
+        # The typeahead index is loaded with one deliberate full read per
+        # process; build it first so only per-request queries are checked
+        typeahead.index.sync()
+        client = APIClient()
+        client.force_authenticate(viewer)
+        flagged = 0
+        try:
+            # Requests are reads, but roll back anything they might write
+            with transaction.atomic(), override_settings(ALLOWED_HOSTS=['testserver']):
+                for template in ENDPOINTS:
+                    try:
+                        url = template.format(**values)
+                    except KeyError as missing:
+                        self.stdout.write(f'{template}: skipped, no row for {missing}')
+                        continue
+                    flagged += self.check_endpoint(client, url, options)
+                raise Rollback
+        except Rollback:
+            pass
+
+        if flagged:
+            raise CommandError(f'{flagged} query(ies) read a whole table')
+        self.stdout.write(self.style.SUCCESS(f'No full table scans in {len(ENDPOINTS)} endpoint(s)'))
+
+    def check_endpoint(self, client, url, options):
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url, secure=True)
+        selects = list(dict.fromkeys(
+            query['sql'] for query in ctx.captured_queries if query['sql'].lstrip().upper().startswith('SELECT')
+        ))
+        self.stdout.write(f'{url}: {response.status_code}, {len(selects)} distinct SELECT(s)')
+
+        flagged = 0
+        for sql in selects:
+            lines, scans = explain(sql)
+            scans = [table for table in scans if table not in options['ignore']]
+            if scans:
+                flagged += 1
+                self.stdout.write(self.style.WARNING(f'  full scan of {", ".join(sorted(set(scans)))}:'))
+                self.stdout.write(f'    {sql}')
+            if scans or options['verbose_plans']:
+                for line in lines:
+                    self.stdout.write(f'      {line}')
+        return flagged
@@ -0,0 +1,33 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from lookbook.images import IMAGE_FIELDS, process_image, renditions_field
+
+
+class Command(BaseCommand):
+    help = 'Render missing or stale image renditions (backfill, or after a worker was lost)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', action='append', dest='models', choices=sorted(IMAGE_FIELDS),
+                            help='Only these models (repeatable)')
+        parser.add_argument('--force', action='store_true', help='Re-render images that already have renditions')
+
+    def handle(self, *args, **options):
+        rendered = failed = 0
+        for model_label in options['models'] or IMAGE_FIELDS:
+            model = apps.get_model(model_label)
+            for field_name in IMAGE_FIELDS[model_label]:
+                column = renditions_field(field_name)
+                # Materialized up front: rows are updated while we go
+                rows = list(
+                    model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                    .values_list('pk', field_name, column)
+                )
+                for pk, source, data in rows:
+                    if not options['force'] and (data or {}).get('source') == source:
+                        continue
+                    if process_image(model_label, pk, field_name, source):
+                        rendered += 1
+                    else:
+                        failed += 1
+        self.stdout.write(self.style.SUCCESS(f'Rendered {rendered} image(s), {failed} failed'))
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from lookbook.seed import rebuild_derived, seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the database with a synthetic heavy-tailed social graph (users, friendships, pages, groups, '
+        'posts, likes, nested comments) using batched bulk inserts'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--avg-friends', type=int, default=20, help='Mean friendships per user')
+        parser.add_argument('--pages', type=int, default=1_000)
+        parser.add_argument('--avg-followers', type=int, default=200, help='Mean followers per page')
+        parser.add_argument('--groups', type=int, default=500)
+        parser.add_argument('--avg-members', type=int, default=100, help='Mean members per group')
+        parser.add_argument('--avg-likes', type=float, default=5, help='Mean likes per post')
+        parser.add_argument('--avg-comments', type=float, default=2, help='Mean comments per post')
+        parser.add_argument('--max-depth', type=int, default=3, help='Deepest reply level')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='seed', help='Username prefix, e.g. seed42')
+        parser.add_argument('--password', default='lookbook', help='Shared by every seeded user')
+        # Both take far longer than the inserts at the default size; the
+        # rebuild_timelines and rebuild_friend_suggestions commands can also run later
+        parser.add_argument('--with-timelines', action='store_true', help='Also build every home timeline')
+        parser.add_argument('--with-suggestions', action='store_true', help='Also rank friend suggestions')
+        parser.add_argument('--skip-search', action='store_true', help='Leave the search index as it was')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def progress(message):
+            self.stdout.write(f'[{time.perf_counter() - started:7.1f}s] {message}')
+
+        seeder = seed(
+            options['users'], options['posts'], avg_friends=options['avg_friends'],
+            pages=options['pages'], avg_followers=options['avg_followers'],
+            groups=options['groups'], avg_members=options['avg_members'],
+            avg_likes=options['avg_likes'], avg_comments=options['avg_comments'], max_depth=options['max_depth'],
+            seed=options['seed'], batch_size=options['batch_size'], prefix=options['prefix'],
+            password=options['password'], progress=progress,
+        )
+        rebuild_derived(
+            seeder.user_ids, timelines=options['with_timelines'],
+            suggestions=options['with_suggestions'], search=not options['skip_search'], progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded in {time.perf_counter() - started:.1f}s: '
+            + ', '.join(f'{count} {name}' for name, count in seeder.counts.items())
+        ))
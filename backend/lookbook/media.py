@@ -0,0 +1,168 @@
+"""
+Media file serving with byte ranges, validators and sendfile offload.
+
+`django.views.static.serve` reads every file through Python and ignores
+Range, so seeking in a video downloads it again from byte 0. This view:
+
+* answers `Range: bytes=...` with 206 (one range; multi-range requests
+  get the whole file, which RFC 9110 allows) and honours If-Range;
+* sends a strong ETag/Last-Modified and 304s on revalidation;
+* marks content-hashed names immutable for a year, other files are
+  cached for MEDIA_CACHE_MAX_AGE and revalidated;
+* with MEDIA_SENDFILE_BACKEND set, only sends headers and lets the front
+  server stream the file (`X-Sendfile` for Apache/lighttpd,
+  `X-Accel-Redirect` for nginx, which also handles ranges);
+* otherwise returns a FileResponse, which gunicorn hands to os.sendfile()
+  through wsgi.file_wrapper, so the bytes never pass through Python.
+"""
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# A path segment carrying a hex digest is content-addressed: its bytes never change
+HASHED_NAME_RE = re.compile(r'(^|[/_.-])[0-9a-f]{16,}([/_.-]|$)')
+
+ONE_YEAR = 365 * 24 * 60 * 60
+
+
+class RangeFile:
+    """File-like view of `length` bytes of an open file, starting at its position"""
+    def __init__(self, fh, length):
+        self.fh = fh
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.fh.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        # Lets wsgi.file_wrapper use sendfile; it stops at Content-Length
+        return self.fh.fileno()
+
+    def close(self):
+        self.fh.close()
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single satisfiable range, 'invalid', or None to ignore"""
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or size == 0:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return 'invalid'
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        return 'invalid'
+    return start, end
+
+
+def _etag(st):
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def _not_modified(request, etag, mtime):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        return etag in parse_etags(if_none_match) or if_none_match.strip() == '*'
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return since is not None and int(mtime) <= since
+
+
+def _range_applies(request, etag, mtime):
+    """If-Range: only honour Range when the client's copy is current"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(mtime)
+
+
+def _cache_headers(response, path, etag, mtime):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(mtime)
+    if HASHED_NAME_RE.search(path):
+        patch_cache_control(response, public=True, max_age=ONE_YEAR, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=settings.MEDIA_CACHE_MAX_AGE)
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Not found')
+    try:
+        st = os.stat(fullpath)
+    except OSError:
+        raise Http404('Not found')
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404('Not found')
+
+    etag, mtime, size = _etag(st), st.st_mtime, st.st_size
+    if _not_modified(request, etag, mtime):
+        response = HttpResponseNotModified()
+        _cache_headers(response, path, etag, mtime)
+        return response
+
+    # Like FileResponse, never send Content-Encoding for .gz etc.
+    content_type = mimetypes.guess_type(fullpath)[0] or 'application/octet-stream'
+
+    backend = settings.MEDIA_SENDFILE_BACKEND
+    if backend:
+        # The front server streams the file (and handles Range itself)
+        response = HttpResponse(content_type=content_type)
+        if backend == 'nginx':
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + quote(path)
+        else:
+            response['X-Sendfile'] = fullpath
+        _cache_headers(response, path, etag, mtime)
+        return response
+
+    byte_range = None
+    if request.headers.get('Range') and _range_applies(request, etag, mtime):
+        byte_range = parse_range(request.headers['Range'], size)
+    if byte_range == 'invalid':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    fh = open(fullpath, 'rb')
+    if byte_range:
+        start, end = byte_range
+        fh.seek(start)
+        length = end - start + 1
+        response = FileResponse(RangeFile(fh, length), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        length = size
+        response = FileResponse(RangeFile(fh, length), content_type=content_type)
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    _cache_headers(response, path, etag, mtime)
+    return response
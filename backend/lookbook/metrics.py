@@ -0,0 +1,404 @@
+"""
+Per-request instrumentation: SQL query count and time, serialization time,
+total time and response size, per endpoint.
+
+RequestMetricsMiddleware times every request and counts its queries with a
+database execute wrapper, installed on every connection and reporting to
+the request in the current context, so queries that async views run on
+other threads (sync_to_async, the async ORM) are counted too. DRF views that include InstrumentedViewMixin also
+report `serialize`: the Python time spent building and rendering the body
+(view code outside SQL, serializers, renderer). Views declare the most
+queries a request may make in `query_budget`; function views use the
+@query_budget decorator.
+
+Numbers go out two ways:
+- a `Server-Timing` header (SERVER_TIMING setting), shown by browser devtools;
+- counters and histograms per endpoint (the URL route, e.g.
+  `api/posts/<int:pk>/`). Each process accumulates its own and copies a
+  snapshot into the shared cache every METRICS_FLUSH_INTERVAL seconds;
+  /api/metrics/ adds up the snapshots of every process in Prometheus text
+  format.
+"""
+import copy
+import contextvars
+import hmac
+import logging
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from rest_framework import permissions
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .conditional import ConditionalGetMixin
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets (+Inf is implicit)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+PROCESSES_KEY = 'metrics:processes'
+# Snapshots of processes that stopped flushing (restarted workers) expire
+PROCESS_TIMEOUT = 24 * 60 * 60
+PROCESS_ID = f'{socket.gethostname()}:{os.getpid()}'
+
+# The RequestMetrics of the request being handled in this context
+_current = contextvars.ContextVar('lookbook_request_metrics', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised instead of logged when QUERY_BUDGETS_STRICT is on (tests)"""
+
+
+class RequestMetrics:
+    """What one request spent, filled in by the middleware and the view mixin"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = None
+        self._handler_started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+    def handler_started(self):
+        self._handler_started = (time.perf_counter(), self.db_time)
+
+    def handler_finished(self):
+        if self._handler_started is None:
+            return
+        started, db_time = self._handler_started
+        self._handler_started = None
+        elapsed = (time.perf_counter() - started) - (self.db_time - db_time)
+        self.serialize_time = (self.serialize_time or 0.0) + elapsed
+
+
+def _count_query(execute, sql, params, many, context):
+    # Execute wrapper on every connection
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install_query_counter(connection, **kwargs):
+    """connection_created receiver; each thread has its own connection objects"""
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _count_query)
+
+
+def connect_query_counter():
+    connection_created.connect(install_query_counter, dispatch_uid='lookbook.metrics.query_counter')
+    for connection in connections.all(initialized_only=True):
+        install_query_counter(connection)
+
+
+def _new_series():
+    return {
+        'statuses': {},
+        'duration_buckets': [0] * (len(DURATION_BUCKETS) + 1),
+        'duration_sum': 0.0,
+        'query_buckets': [0] * (len(QUERY_BUCKETS) + 1),
+        'queries_sum': 0,
+        'db_sum': 0.0,
+        'serialize_sum': 0.0,
+        'bytes_sum': 0,
+        'over_budget': 0,
+    }
+
+
+class Registry:
+    """Cumulative per-(endpoint, method) numbers for this process"""
+
+    def __init__(self):
+        self.series = {}
+        self.lock = threading.Lock()
+        self.flushed_at = 0.0
+
+    def observe(self, endpoint, method, status, duration, metrics, size, over_budget):
+        with self.lock:
+            series = self.series.get((endpoint, method))
+            if series is None:
+                series = self.series[(endpoint, method)] = _new_series()
+            series['statuses'][status] = series['statuses'].get(status, 0) + 1
+            series['duration_buckets'][bisect_left(DURATION_BUCKETS, duration)] += 1
+            series['duration_sum'] += duration
+            series['query_buckets'][bisect_left(QUERY_BUCKETS, metrics.queries)] += 1
+            series['queries_sum'] += metrics.queries
+            series['db_sum'] += metrics.db_time
+            series['serialize_sum'] += metrics.serialize_time or 0.0
+            series['bytes_sum'] += size
+            series['over_budget'] += over_budget
+            due = time.monotonic() - self.flushed_at >= settings.METRICS_FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Publish this process's snapshot to the shared cache"""
+        with self.lock:
+            self.flushed_at = time.monotonic()
+            snapshot = copy.deepcopy(self.series)
+        cache.set(f'metrics:process:{PROCESS_ID}', snapshot, PROCESS_TIMEOUT)
+        processes = cache.get(PROCESSES_KEY, set())
+        if PROCESS_ID not in processes:
+            # Racing processes may drop each other here; both re-add on their next flush
+            cache.set(PROCESSES_KEY, processes | {PROCESS_ID}, None)
+
+    def reset(self):
+        with self.lock:
+            self.series = {}
+            self.flushed_at = 0.0
+
+
+registry = Registry()
+
+
+def collect():
+    """Every live process's series, summed per (endpoint, method)"""
+    registry.flush()
+    processes = cache.get(PROCESSES_KEY, set())
+    snapshots = cache.get_many([f'metrics:process:{process}' for process in processes])
+    if len(snapshots) < len(processes):
+        live = {key.split(':', 2)[2] for key in snapshots}
+        cache.set(PROCESSES_KEY, live, None)
+    totals = {}
+    for snapshot in snapshots.values():
+        for key, series in snapshot.items():
+            total = totals.setdefault(key, _new_series())
+            for status, count in series['statuses'].items():
+                total['statuses'][status] = total['statuses'].get(status, 0) + count
+            for name in ('duration_buckets', 'query_buckets'):
+                total[name] = [a + b for a, b in zip(total[name], series[name])]
+            for name in ('duration_sum', 'queries_sum', 'db_sum', 'serialize_sum', 'bytes_sum', 'over_budget'):
+                total[name] += series[name]
+    return totals
+
+
+# -- budgets ----------------------------------------------------------------
+
+def query_budget(budget):
+    """Declare the query budget of an @api_view function view (put it above @api_view)"""
+    def decorator(view):
+        view.cls.query_budget = budget
+        return view
+    return decorator
+
+
+def budget_for(request):
+    """The matched view's query budget for this request's method, or None"""
+    match = getattr(request, 'resolver_match', None)
+    view_class = getattr(match.func, 'cls', None) if match else None
+    budget = getattr(view_class, 'query_budget', None)
+    if isinstance(budget, dict):
+        budget = budget.get(request.method)
+    elif request.method not in ('GET', 'HEAD'):
+        # A bare number applies to reads
+        budget = None
+    if budget is None:
+        return None
+    if request.headers.get('Authorization', '').startswith('Bearer '):
+        # Plus JWTAuthentication's user lookup (budgets count the view's own queries)
+        budget += 1
+    if 'If-None-Match' in request.headers and issubclass(view_class, ConditionalGetMixin):
+        # Plus the narrow query that checks the ETag before loading rows
+        budget += 1
+    return budget
+
+
+class InstrumentedViewMixin:
+    """
+    Reports the time a DRF view spends building and rendering its response,
+    outside SQL. `query_budget` is the most queries one request may make:
+    a number for GET/HEAD or a dict per method.
+    """
+    query_budget = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        metrics = getattr(request, '_metrics', None)
+        if metrics:
+            metrics.handler_started()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        metrics = getattr(request, '_metrics', None)
+        if not metrics:
+            return super().finalize_response(request, response, *args, **kwargs)
+        if metrics._handler_started is None:
+            # The handler never ran (authentication or permission failed)
+            metrics.handler_started()
+        response = super().finalize_response(request, response, *args, **kwargs)
+        # Render here rather than in the handler stack so it is counted
+        if hasattr(response, 'render') and not response.is_rendered:
+            response.render()
+        metrics.handler_finished()
+        return response
+
+
+# -- middleware -------------------------------------------------------------
+
+def _server_timing(metrics, total):
+    parts = [f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"']
+    if metrics.serialize_time is not None:
+        parts.append(f'serialize;dur={metrics.serialize_time * 1000:.1f}')
+    parts.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(parts)
+
+
+class RequestMetricsMiddleware:
+    """
+    Counts queries and times every request; first in MIDDLEWARE so the total
+    covers the stack. Sync and async capable, so ASGI requests to async
+    views never need a thread for it.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = request._metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.record(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = request._metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.record(request, response, metrics)
+
+    def record(self, request, response, metrics):
+        duration = time.perf_counter() - metrics.started
+
+        match = getattr(request, 'resolver_match', None)
+        endpoint = match.route if match else 'unmatched'
+        budget = budget_for(request)
+        over_budget = budget is not None and metrics.queries > budget
+        if over_budget:
+            message = f'{request.method} {endpoint} made {metrics.queries} queries, budget is {budget}'
+            if settings.QUERY_BUDGETS_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+        if response.streaming:
+            size = int(response.get('Content-Length') or 0)
+        else:
+            size = len(response.content)
+        registry.observe(endpoint, request.method, response.status_code, duration, metrics, size, over_budget)
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = _server_timing(metrics, duration)
+        return response
+
+
+# -- exposition -------------------------------------------------------------
+
+# (name, series field, help) of the plain per-(endpoint, method) counters
+COUNTERS = (
+    ('lookbook_db_duration_seconds_total', 'db_sum', 'Time spent executing SQL'),
+    ('lookbook_serialize_duration_seconds_total', 'serialize_sum',
+     'Python time building and rendering response bodies (instrumented DRF views)'),
+    ('lookbook_response_bytes_total', 'bytes_sum', 'Response body bytes'),
+    ('lookbook_query_budget_exceeded_total', 'over_budget', 'Requests that made more queries than their view allows'),
+)
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _histogram(lines, name, bounds, buckets, total, labels):
+    cumulative = 0
+    for bound, count in zip(list(bounds) + ['+Inf'], buckets):
+        cumulative += count
+        lines.append(f'{name}_bucket{_labels(**labels, le=bound)} {cumulative}')
+    lines.append(f'{name}_sum{_labels(**labels)} {total}')
+    lines.append(f'{name}_count{_labels(**labels)} {cumulative}')
+
+
+def render_prometheus(totals):
+    """Prometheus text exposition (format 0.0.4) of collect() output"""
+    ordered = [({'endpoint': endpoint, 'method': method}, series) for (endpoint, method), series in sorted(totals.items())]
+    lines = []
+
+    def family(name, kind, help_text):
+        lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} {kind}'])
+
+    family('lookbook_http_requests_total', 'counter', 'Requests handled, by route, method and status')
+    for labels, series in ordered:
+        for status, count in sorted(series['statuses'].items()):
+            lines.append(f'lookbook_http_requests_total{_labels(**labels, status=status)} {count}')
+
+    name = 'lookbook_http_request_duration_seconds'
+    family(name, 'histogram', 'Time from the first to the last middleware')
+    for labels, series in ordered:
+        _histogram(lines, name, DURATION_BUCKETS, series['duration_buckets'], series['duration_sum'], labels)
+
+    name = 'lookbook_db_queries_per_request'
+    family(name, 'histogram', 'SQL queries made by one request')
+    for labels, series in ordered:
+        _histogram(lines, name, QUERY_BUCKETS, series['query_buckets'], series['queries_sum'], labels)
+
+    for name, field, help_text in COUNTERS:
+        family(name, 'counter', help_text)
+        for labels, series in ordered:
+            lines.append(f'{name}{_labels(**labels)} {series[field]}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsTokenAuthentication(BaseAuthentication):
+    """`Authorization: Bearer <METRICS_TOKEN>` for the Prometheus scraper"""
+
+    def authenticate(self, request):
+        token = settings.METRICS_TOKEN
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if token and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode()):
+            return AnonymousUser(), 'metrics-token'
+        return None
+
+    def authenticate_header(self, request):
+        return 'Bearer realm="metrics"'
+
+
+class IsScraperOrStaff(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return request.auth == 'metrics-token' or bool(request.user and request.user.is_staff)
+
+
+@api_view(['GET'])
+@authentication_classes([MetricsTokenAuthentication, JWTAuthentication])
+@permission_classes([IsScraperOrStaff])
+def metrics_view(request):
+    """Request metrics of every process in Prometheus format (staff or METRICS_TOKEN)"""
+    return HttpResponse(render_prometheus(collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
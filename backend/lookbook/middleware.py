@@ -0,0 +1,36 @@
+"""
+Middleware adapted for the ASGI application.
+
+Django runs a sync-only middleware in a thread, and that thread is held
+until the response comes back through it, so a single sync middleware in
+MIDDLEWARE takes away what async views save. Everything in MIDDLEWARE is
+therefore async capable.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoiseMiddleware that also runs in an async middleware chain"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            # Only stats and opens the file; ASGIHandler reads it from a thread
+            return self.serve(static_file, request)
+        return await self.get_response(request)
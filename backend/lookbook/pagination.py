@@ -0,0 +1,178 @@
+import base64
+import binascii
+import json
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset ("seek") pagination on (created_at, id).
+
+    Unlike PageNumberPagination there is no COUNT(*) and no OFFSET: each page
+    is a `WHERE (created_at, id) < (last seen)` range read backed by a
+    composite index, so page 1000 costs the same as page 1. Cursors are
+    opaque urlsafe-base64 JSON and stay stable while rows are inserted.
+
+    Views can override the key with `keyset_ordering`; every field must be
+    readable as an attribute of the returned objects and the last field must
+    be unique.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self._page_queryset(queryset, request, view)
+        return self._set_page(list(queryset[:self.page_size + 1]))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() reading the page with the async ORM"""
+        queryset = self._page_queryset(queryset, request, view)
+        return self._set_page([obj async for obj in queryset[:self.page_size + 1]])
+
+    def _page_queryset(self, queryset, request, view):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.key = tuple(getattr(view, 'keyset_ordering', self.ordering))
+
+        self.cursor = cursor = self.decode_cursor(request, queryset)
+        self.reverse = reverse = bool(cursor and cursor['r'])
+        ordering = [self._flip(field) for field in self.key] if reverse else list(self.key)
+
+        queryset = queryset.order_by(*ordering)
+        if cursor:
+            queryset = queryset.filter(self._seek(ordering, cursor['k']))
+        return queryset
+
+    def _set_page(self, results):
+        # results: up to page_size + 1 rows, the extra one telling whether there are more
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+
+        self.page = results
+        self.has_next = True if self.reverse else has_more
+        self.has_previous = has_more if self.reverse else self.cursor is not None
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results to return per page.',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._link(self.page[0], reverse=True)
+
+    def encode_cursor(self, values, reverse):
+        payload = json.dumps({'k': values, 'r': int(reverse)}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request, queryset=None):
+        """
+        The request's cursor, or None; with `queryset`, its key values are
+        parsed as the types of the key columns. NotFound if it was tampered
+        with.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+            cursor = json.loads(payload)
+            if cursor['r'] not in (0, 1) or not isinstance(cursor['k'], list) or len(cursor['k']) != len(self.key):
+                raise ValueError
+            if queryset is not None:
+                cursor['k'] = [self._parse_key(queryset, field, value) for field, value in zip(self.key, cursor['k'])]
+            return cursor
+        except (binascii.Error, ValueError, KeyError, TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def _parse_key(queryset, field, value):
+        if value is None:
+            # Keys are never null, and (a < NULL) would match nothing
+            raise ValueError
+        # Model fields and annotations (e.g. the timeline's timeline_at) alike
+        return queryset.query.resolve_ref(field.lstrip('-')).output_field.to_python(value)
+
+    def _link(self, obj, reverse):
+        values = []
+        for field in self.key:
+            value = getattr(obj, field.lstrip('-'))
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(values, reverse))
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _seek(ordering, values):
+        """Rows strictly after `values` in `ordering`, as (a < x) OR (a = x AND b < y) ..."""
+        clauses = []
+        for i, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {ordering[j].lstrip('-'): values[j] for j in range(i)}
+            clauses.append(Q(**equal, **{f'{name}__{lookup}': values[i]}))
+        return reduce(lambda a, b: a | b, clauses)
@@ -0,0 +1,164 @@
+"""
+Shared response cache for anonymous reads.
+
+Rendered responses are stored in the default cache under a key built from
+the URL (with sorted query params), the viewer class, the negotiated format
+and the current *generation* of every scope the view depends on. Saving or
+deleting a model bumps its scope's generation, so stale entries are never
+read again and simply expire. The cache and its generations must be shared
+by every worker process (the file or redis backend): with a per-process
+cache (CACHE_SHARED off) a bump would only reach one worker, so responses
+are not cached at all.
+
+Authenticated responses carry per-viewer fields (is_liked, has_blocked_me,
+...) and always bypass the cache.
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.http import HttpResponse
+from rest_framework import permissions
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+# Scope -> models whose changes invalidate it. PageFollower and
+# GroupMember are included because follower/member counters are updated
+# with queryset.update(), which sends no post_save for Page/Group.
+INVALIDATION_SCOPES = {
+    'posts': ['posts.Post', 'posts.Like', 'comments.Comment'],
+    'pages': ['pages.Page', 'pages.PageFollower'],
+    'groups': ['groups.Group', 'groups.GroupMember'],
+}
+
+# Validators set by ConditionalGetMixin, replayed on cache hits
+STORED_HEADERS = ('ETag', 'Last-Modified', 'Vary')
+
+HITS_KEY = 'respcache:hits'
+MISSES_KEY = 'respcache:misses'
+
+
+def _generation_key(scope):
+    return f'respcache:gen:{scope}'
+
+
+def get_generations(scopes):
+    """Current generation of each scope, starting missing ones at a fresh value"""
+    keys = [_generation_key(scope) for scope in scopes]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            # Time-based start so an evicted generation never repeats an old one
+            cache.add(key, time.time_ns(), None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def bump_generation(scope):
+    try:
+        cache.incr(_generation_key(scope))
+    except ValueError:
+        cache.set(_generation_key(scope), time.time_ns(), None)
+
+
+def bump_generation_on_commit(scope):
+    """For changes made with queryset.update(), which sends no post_save"""
+    transaction.on_commit(lambda: bump_generation(scope))
+
+
+def connect_invalidation_signals():
+    for scope, models in INVALIDATION_SCOPES.items():
+        def invalidate(sender, scope=scope, **kwargs):
+            bump_generation(scope)
+        for model in models:
+            for signal in (post_save, post_delete):
+                signal.connect(invalidate, sender=model, weak=False,
+                               dispatch_uid=f'respcache:{scope}:{model}:{signal is post_save}')
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def response_cache_key(request, scopes, viewer='anon'):
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    url = f'{request.scheme}://{request.get_host()}{request.path}?{query}'
+    digest = hashlib.sha1(url.encode()).hexdigest()
+    generations = '.'.join(str(g) for g in get_generations(scopes))
+    return f'respcache:{viewer}:{request.accepted_renderer.format}:{generations}:{digest}'
+
+
+def response_cache_enabled():
+    return settings.RESPONSE_CACHE_ENABLED and settings.CACHE_SHARED
+
+
+class CachedResponseMixin:
+    """
+    Serve anonymous GETs from the response cache. Views list the
+    INVALIDATION_SCOPES their output depends on in `cache_scopes`.
+    """
+    cache_scopes = ()
+
+    def get(self, request, *args, **kwargs):
+        cached = self.cached_response(request)
+        if cached is not None:
+            return cached
+        return super().get(request, *args, **kwargs)
+
+    def cached_response(self, request):
+        """The stored response for an anonymous GET, or None (finalize_response then stores this one)"""
+        if not response_cache_enabled() or request.user.is_authenticated:
+            return None
+
+        key = response_cache_key(request, self.cache_scopes)
+        cached = cache.get(key)
+        if cached is not None:
+            _count(HITS_KEY)
+            content, content_type, headers = cached
+            response = HttpResponse(content, content_type=content_type)
+            for name, value in headers.items():
+                response[name] = value
+            response['X-Cache'] = 'HIT'
+            return response
+
+        _count(MISSES_KEY)
+        request._response_cache_key = key
+        return None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(request, '_response_cache_key', None)
+        if key and isinstance(response, Response) and response.status_code == 200:
+            response.render()
+            headers = {name: response[name] for name in STORED_HEADERS if response.has_header(name)}
+            cache.set(key, (response.content, response['Content-Type'], headers), settings.RESPONSE_CACHE_TIMEOUT)
+            response['X-Cache'] = 'MISS'
+        return response
+
+
+def response_cache_stats():
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = counts.get(HITS_KEY, 0), counts.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+        'backend': settings.CACHE_BACKEND,
+        'enabled': response_cache_enabled(),
+    }
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def cache_stats(request):
+    """Response cache hit/miss counters (staff only)"""
+    return Response(response_cache_stats())
@@ -0,0 +1,291 @@
+"""
+Fast synthetic data for reproducing production-scale problems locally
+(`manage.py seed_lookbook`, and the API benchmark).
+
+Rows go in with bulk_create in batches, with primary keys assigned here:
+comment paths and post counters are then known before the insert, so
+nothing is saved twice and no signal or per-row save() runs. Every user
+shares one precomputed password hash.
+
+The social graph is heavy-tailed like a real one. Each user gets a
+popularity and an activity weight drawn from a Pareto distribution:
+- friendships connect users in proportion to popularity (Chung-Lu), so
+  a few users have hundreds of friends and most have a handful;
+- posts, likes, comments, page follows and group joins come from users
+  in proportion to activity;
+- likes, comments, followers and members per object have Pareto tails.
+
+Replies attach to an earlier comment of the same post (up to max_depth),
+which gives the shallow-but-bushy threads real posts have.
+"""
+import random
+from collections import Counter
+from io import StringIO
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from comments.models import PATH_SEPARATOR, Comment, path_segment
+from friends.models import Friendship
+from friends.suggestions import refresh_suggestions
+from groups.models import Group, GroupMember
+from lookbook.response_cache import bump_generation
+from pages.models import Page, PageFollower
+from posts.models import Like, Post
+from posts.timeline import rebuild_timeline
+from search import typeahead
+
+User = get_user_model()
+
+FIRST_NAMES = ['Ada', 'Grace', 'Alan', 'Linus', 'Margaret', 'Dennis', 'Barbara', 'Ken', 'Frances', 'Edsger',
+               'Radia', 'Donald', 'Sophie', 'Niklaus', 'Katherine', 'Guido', 'Hedy', 'Tim', 'Annie', 'Bjarne']
+LAST_NAMES = ['Lovelace', 'Hopper', 'Turing', 'Torvalds', 'Hamilton', 'Ritchie', 'Liskov', 'Thompson', 'Allen',
+              'Perlman', 'Knuth', 'Wilson', 'Wirth', 'Johnson', 'Rossum', 'Lamarr', 'Berners-Lee', 'Easley']
+WORDS = ('look outfit style summer autumn winter spring street vintage denim linen wool coat jacket boots '
+         'colour weekend market city light morning evening coffee friends gallery fabric pattern texture '
+         'tailored layered oversized minimal bold neutral pastel silk leather knit scarf hat sneakers').split()
+PAGE_CATEGORIES = [choice for choice, _ in Page.CATEGORY_CHOICES]
+GROUP_CATEGORIES = [choice for choice, _ in Group.CATEGORY_CHOICES]
+
+# Tail exponent of the Pareto draws: lower is more unequal
+ALPHA = 1.8
+
+
+def heavy_tailed(rng, mean, alpha=ALPHA):
+    """A non-negative integer averaging `mean`, with a Pareto tail"""
+    if mean <= 0:
+        return 0
+    # Pareto(alpha) with x_m=1 averages alpha/(alpha-1); the random() rounds without bias
+    return int(rng.paretovariate(alpha) * mean * (alpha - 1) / alpha + rng.random())
+
+
+def pick(rng, ids, cum_weights, count, exclude=()):
+    """Up to `count` distinct ids, heavier ones more often"""
+    count = min(count, len(ids))
+    chosen = set()
+    # Popular ids repeat often; a few rounds top the set up without an exact (slow) weighted sample
+    for _ in range(4):
+        if len(chosen) >= count:
+            break
+        chosen.update(rng.choices(ids, cum_weights=cum_weights, k=count - len(chosen)))
+        chosen.difference_update(exclude)
+    return sorted(chosen)[:count]
+
+
+def _sentence(rng, low, high):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(low, high))).capitalize() + '.'
+
+
+def _next_id(model):
+    last = model.objects.order_by('-pk').values_list('pk', flat=True).first()
+    return (last or 0) + 1
+
+
+class Seeder:
+    def __init__(self, seed=0, batch_size=5000, prefix='seed', password='lookbook', progress=None):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.prefix = prefix
+        self.password = password
+        self.progress = progress or (lambda message: None)
+        self.counts = Counter()
+
+    def _insert(self, model, objects):
+        with transaction.atomic():
+            model.objects.bulk_create(objects, batch_size=self.batch_size)
+        self.counts[model._meta.verbose_name_plural] += len(objects)
+
+    def _flush(self, buffers):
+        # Parents first: likes and comments reference the posts in the same batch
+        for model in (Post, Like, Comment):
+            if buffers.get(model):
+                self._insert(model, buffers[model])
+                buffers[model] = []
+
+    # -- people ---------------------------------------------------------------
+
+    def users(self, count):
+        rng = self.rng
+        password_hash = make_password(self.password)
+        first_id = _next_id(User)
+        self.user_ids = list(range(first_id, first_id + count))
+        for start in range(0, count, self.batch_size):
+            self._insert(User, [
+                User(pk=pk, username=f'{self.prefix}{pk}', password=password_hash,
+                     first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+                     email=f'{self.prefix}{pk}@example.com')
+                for pk in self.user_ids[start:start + self.batch_size]
+            ])
+        self.popularity = list(accumulate(rng.paretovariate(ALPHA) for _ in self.user_ids))
+        self.activity = list(accumulate(rng.paretovariate(ALPHA) for _ in self.user_ids))
+        self.progress(f'{count} users')
+
+    def friendships(self, avg_friends):
+        """Chung-Lu graph: both ends drawn by popularity, duplicates and self-loops dropped"""
+        rng = self.rng
+        ids, weights = self.user_ids, self.popularity
+        target = len(ids) * avg_friends // 2
+        seen = set()
+        batch = []
+        attempts = 0
+        while len(seen) < target and attempts < 3 * target:
+            draws = min(self.batch_size, target - len(seen))
+            attempts += draws
+            for a, b in zip(rng.choices(ids, cum_weights=weights, k=draws),
+                            rng.choices(ids, cum_weights=weights, k=draws)):
+                key = (a, b) if a < b else (b, a)
+                if a == b or key in seen:
+                    continue
+                seen.add(key)
+                if rng.random() < 0.5:
+                    a, b = b, a
+                batch.append(Friendship(from_user_id=a, to_user_id=b,
+                                        status='accepted' if rng.random() < 0.9 else 'pending'))
+            if len(batch) >= self.batch_size:
+                self._insert(Friendship, batch)
+                batch = []
+        self._insert(Friendship, batch)
+        self.progress(f'{len(seen)} friendships')
+
+    # -- pages and groups -----------------------------------------------------
+
+    def pages(self, count, avg_followers):
+        rng = self.rng
+        first_id = _next_id(Page)
+        self.page_ids, self.page_owners, followers = [], {}, []
+        pages = []
+        for pk in range(first_id, first_id + count):
+            owner_id = pick(rng, self.user_ids, self.popularity, 1)[0]
+            chosen = pick(rng, self.user_ids, self.activity, heavy_tailed(rng, avg_followers))
+            pages.append(Page(
+                pk=pk, owner_id=owner_id, username=f'{self.prefix}page{pk}',
+                name=f'{rng.choice(WORDS).capitalize()} {rng.choice(WORDS).capitalize()} Studio',
+                description=_sentence(rng, 5, 20), category=rng.choice(PAGE_CATEGORIES),
+                followers_count=len(chosen),
+            ))
+            followers.extend(PageFollower(page_id=pk, user_id=user_id) for user_id in chosen)
+            self.page_ids.append(pk)
+            self.page_owners[pk] = owner_id
+        self._insert(Page, pages)
+        for start in range(0, len(followers), self.batch_size):
+            self._insert(PageFollower, followers[start:start + self.batch_size])
+        # Bigger pages post more
+        self.page_weights = list(accumulate(page.followers_count + 1 for page in pages))
+        self.progress(f'{count} pages, {len(followers)} followers')
+
+    def groups(self, count, avg_members):
+        rng = self.rng
+        first_id = _next_id(Group)
+        groups, members = [], []
+        for pk in range(first_id, first_id + count):
+            creator = pick(rng, self.user_ids, self.popularity, 1)[0]
+            joined = pick(rng, self.user_ids, self.activity, heavy_tailed(rng, avg_members), exclude={creator})
+            groups.append(Group(
+                pk=pk, created_by_id=creator,
+                name=f'{rng.choice(WORDS).capitalize()} {rng.choice(WORDS).capitalize()} Club',
+                description=_sentence(rng, 5, 20), category=rng.choice(GROUP_CATEGORIES),
+                members_count=len(joined) + 1,
+            ))
+            members.append(GroupMember(group_id=pk, user_id=creator, role='admin'))
+            members.extend(GroupMember(group_id=pk, user_id=user_id, role='member') for user_id in joined)
+        self._insert(Group, groups)
+        for start in range(0, len(members), self.batch_size):
+            self._insert(GroupMember, members[start:start + self.batch_size])
+        self.progress(f'{count} groups, {len(members)} members')
+
+    # -- content --------------------------------------------------------------
+
+    def posts(self, count, avg_likes, avg_comments, max_depth=3, reply_ratio=0.4, page_post_ratio=0.05):
+        rng = self.rng
+        post_id, comment_id = _next_id(Post), _next_id(Comment)
+        buffers = {}
+        authors = rng.choices(self.user_ids, cum_weights=self.activity, k=count)
+        for n, author_id in enumerate(authors):
+            page_id = None
+            if self.page_ids and rng.random() < page_post_ratio:
+                page_id = rng.choices(self.page_ids, cum_weights=self.page_weights)[0]
+                author_id = self.page_owners[page_id]
+            roll = rng.random()
+            visibility = 'public' if page_id or roll < 0.8 else ('friends' if roll < 0.95 else 'private')
+
+            likers = pick(rng, self.user_ids, self.activity, heavy_tailed(rng, avg_likes))
+            buffers.setdefault(Like, []).extend(Like(post_id=post_id, user_id=user_id) for user_id in likers)
+
+            # (id, path, depth) of this post's comments, for picking reply parents
+            thread = []
+            for _ in range(heavy_tailed(rng, avg_comments)):
+                parents = [c for c in thread if c[2] < max_depth] if rng.random() < reply_ratio else []
+                if parents:
+                    parent_id, parent_path, parent_depth = rng.choice(parents)
+                    path, depth = parent_path + PATH_SEPARATOR + path_segment(comment_id), parent_depth + 1
+                else:
+                    parent_id, path, depth = None, path_segment(comment_id), 0
+                buffers.setdefault(Comment, []).append(Comment(
+                    pk=comment_id, post_id=post_id, parent_id=parent_id, path=path, depth=depth,
+                    author_id=rng.choices(self.user_ids, cum_weights=self.activity)[0],
+                    content=_sentence(rng, 2, 25),
+                ))
+                thread.append((comment_id, path, depth))
+                comment_id += 1
+
+            buffers.setdefault(Post, []).append(Post(
+                pk=post_id, author_id=author_id, page_id=page_id, visibility=visibility,
+                content=_sentence(rng, 5, 60), likes_count=len(likers), comments_count=len(thread),
+            ))
+            post_id += 1
+            if len(buffers[Post]) >= self.batch_size:
+                self._flush(buffers)
+                if (n + 1) % (self.batch_size * 20) == 0:
+                    self.progress(f'{n + 1} posts')
+        self._flush(buffers)
+        self.progress(f'{count} posts, {self.counts["likes"]} likes, {self.counts["comments"]} comments')
+
+    def reset_sequences(self):
+        """Move PostgreSQL sequences past the ids assigned here (a no-op on SQLite)"""
+        statements = connection.ops.sequence_reset_sql(no_style(), [User, Page, Group, Post, Comment])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def seed(users, posts, avg_friends=20, pages=0, avg_followers=50, groups=0, avg_members=30,
+         avg_likes=3, avg_comments=2, max_depth=3, **options):
+    """Insert a whole social graph; returns the Seeder (row `counts`, `user_ids`)"""
+    seeder = Seeder(**options)
+    seeder.users(users)
+    seeder.friendships(avg_friends)
+    seeder.pages(pages, avg_followers)
+    seeder.groups(groups, avg_members)
+    seeder.posts(posts, avg_likes, avg_comments, max_depth=max_depth)
+    seeder.reset_sequences()
+    return seeder
+
+
+def rebuild_derived(user_ids, timelines=True, suggestions=True, search=True, batch_size=200, progress=None):
+    """
+    Recompute what bulk_create skipped (no signals ran), as the maintenance
+    commands do, and drop cached responses that predate the new rows.
+    """
+    progress = progress or (lambda message: None)
+    if timelines:
+        for n, user_id in enumerate(user_ids, 1):
+            rebuild_timeline(user_id)
+            if n % 10_000 == 0:
+                progress(f'{n} timelines')
+        progress(f'{len(user_ids)} timelines')
+    if suggestions:
+        for start in range(0, len(user_ids), batch_size):
+            refresh_suggestions(user_ids[start:start + batch_size])
+        progress(f'{len(user_ids)} suggestion lists')
+    if search:
+        call_command('rebuild_search_index', stdout=StringIO())
+        progress('search index')
+    # Jumping past MAX_CATCH_UP makes every process rebuild its typeahead index
+    cache.set(typeahead.GENERATION_KEY, cache.get(typeahead.GENERATION_KEY, 0) + typeahead.MAX_CATCH_UP + 1, None)
+    for scope in ('posts', 'pages', 'groups'):
+        bump_generation(scope)
@@ -0,0 +1,175 @@
+"""
+Content-addressed media storage.
+
+Every saved file is named after the SHA-256 of its bytes
+(`blobs/ab/cd/abcd...ef.jpg`), whatever `upload_to` asked for, so the
+same picture uploaded twice is stored once and both rows point at the
+same blob. Names never change meaning, which lets lookbook.media serve
+them as immutable. A small manifest per blob (`manifests/ab/<sha256>.json`)
+records its image renditions, so a re-uploaded picture reuses them without
+a database lookup.
+
+Because a blob can be shared, `delete()` does not unlink anything. The
+`collect_media` management command instead counts references from every
+file field (and image rendition) in bulk and removes blobs nobody points
+at any more.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import models
+
+from .images import IMAGE_FIELDS, renditions_field, rendition_names
+
+BLOBS_DIR = 'blobs'
+MANIFESTS_DIR = 'manifests'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    # Same bytes, same name: files may be shared between rows
+    content_addressed = True
+
+    def blob_name(self, digest, ext):
+        return f'{BLOBS_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is decided by the content in _save()
+        return name
+
+    def _save(self, name, content):
+        ext = os.path.splitext(name)[1].lower()
+        tmp_dir = self.path(os.path.join(BLOBS_DIR, 'tmp'))
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        # Hash while spooling to a temp file on the same filesystem, so the
+        # final move is an atomic rename
+        hasher = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    hasher.update(chunk)
+                    fh.write(chunk)
+
+            name = self.blob_name(hasher.hexdigest(), ext)
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                # Duplicate: keep the existing blob, refresh it so the
+                # collector's grace period covers the new reference
+                os.utime(full_path)
+                os.unlink(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                os.replace(tmp_path, full_path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(full_path, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return name
+
+    def delete(self, name):
+        """Blobs may be shared; unreferenced ones are removed by collect_media"""
+
+    def purge(self, name):
+        super().delete(name)
+        manifest = self._manifest_path(name)
+        if manifest and os.path.exists(manifest):
+            os.unlink(manifest)
+
+    def _manifest_path(self, name):
+        if not name.startswith(f'{BLOBS_DIR}/'):
+            # Stored before content addressing: the name says nothing about the bytes
+            return None
+        digest = os.path.splitext(os.path.basename(name))[0]
+        return self.path(os.path.join(MANIFESTS_DIR, digest[:2], f'{digest}.json'))
+
+    def get_renditions(self, name):
+        """The renditions recorded for blob `name`, if all their files still exist, else None"""
+        path = self._manifest_path(name)
+        if not path:
+            return None
+        try:
+            with open(path) as fh:
+                renditions = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        names = list(rendition_names({'renditions': renditions}))
+        if not names or not all(self.exists(rendition) for rendition in names):
+            return None
+        for rendition in names:
+            # As for duplicate uploads: the grace period now covers the new reference
+            os.utime(self.path(rendition))
+        return renditions
+
+    def set_renditions(self, name, renditions):
+        path = self._manifest_path(name)
+        if not path:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(renditions, fh)
+        os.replace(tmp_path, path)
+
+
+def referenced_names(storage=None):
+    """Reference count of every stored name, from all file fields and renditions"""
+    storage = storage or default_storage
+    counts = Counter()
+    for model in apps.get_models():
+        for field in model._meta.get_fields():
+            if isinstance(field, models.FileField) and field.storage is storage:
+                names = model._default_manager.exclude(**{field.name: ''}).exclude(
+                    **{f'{field.name}__isnull': True}
+                ).values_list(field.name, flat=True)
+                counts.update(names.iterator())
+
+    for model_label, field_names in IMAGE_FIELDS.items():
+        model = apps.get_model(model_label)
+        for field_name in field_names:
+            column = renditions_field(field_name)
+            for data in model._default_manager.exclude(**{column: {}}).values_list(column, flat=True).iterator():
+                counts.update(rendition_names(data))
+    return counts
+
+
+def collect_garbage(storage=None, grace_seconds=None, dry_run=False):
+    """
+    Delete blobs with no references that are older than the grace period
+    (which protects uploads whose rows are not committed yet).
+    Returns (blobs seen, blobs removed, bytes freed).
+    """
+    storage = storage or default_storage
+    if grace_seconds is None:
+        grace_seconds = settings.MEDIA_GC_GRACE_HOURS * 3600
+    referenced = referenced_names(storage)
+    cutoff = time.time() - grace_seconds
+
+    seen = removed = freed = 0
+    root = storage.path(BLOBS_DIR)
+    for dirpath, dirnames, filenames in os.walk(root):
+        for filename in filenames:
+            full_path = os.path.join(dirpath, filename)
+            name = os.path.relpath(full_path, storage.location).replace(os.sep, '/')
+            seen += 1
+            if name in referenced:
+                continue
+            st = os.stat(full_path)
+            if st.st_mtime > cutoff:
+                continue
+            removed += 1
+            freed += st.st_size
+            if not dry_run:
+                getattr(storage, 'purge', storage.delete)(name)
+    return seen, removed, freed
@@ -1,12 +1,17 @@
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
 from rest_framework_simplejwt.views import TokenRefreshView
 from users.views import CustomTokenObtainPairView
 from django.views.static import serve
 from django.http import JsonResponse
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
+from .events import event_stream, event_ticket
+from .media import serve_media
+from .metrics import metrics_view
+from .response_cache import cache_stats
 
 urlpatterns = [
     # Root and health check
@@ -30,9 +35,20 @@ urlpatterns = [
     path('api/friends/', include('friends.urls')),
     path('api/pages/', include('pages.urls')),
     path('api/groups/', include('groups.urls')),
+    path('api/search/', include('search.urls')),
+
+    # Live updates (server-sent events, ASGI only)
+    path('api/events/', event_stream, name='events'),
+    path('api/events/ticket/', event_ticket, name='events-ticket'),
+
+    # Internal metrics
+    path('api/cache/stats/', cache_stats, name='cache-stats'),
+    path('api/metrics/', metrics_view, name='metrics'),
 ]
 
 # ------------------------------------------
 # Serve media files (in both DEBUG & production)
 # ------------------------------------------
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+urlpatterns += [
+    re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media, name='media'),
+]
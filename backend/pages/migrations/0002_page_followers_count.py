@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:04
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, field):
+    counts = queryset.order_by().values(field).annotate(c=Count('pk')).values('c')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def backfill_counts(apps, schema_editor):
+    Page = apps.get_model('pages', 'Page')
+    PageFollower = apps.get_model('pages', 'PageFollower')
+    Page.objects.update(
+        followers_count=_count(PageFollower.objects.filter(page=OuterRef('pk')), 'page'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='page',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0002_page_followers_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='page',
+            index=models.Index(fields=['-created_at', '-id'], name='pages_page_recent'),
+        ),
+        migrations.AddIndex(
+            model_name='pagefollower',
+            index=models.Index(fields=['page', '-created_at', '-id'], name='pages_followers_recent'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0003_page_pages_page_recent_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='page',
+            name='cover_photo_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='page',
+            name='profile_picture_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -1,6 +1,17 @@
 from django.db import models
+from django.db.models import Exists, OuterRef
 from django.conf import settings
 
+class PageQuerySet(models.QuerySet):
+    def for_viewer(self, user):
+        """Pages with their owner and the viewer's is_following flag, so PageSerializer makes no query per page"""
+        queryset = self.select_related('owner')
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                viewer_follows=Exists(PageFollower.objects.filter(page=OuterRef('pk'), user=user))
+            )
+        return queryset
+
 class Page(models.Model):
     CATEGORY_CHOICES = (
         ('business', 'Business'),
@@ -19,19 +30,29 @@ class Page(models.Model):
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES, default='other')
     profile_picture = models.ImageField(upload_to='page_profiles/', null=True, blank=True)
     cover_photo = models.ImageField(upload_to='page_covers/', null=True, blank=True)
+    # Resized copies, filled in by lookbook.images
+    profile_picture_renditions = models.JSONField(default=dict, blank=True, editable=False)
+    cover_photo_renditions = models.JSONField(default=dict, blank=True, editable=False)
     website = models.URLField(max_length=200, blank=True)
     email = models.EmailField(blank=True)
     phone = models.CharField(max_length=20, blank=True)
     location = models.CharField(max_length=200, blank=True)
     is_verified = models.BooleanField(default=False)
+    # Denormalized counter, kept in sync by toggle_follow_page
+    followers_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = PageQuerySet.as_manager()
+
     def __str__(self):
         return self.name
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='pages_page_recent'),
+        ]
 
 class PageFollower(models.Model):
     page = models.ForeignKey(Page, on_delete=models.CASCADE, related_name='followers')
@@ -41,6 +62,9 @@ class PageFollower(models.Model):
     class Meta:
         unique_together = ('page', 'user')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['page', '-created_at', '-id'], name='pages_followers_recent'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} follows {self.page.name}"
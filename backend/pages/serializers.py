@@ -1,27 +1,29 @@
 from rest_framework import serializers
 from .models import Page, PageFollower, PageAdmin
 from users.serializers import UserSerializer
+from lookbook.images import RenditionsField
 
 class PageSerializer(serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
-    followers_count = serializers.SerializerMethodField()
     is_following = serializers.SerializerMethodField()
     is_owner = serializers.SerializerMethodField()
+    profile_picture_renditions = RenditionsField()
+    cover_photo_renditions = RenditionsField()
     
     class Meta:
         model = Page
         fields = ['id', 'owner', 'name', 'username', 'description', 'category', 
-                  'profile_picture', 'cover_photo', 'website', 'email', 'phone', 
+                  'profile_picture', 'cover_photo', 'profile_picture_renditions', 
+                  'cover_photo_renditions', 'website', 'email', 'phone', 
                   'location', 'is_verified', 'created_at', 'updated_at', 
                   'followers_count', 'is_following', 'is_owner']
-        read_only_fields = ['id', 'created_at', 'updated_at', 'is_verified']
-    
-    def get_followers_count(self, obj):
-        return obj.followers.count()
+        read_only_fields = ['id', 'created_at', 'updated_at', 'is_verified', 'followers_count']
     
     def get_is_following(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            if hasattr(obj, 'viewer_follows'):
+                return obj.viewer_follows
             return obj.followers.filter(user=request.user).exists()
         return False
     
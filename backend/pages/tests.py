@@ -1,3 +1,53 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from .models import Page
+
+User = get_user_model()
+
+
+class PageFollowerCounterTests(APITestCase):
+    def test_toggle_follow_maintains_followers_count(self):
+        user = User.objects.create(username='follower')
+        page = Page.objects.create(owner=user, name='Page', username='page')
+        self.client.force_authenticate(user)
+
+        self.client.post(f'/api/pages/{page.id}/follow/')
+        page.refresh_from_db()
+        self.assertEqual(page.followers_count, 1)
+        self.assertEqual(self.client.get('/api/pages/page/').data['followers_count'], 1)
+
+        self.client.post(f'/api/pages/{page.id}/follow/')
+        page.refresh_from_db()
+        self.assertEqual(page.followers_count, 0)
+
+
+class PageAdminTests(APITestCase):
+    def test_add_admin_by_username(self):
+        owner = User.objects.create(username='owner')
+        editor = User.objects.create(username='editor')
+        page = Page.objects.create(owner=owner, name='Page', username='page')
+        self.client.force_authenticate(owner)
+
+        response = self.client.post(f'/api/pages/{page.id}/add-admin/', {'username': 'editor'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['user']['id'], editor.id)
+        self.assertEqual(self.client.post(f'/api/pages/{page.id}/add-admin/', {'username': 'nobody'}).status_code, 404)
+
+
+class PageFollowersTests(APITestCase):
+    def test_followers_show_whether_the_viewer_follows(self):
+        owner = User.objects.create(username='owner')
+        follower = User.objects.create(username='follower')
+        page = Page.objects.create(owner=owner, name='Page', username='page')
+        self.client.force_authenticate(follower)
+        self.client.post(f'/api/pages/{page.id}/follow/')
+
+        response = self.client.get(f'/api/pages/{page.id}/followers/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['user']['id'] for row in response.data['results']], [follower.id])
+        self.assertTrue(response.data['results'][0]['page']['is_following'])
+
+        self.client.force_authenticate(owner)
+        response = self.client.get(f'/api/pages/{page.id}/followers/')
+        self.assertFalse(response.data['results'][0]['page']['is_following'])
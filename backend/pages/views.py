@@ -1,22 +1,41 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
+from django.db import transaction
+from django.db.models import F
 from .models import Page, PageFollower, PageAdmin
 from .serializers import PageSerializer, PageFollowerSerializer, PageAdminSerializer
+from posts.timeline import sync_timeline
+from lookbook.pagination import KeysetPagination
+from lookbook.conditional import ConditionalGetMixin
+from lookbook.metrics import InstrumentedViewMixin, query_budget
+from lookbook.response_cache import CachedResponseMixin
 
-class PageListCreateView(generics.ListCreateAPIView):
-    queryset = Page.objects.all()
+PAGE_ETAG_FIELDS = ('id', 'updated_at', 'followers_count', 'owner__updated_at')
+
+class PageListCreateView(InstrumentedViewMixin, ConditionalGetMixin, CachedResponseMixin, generics.ListCreateAPIView):
+    query_budget = 2
     serializer_class = PageSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    cache_scopes = ('pages',)
+    etag_fields = PAGE_ETAG_FIELDS
+
+    def get_queryset(self):
+        return Page.objects.for_viewer(self.request.user)
     
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
-class PageDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Page.objects.all()
+class PageDetailView(InstrumentedViewMixin, ConditionalGetMixin, CachedResponseMixin, generics.RetrieveUpdateDestroyAPIView):
+    query_budget = 2
     serializer_class = PageSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    cache_scopes = ('pages',)
+    etag_fields = PAGE_ETAG_FIELDS
     lookup_field = 'username'
+
+    def get_queryset(self):
+        return Page.objects.for_viewer(self.request.user)
     
     def perform_update(self, serializer):
         if serializer.instance.owner != self.request.user:
@@ -41,12 +60,13 @@ class PageDetailView(generics.RetrieveUpdateDestroyAPIView):
             return Response({'error': 'Only page owner can delete'}, status=status.HTTP_403_FORBIDDEN)
         instance.delete()
 
-class MyPagesView(generics.ListAPIView):
+class MyPagesView(InstrumentedViewMixin, generics.ListAPIView):
+    query_budget = 1
     serializer_class = PageSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Page.objects.filter(owner=self.request.user)
+        return Page.objects.for_viewer(self.request.user).filter(owner=self.request.user)
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
@@ -56,14 +76,23 @@ def toggle_follow_page(request, page_id):
     except Page.DoesNotExist:
         return Response({'error': 'Page not found'}, status=status.HTTP_404_NOT_FOUND)
     
-    follower, created = PageFollower.objects.get_or_create(user=request.user, page=page)
+    with transaction.atomic():
+        follower, created = PageFollower.objects.get_or_create(user=request.user, page=page)
+        
+        if not created:
+            deleted, _ = follower.delete()
+            if deleted:
+                Page.objects.filter(pk=page.pk).update(followers_count=F('followers_count') - 1)
+        else:
+            Page.objects.filter(pk=page.pk).update(followers_count=F('followers_count') + 1)
     
+    sync_timeline(request.user.id, page_ids=[page.id])
     if not created:
-        follower.delete()
         return Response({'message': 'Unfollowed page'}, status=status.HTTP_200_OK)
-    
     return Response({'message': 'Following page'}, status=status.HTTP_201_CREATED)
 
+# Page, followers page, the viewer's follow, their block set (has_blocked_me)
+@query_budget(4)
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def page_followers(request, page_id):
@@ -72,9 +101,15 @@ def page_followers(request, page_id):
     except Page.DoesNotExist:
         return Response({'error': 'Page not found'}, status=status.HTTP_404_NOT_FOUND)
     
-    followers = PageFollower.objects.filter(page=page)
-    serializer = PageFollowerSerializer(followers, many=True)
-    return Response(serializer.data)
+    followers = PageFollower.objects.filter(page=page).select_related('user', 'page', 'page__owner')
+    paginator = KeysetPagination()
+    followers = paginator.paginate_queryset(followers, request)
+    # Every row nests the same page; answer its is_following once
+    viewer_follows = PageFollower.objects.filter(page=page, user=request.user).exists()
+    for follower in followers:
+        follower.page.viewer_follows = viewer_follows
+    serializer = PageFollowerSerializer(followers, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
@@ -88,12 +123,14 @@ def add_page_admin(request, page_id):
         return Response({'error': 'Only page owner can add admins'}, status=status.HTTP_403_FORBIDDEN)
     
     user_id = request.data.get('user_id')
+    # Or a username picked from /api/search/autocomplete/
+    username = request.data.get('username')
     role = request.data.get('role', 'editor')
-    
+
     try:
         from django.contrib.auth import get_user_model
         User = get_user_model()
-        user = User.objects.get(id=user_id)
+        user = User.objects.get(username=username) if username else User.objects.get(id=user_id)
     except User.DoesNotExist:
         return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
     
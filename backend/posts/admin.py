@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Post, Like
+from lookbook.response_cache import bump_generation_on_commit
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
@@ -18,18 +19,21 @@ class PostAdmin(admin.ModelAdmin):
     def make_public(self, request, queryset):
         """Bulk action to make posts public"""
         updated = queryset.update(visibility='public')
+        bump_generation_on_commit('posts')
         self.message_user(request, f'{updated} post(s) changed to Public.')
     make_public.short_description = 'Change visibility to Public'
     
     def make_friends_only(self, request, queryset):
         """Bulk action to make posts friends-only"""
         updated = queryset.update(visibility='friends')
+        bump_generation_on_commit('posts')
         self.message_user(request, f'{updated} post(s) changed to Friends Only.')
     make_friends_only.short_description = 'Change visibility to Friends Only'
     
     def make_private(self, request, queryset):
         """Bulk action to make posts private"""
         updated = queryset.update(visibility='private')
+        bump_generation_on_commit('posts')
         self.message_user(request, f'{updated} post(s) changed to Private.')
     make_private.short_description = 'Change visibility to Private'
 
@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from posts.uploads import purge_stale_uploads
+
+
+class Command(BaseCommand):
+    help = 'Delete unfinished chunked video uploads that have been idle too long'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, help='Idle time before an upload is purged '
+                                                      '(default VIDEO_UPLOAD_EXPIRY_HOURS)')
+
+    def handle(self, *args, **options):
+        max_age = timedelta(hours=options['hours']) if options['hours'] else None
+        purged = purge_stale_uploads(max_age)
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} upload(s)'))
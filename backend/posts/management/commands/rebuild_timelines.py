@@ -0,0 +1,22 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts.timeline import rebuild_timeline
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild materialized home timelines from friendships and page follows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='Only rebuild these user ids (repeatable)')
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids'] or User.objects.filter(is_active=True).values_list('pk', flat=True).iterator()
+        rebuilt = 0
+        for user_id in user_ids:
+            rebuild_timeline(user_id)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} timeline(s)'))
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, OuterRef
+
+from posts.models import Post, Like, count_subquery
+
+
+def counter_specs():
+    """(model, counter field, correlated source queryset, FK name) for every denormalized counter"""
+    from comments.models import Comment
+    from pages.models import Page, PageFollower
+    from groups.models import Group, GroupMember
+
+    return [
+        (Post, 'likes_count', Like.objects.filter(post=OuterRef('pk')), 'post'),
+        (Post, 'comments_count', Comment.objects.filter(
+            post=OuterRef('pk'), is_visible=True, is_deleted=False
+        ), 'post'),
+        (Page, 'followers_count', PageFollower.objects.filter(page=OuterRef('pk')), 'page'),
+        (Group, 'members_count', GroupMember.objects.filter(group=OuterRef('pk')), 'group'),
+    ]
+
+
+def reconcile_counters(dry_run=False, batch_size=1000):
+    """
+    Find rows whose counter disagrees with the source table and fix them
+    with bulk UPDATEs. Returns {'Model.field': drifted row count}.
+    """
+    report = {}
+    for model, field, source, fk in counter_specs():
+        actual = count_subquery(source, fk)
+        drifted_ids = list(
+            model.objects.annotate(actual_count=actual)
+            .exclude(**{field: F('actual_count')})
+            .values_list('pk', flat=True)
+        )
+        report[f'{model.__name__}.{field}'] = len(drifted_ids)
+        if dry_run:
+            continue
+        for start in range(0, len(drifted_ids), batch_size):
+            batch = drifted_ids[start:start + batch_size]
+            model.objects.filter(pk__in=batch).update(**{field: actual})
+    return report
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized like/comment/follower/member counters that have drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report drifted rows')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        report = reconcile_counters(dry_run=options['dry_run'], batch_size=options['batch_size'])
+        verb = 'drifted' if options['dry_run'] else 'fixed'
+        for name, drifted in report.items():
+            self.stdout.write(f'{name}: {drifted} row(s) {verb}')
+        self.stdout.write(self.style.SUCCESS('Counters reconciled'))
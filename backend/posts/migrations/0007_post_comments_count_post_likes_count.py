@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:04
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, field):
+    counts = queryset.order_by().values(field).annotate(c=Count('pk')).values('c')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def backfill_counts(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Like = apps.get_model('posts', 'Like')
+    Comment = apps.get_model('comments', 'Comment')
+    Post.objects.update(
+        likes_count=_count(Like.objects.filter(post=OuterRef('pk')), 'post'),
+        comments_count=_count(
+            Comment.objects.filter(post=OuterRef('pk'), author__is_active=True, is_deleted=False), 'post'
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0005_comment_is_deleted'),
+        ('posts', '0006_post_video'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def hide_inactive_authors(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.filter(author__is_active=False).update(is_visible=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0004_page_cover_photo_renditions_and_more'),
+        ('posts', '0011_videoupload'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='is_visible',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.RunPython(hide_inactive_authors, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['is_visible', '-created_at', '-id'], name='posts_post_visible_recent'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0004_page_cover_photo_renditions_and_more'),
+        ('posts', '0012_post_is_visible'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='post',
+            name='posts_post_visible_recent',
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_visible', True)), fields=['-created_at', '-id'], name='posts_post_visible_recent'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-created_at', '-id'], name='posts_post_author_recent'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['page', '-created_at', '-id'], name='posts_post_page_recent'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_pulled_posts(apps, schema_editor):
+    # Until now a page's public posts were pulled while it was above the threshold
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.filter(
+        visibility='public', page__followers_count__gt=settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+    ).update(fanned_out=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0004_page_cover_photo_renditions_and_more'),
+        ('posts', '0013_post_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='fanned_out',
+            field=models.BooleanField(default=True, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('fanned_out', False)), fields=['page', '-created_at', '-id'], name='posts_post_pulled_recent'),
+        ),
+        migrations.RunPython(mark_pulled_posts, migrations.RunPython.noop),
+    ]
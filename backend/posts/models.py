@@ -1,6 +1,37 @@
+import uuid
+
 from django.db import models
+from django.db.models import Count, Exists, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
 
+def count_subquery(queryset, field):
+    """Correlated COUNT(*) over queryset grouped by field, 0 when empty"""
+    counts = queryset.order_by().values(field).annotate(c=Count('pk')).values('c')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+class PostQuerySet(models.QuerySet):
+    def for_feed(self, user=None):
+        """
+        Load posts with everything PostSerializer needs in a single query:
+        author/page joins and the viewer's flags.
+        """
+        from pages.models import PageFollower, PageAdmin
+
+        queryset = self.select_related('author', 'page', 'page__owner')
+
+        if user is not None and user.is_authenticated:
+            queryset = queryset.annotate(
+                viewer_liked=Exists(Like.objects.filter(post=OuterRef('pk'), user=user)),
+                viewer_follows_page=Exists(
+                    PageFollower.objects.filter(page=OuterRef('page_id'), user=user)
+                ),
+                viewer_is_page_admin=Exists(
+                    PageAdmin.objects.filter(page=OuterRef('page_id'), user=user)
+                ),
+            )
+        return queryset
+
 class Post(models.Model):
     VISIBILITY_CHOICES = (
         ('public', 'Public'),
@@ -13,16 +44,50 @@ class Post(models.Model):
     title = models.CharField(max_length=200, blank=True)
     content = models.TextField()
     image = models.ImageField(upload_to='post_images/', null=True, blank=True)
+    # Resized copies, filled in by lookbook.images
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     video = models.FileField(upload_to='post_videos/', null=True, blank=True)
     visibility = models.CharField(max_length=20, choices=VISIBILITY_CHOICES, default='public')
+    # Denormalized counters, kept in sync with F() updates in the views
+    # (see the reconcile_counters management command)
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    # False while the author is deactivated; maintained by users.moderation
+    # so reads filter on this column instead of joining the author
+    is_visible = models.BooleanField(default=True)
+    # False for public page posts left out of fan-out because the page was
+    # too large when they were posted; followers' timelines pull these
+    fanned_out = models.BooleanField(default=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PostQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.author.username} - {self.title if self.title else self.content[:50]}"
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.is_visible = self.author.is_active
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination key for the feed
+            models.Index(fields=['-created_at', '-id'], name='posts_post_recent'),
+            # The same for visible posts only, which is what the feed reads.
+            # Partial rather than led by is_visible: boolean filters compile
+            # to a bare column, which SQLite can't match to an index column
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(is_visible=True),
+                         name='posts_post_visible_recent'),
+            # Timeline fan-out/backfill: recent posts of given authors / pages
+            models.Index(fields=['author', '-created_at', '-id'], name='posts_post_author_recent'),
+            models.Index(fields=['page', '-created_at', '-id'], name='posts_post_page_recent'),
+            # Page posts pulled into timelines at read time
+            models.Index(fields=['page', '-created_at', '-id'], condition=models.Q(fanned_out=False),
+                         name='posts_post_pulled_recent'),
+        ]
 
 class Like(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='likes')
@@ -35,3 +100,57 @@ class Like(models.Model):
 
     def __str__(self):
         return f"{self.user.username} likes {self.post.id}"
+
+class TimelineEntry(models.Model):
+    """
+    One row per (viewer, post) in a user's materialized home timeline.
+    Written by posts.timeline at fan-out time; created_at mirrors the
+    post's so a timeline page is a single range scan on (user, created_at).
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'post')
+        ordering = ['-created_at', '-post']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-post'], name='posts_timeline_user_recent'),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} in {self.user_id}'s timeline"
+
+class VideoUpload(models.Model):
+    """
+    A resumable, chunked upload of a post video (see posts.uploads).
+    Chunks are appended to a file outside MEDIA_ROOT; `offset` is the
+    number of bytes safely received, so an interrupted client resumes
+    from there instead of starting over.
+    """
+    STATUS_CHOICES = (
+        ('uploading', 'Uploading'),
+        ('complete', 'Complete'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='video_uploads')
+    post = models.ForeignKey(Post, on_delete=models.SET_NULL, null=True, blank=True, related_name='video_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    # Hex SHA-256 of the whole file, checked on completion
+    checksum = models.CharField(max_length=64)
+    offset = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Purging abandoned uploads
+            models.Index(fields=['status', 'updated_at'], name='posts_upload_stale'),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
@@ -1,57 +1,59 @@
+import re
+
+from django.conf import settings
 from rest_framework import serializers
-from .models import Post, Like
+from .models import Post, Like, VideoUpload
 from users.serializers import UserSerializer
+from lookbook.images import RenditionsField
 
 class PostSerializer(serializers.ModelSerializer):
     author = serializers.SerializerMethodField()
-    likes_count = serializers.SerializerMethodField()
-    comments_count = serializers.SerializerMethodField()
     is_liked = serializers.SerializerMethodField()
     page_name = serializers.CharField(source='page.name', read_only=True, allow_null=True)
     page_username = serializers.CharField(source='page.username', read_only=True, allow_null=True)
     page_id = serializers.IntegerField(source='page.id', read_only=True, allow_null=True)
     is_following = serializers.SerializerMethodField()
     is_page_owner = serializers.SerializerMethodField()
+    image_renditions = RenditionsField()
 
     class Meta:
         model = Post
         fields = ['id', 'author', 'page', 'page_name', 'page_username', 'page_id', 
-                  'title', 'content', 'image', 'video', 'visibility',
+                  'title', 'content', 'image', 'image_renditions', 'video', 'visibility',
                   'created_at', 'updated_at', 'likes_count', 'comments_count', 'is_liked', 
                   'is_following', 'is_page_owner']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'created_at', 'updated_at', 'likes_count', 'comments_count']
 
     def get_author(self, obj):
         return UserSerializer(obj.author, context=self.context).data
     
-    def get_likes_count(self, obj):
-        return obj.likes.count()
-
-    def get_comments_count(self, obj):
-        # Count only comments from active users
-        return obj.comments.filter(author__is_active=True).count()
-
     def get_is_liked(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            if hasattr(obj, 'viewer_liked'):
+                return obj.viewer_liked
             return obj.likes.filter(user=request.user).exists()
         return False
 
     def get_is_following(self, obj):
         request = self.context.get('request')
-        if request and request.user.is_authenticated and obj.page:
+        if request and request.user.is_authenticated and obj.page_id:
+            if hasattr(obj, 'viewer_follows_page'):
+                return obj.viewer_follows_page
             from pages.models import PageFollower
-            return PageFollower.objects.filter(user=request.user, page=obj.page).exists()
+            return PageFollower.objects.filter(user=request.user, page_id=obj.page_id).exists()
         return False
 
     def get_is_page_owner(self, obj):
         request = self.context.get('request')
-        if request and request.user.is_authenticated and obj.page:
-            from pages.models import PageAdmin
+        if request and request.user.is_authenticated and obj.page_id:
             # Check if user is page owner or admin
-            is_owner = obj.page.owner == request.user
-            is_admin = PageAdmin.objects.filter(page=obj.page, user=request.user).exists()
-            return is_owner or is_admin
+            if obj.page.owner_id == request.user.id:
+                return True
+            if hasattr(obj, 'viewer_is_page_admin'):
+                return obj.viewer_is_page_admin
+            from pages.models import PageAdmin
+            return PageAdmin.objects.filter(page_id=obj.page_id, user=request.user).exists()
         return False
 
 class LikeSerializer(serializers.ModelSerializer):
@@ -59,3 +61,25 @@ class LikeSerializer(serializers.ModelSerializer):
         model = Like
         fields = ['id', 'user', 'post', 'created_at']
         read_only_fields = ['id', 'user', 'created_at']
+
+class VideoUploadSerializer(serializers.ModelSerializer):
+    chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = VideoUpload
+        fields = ['id', 'filename', 'size', 'checksum', 'offset', 'status', 'post', 'chunk_size', 'created_at']
+        read_only_fields = ['id', 'offset', 'status', 'post', 'created_at']
+
+    def get_chunk_size(self, obj):
+        # Largest chunk a single PATCH may carry
+        return settings.VIDEO_UPLOAD_CHUNK_SIZE
+
+    def validate_size(self, value):
+        if value <= 0 or value > settings.VIDEO_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(f'Size must be between 1 and {settings.VIDEO_UPLOAD_MAX_SIZE} bytes')
+        return value
+
+    def validate_checksum(self, value):
+        if not re.fullmatch(r'[0-9a-fA-F]{64}', value):
+            raise serializers.ValidationError('Expected a hex SHA-256 digest')
+        return value.lower()
@@ -1,3 +1,382 @@
-from django.test import TestCase
+import base64
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from comments.models import Comment
+from friends.models import Friendship
+from pages.models import Page, PageAdmin, PageFollower
+from users.models import BlockedUser
+from .management.commands.reconcile_counters import reconcile_counters
+from .models import Post, Like, TimelineEntry, VideoUpload
+
+User = get_user_model()
+
+
+class PostFeedQueryCountTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.viewer = User.objects.create(username='viewer')
+        self.page = Page.objects.create(owner=self.viewer, name='Viewer Page', username='viewerpage')
+
+    def _make_posts(self, count):
+        for i in range(count):
+            author = User.objects.create(username=f'author{Post.objects.count()}')
+            post = Post.objects.create(author=author, content=f'post {i}', page=self.page if i % 2 else None)
+            Like.objects.create(user=self.viewer, post=post)
+            Comment.objects.create(author=author, post=post, content='hi')
+            if i % 3 == 0:
+                BlockedUser.objects.create(blocker=author, blocked=self.viewer)
+        reconcile_counters()
+
+    def _feed_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/posts/')
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_feed_query_count_is_constant(self):
+        self.client.force_authenticate(self.viewer)
+        self._make_posts(2)
+        small, _ = self._feed_queries()
+
+        self._make_posts(8)
+        large, response = self._feed_queries()
+
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertEqual(small, large)
+        # The annotated page and the "blocked me" set (keyset pagination, no COUNT)
+        self.assertEqual(large, 2)
+
+    def test_anonymous_feed_query_count(self):
+        self._make_posts(10)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/posts/')
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_feed_annotations_match_serializer_fallbacks(self):
+        self.client.force_authenticate(self.viewer)
+        self._make_posts(4)
+        PageFollower.objects.create(page=self.page, user=self.viewer)
+        other = User.objects.create(username='other')
+        PageAdmin.objects.create(page=self.page, user=other)
+
+        response = self.client.get('/api/posts/')
+        by_id = {item['id']: item for item in response.data['results']}
+        for post in Post.objects.all():
+            item = by_id[post.id]
+            self.assertEqual(item['likes_count'], post.likes.count())
+            self.assertEqual(item['comments_count'], post.comments.count())
+            self.assertTrue(item['is_liked'])
+            self.assertEqual(item['is_following'], post.page_id is not None)
+            self.assertEqual(item['is_page_owner'], post.page_id is not None)
+            self.assertEqual(
+                item['author']['has_blocked_me'],
+                BlockedUser.objects.filter(blocker=post.author, blocked=self.viewer).exists(),
+            )
+
+
+class PostCounterTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='liker')
+        self.post = Post.objects.create(author=self.user, content='hello')
+        self.client.force_authenticate(self.user)
+
+    def test_toggle_like_maintains_likes_count(self):
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+
+    def test_comment_create_and_soft_delete_maintain_comments_count(self):
+        response = self.client.post(f'/api/comments/post/{self.post.id}/', {'post': self.post.id, 'content': 'hi'})
+        self.assertEqual(response.status_code, 201)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+        # Deleting twice must only decrement once
+        self.client.delete(f'/api/comments/{response.data["id"]}/')
+        self.client.delete(f'/api/comments/{response.data["id"]}/')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+
+    def test_reconcile_counters_fixes_drift(self):
+        Like.objects.create(user=self.user, post=self.post)
+        Comment.objects.create(author=self.user, post=self.post, content='a')
+        Comment.objects.create(author=self.user, post=self.post, content='b', is_deleted=True)
+        page = Page.objects.create(owner=self.user, name='P', username='p')
+        PageFollower.objects.create(page=page, user=self.user)
+
+        report = reconcile_counters(dry_run=True)
+        self.assertEqual(report['Post.likes_count'], 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+
+        call_command('reconcile_counters', stdout=StringIO())
+        self.post.refresh_from_db()
+        page.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (1, 1))
+        self.assertEqual(page.followers_count, 1)
+        self.assertEqual(set(reconcile_counters(dry_run=True).values()), {0})
+
+
+@override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=2)
+class HomeTimelineTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create(username='alice')
+        self.bob = User.objects.create(username='bob')
+        self.carol = User.objects.create(username='carol')
+        Friendship.objects.create(from_user=self.alice, to_user=self.bob, status='accepted')
+
+    def _post(self, user, **data):
+        self.client.force_authenticate(user)
+        response = self.client.post('/api/posts/', {'content': 'x', **data})
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def _timeline_ids(self, user):
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/posts/timeline/')
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_fan_out_honors_visibility(self):
+        public = self._post(self.bob, visibility='public')
+        friends = self._post(self.bob, visibility='friends')
+        private = self._post(self.bob, visibility='private')
+        stranger = self._post(self.carol)
+
+        self.assertEqual(self._timeline_ids(self.alice), [friends, public])
+        self.assertEqual(self._timeline_ids(self.bob), [private, friends, public])
+        self.assertEqual(self._timeline_ids(self.carol), [stranger])
+
+    def test_visibility_change_refans(self):
+        post_id = self._post(self.bob, visibility='friends')
+        self.client.patch(f'/api/posts/{post_id}/', {'visibility': 'private'})
+        self.assertEqual(self._timeline_ids(self.alice), [])
+
+    def test_page_followers_and_pulled_pages(self):
+        small = Page.objects.create(owner=self.carol, name='Small', username='small')
+        big = Page.objects.create(owner=self.carol, name='Big', username='big')
+        self.client.force_authenticate(self.alice)
+        self.client.post(f'/api/pages/{small.id}/follow/')
+        self.client.post(f'/api/pages/{big.id}/follow/')
+        for username in ('f1', 'f2'):
+            PageFollower.objects.create(page=big, user=User.objects.create(username=username))
+        reconcile_counters()
+
+        small_post = self._post(self.carol, page=small.id)
+        big_post = self._post(self.carol, page=big.id)
+        self.assertFalse(TimelineEntry.objects.filter(post_id=big_post, user=self.alice).exists())
+        self.assertEqual(self._timeline_ids(self.alice), [big_post, small_post])
+
+        # Shrinking the page doesn't lose what was posted while it was big
+        PageFollower.objects.filter(page=big, user__username__in=['f1', 'f2']).delete()
+        reconcile_counters()
+        self.assertEqual(self._timeline_ids(self.alice), [big_post, small_post])
+        fanned_post = self._post(self.carol, page=big.id)
+        self.assertTrue(TimelineEntry.objects.filter(post_id=fanned_post, user=self.alice).exists())
+        self.assertEqual(self._timeline_ids(self.alice), [fanned_post, big_post, small_post])
+
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self._timeline_ids(self.alice), [fanned_post, big_post, small_post])
+
+    def test_unfriend_and_block_remove_posts(self):
+        post_id = self._post(self.bob)
+        friendship = Friendship.objects.get()
+        self.client.force_authenticate(self.alice)
+        self.client.post(f'/api/friends/unfriend/{friendship.id}/')
+        self.assertEqual(self._timeline_ids(self.alice), [])
+
+        friendship = Friendship.objects.create(from_user=self.alice, to_user=self.bob)
+        self.client.force_authenticate(self.bob)
+        self.client.post(f'/api/friends/accept/{friendship.id}/')
+        self.assertEqual(self._timeline_ids(self.alice), [post_id])
+
+        self.client.force_authenticate(self.bob)
+        self.client.post(f'/api/users/{self.alice.id}/block/')
+        self.assertEqual(self._timeline_ids(self.alice), [])
+
+    def test_rebuild_timelines_command(self):
+        post_id = self._post(self.bob)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self._timeline_ids(self.alice), [post_id])
+
+    def test_timeline_read_is_constant_queries(self):
+        for _ in range(3):
+            self._post(self.bob)
+        self.client.force_authenticate(self.alice)
+        # pulled pages, block set, page of posts
+        with self.assertNumQueries(3):
+            self.client.get('/api/posts/timeline/')
+        # block set now cached
+        with self.assertNumQueries(2):
+            self.client.get('/api/posts/timeline/')
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create(username='author')
+        self.posts = [Post.objects.create(author=author, content=str(i)) for i in range(7)]
+        # Force created_at ties so the id tiebreaker matters
+        Post.objects.filter(pk__in=[p.pk for p in self.posts[2:5]]).update(created_at=self.posts[2].created_at)
+        self.expected = list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def _ids(self, response):
+        return [item['id'] for item in response.data['results']]
+
+    def test_walks_forward_and_back_without_gaps_or_duplicates(self):
+        seen = []
+        pages = []
+        url = '/api/posts/?page_size=3'
+        while url:
+            response = self.client.get(url)
+            pages.append(response)
+            seen.extend(self._ids(response))
+            url = response.data['next']
+        self.assertEqual(seen, self.expected)
+        self.assertIsNone(pages[0].data['previous'])
+
+        previous = self.client.get(pages[-1].data['previous'])
+        self.assertEqual(self._ids(previous), self._ids(pages[-2]))
+
+    def test_new_posts_do_not_shift_pages(self):
+        first = self.client.get('/api/posts/?page_size=3')
+        Post.objects.create(author=self.posts[0].author, content='new')
+        second = self.client.get(first.data['next'])
+        self.assertEqual(self._ids(second), self.expected[3:6])
+
+    def test_invalid_cursor_is_404(self):
+        self.assertEqual(self.client.get('/api/posts/?cursor=not-a-cursor').status_code, 404)
+
+    def test_tampered_cursors_are_404(self):
+        created_at = self.posts[0].created_at.isoformat()
+        payloads = [
+            {'k': [created_at, 1]},
+            {'k': [created_at, 1], 'r': 2},
+            {'k': ['zzz', 1], 'r': 0},
+            {'k': [None, None], 'r': 0},
+            {'k': [created_at, 'abc'], 'r': 0},
+            [created_at, 1],
+        ]
+        for payload in payloads:
+            cursor = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+            for url in ('/api/posts/', f'/api/comments/post/{self.posts[0].pk}/'):
+                self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 404, (url, payload))
+
+
+class VideoUploadTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=os.path.join(tmp, 'media'),
+            VIDEO_UPLOAD_DIR=os.path.join(tmp, 'uploads'),
+            VIDEO_UPLOAD_CHUNK_SIZE=1024,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create(username='filmmaker')
+        self.post = Post.objects.create(author=self.user, content='watch this')
+        self.client.force_authenticate(self.user)
+        self.video = os.urandom(2500)
+
+    def _start(self, data=None):
+        data = data or self.video
+        response = self.client.post('/api/posts/uploads/', {
+            'filename': 'clip.mp4', 'size': len(data), 'checksum': hashlib.sha256(data).hexdigest(),
+        })
+        self.assertEqual(response.status_code, 201)
+        return f'/api/posts/uploads/{response.data["id"]}/'
+
+    def _append(self, url, offset, chunk, **headers):
+        return self.client.generic(
+            'PATCH', url, chunk, content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset), **headers,
+        )
+
+    def test_chunked_upload_attaches_video(self):
+        url = self._start()
+        for offset in range(0, len(self.video), 1024):
+            response = self._append(url, offset, self.video[offset:offset + 1024])
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Upload-Offset'], str(len(self.video)))
+
+        response = self.client.post(url + 'complete/', {'post': self.post.id})
+        self.assertEqual(response.status_code, 200)
+        self.post.refresh_from_db()
+        with self.post.video.open('rb') as fh:
+            self.assertEqual(fh.read(), self.video)
+        self.assertEqual(self.client.get(url).data['status'], 'complete')
+        self.assertEqual(os.listdir(settings.VIDEO_UPLOAD_DIR), [])
+
+    def test_resume_after_out_of_sync_chunk(self):
+        url = self._start()
+        self._append(url, 0, self.video[:1024])
+        # A retried chunk the server already has is rejected with the offset to resume from
+        response = self._append(url, 0, self.video[:1024])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['offset'], 1024)
+
+        # A corrupt chunk with a checksum doesn't advance the offset
+        bad = self._append(url, 1024, b'x' * 1024, HTTP_UPLOAD_CHECKSUM=hashlib.sha256(self.video[1024:2048]).hexdigest())
+        self.assertEqual((bad.status_code, bad.data['offset']), (400, 1024))
+
+        self._append(url, 1024, self.video[1024:2048])
+        self._append(url, 2048, self.video[2048:])
+        self.assertEqual(self.client.get(url).data['offset'], len(self.video))
+        self.assertEqual(self.client.post(url + 'complete/', {'post': self.post.id}).status_code, 200)
+
+    def test_limits_and_checksum(self):
+        url = self._start()
+        self.assertEqual(self._append(url, 0, b'x' * 2048).status_code, 413)
+        self.assertEqual(self.client.post(url + 'complete/', {'post': self.post.id}).status_code, 409)
+
+        self._append(url, 0, b'x' * 1024)
+        self._append(url, 1024, b'x' * 1024)
+        self._append(url, 2048, b'x' * 452)
+        response = self.client.post(url + 'complete/', {'post': self.post.id})
+        self.assertEqual((response.status_code, response.data['offset']), (400, 0))
+        self.assertEqual(VideoUpload.objects.get().offset, 0)
+
+    def test_complete_needs_a_post_id(self):
+        url = self._start()
+        self.assertEqual(self.client.post(url + 'complete/', {}).status_code, 400)
+        self.assertEqual(self.client.post(url + 'complete/', {'post': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.post(url + 'complete/', {'post': self.post.id + 100}).status_code, 404)
+
+    def test_uploads_are_private(self):
+        url = self._start()
+        self.client.force_authenticate(User.objects.create(username='snoop'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self._append(url, 0, b'x').status_code, 404)
+
+    def test_purge_stale_uploads(self):
+        self._start()
+        VideoUpload.objects.update(updated_at=timezone.now() - timedelta(days=2))
+        call_command('purge_video_uploads', stdout=StringIO())
+        self.assertFalse(VideoUpload.objects.exists())
+        self.assertEqual(os.listdir(settings.VIDEO_UPLOAD_DIR), [])
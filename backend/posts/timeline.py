@@ -0,0 +1,142 @@
+"""
+Materialized home timelines.
+
+Posts are fanned out to a TimelineEntry row per eligible viewer when they
+are created, so reading a timeline is one indexed range scan instead of a
+global sort. Visibility is enforced here, at write time:
+
+- 'private' posts only reach their author
+- 'friends' posts reach the author and accepted friends
+- 'public' posts also reach followers of the post's page
+
+Public posts of pages above TIMELINE_FANOUT_MAX_FOLLOWERS are not fanned
+out to followers. They are marked `fanned_out=False` and pulled into
+followers' timelines when read. The pull follows how each post was
+distributed, not the page's current size, so posts made while a page was
+large are still pulled after it shrinks.
+"""
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef, Q
+
+from friends.models import Friendship
+from pages.models import PageFollower
+from users.blocks import block_set_for, get_block_set
+from .models import Post, TimelineEntry
+
+
+def pulled_page_ids(user_id):
+    """Followed pages with posts that were not fanned out, read at query time instead"""
+    return list(
+        PageFollower.objects.filter(user_id=user_id).filter(
+            Exists(Post.objects.filter(page_id=OuterRef('page_id'), fanned_out=False))
+        ).values_list('page_id', flat=True)
+    )
+
+
+def _fans_out_to_followers(post):
+    return post.page.followers_count <= settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+
+
+def timeline_recipient_ids(post):
+    """Users whose timeline should contain post"""
+    recipients = {post.author_id}
+    if post.visibility == 'private':
+        return recipients
+
+    recipients |= Friendship.objects.friend_ids(post.author_id)
+    if post.visibility == 'public' and post.page_id and post.fanned_out:
+        recipients |= set(PageFollower.objects.filter(page_id=post.page_id).values_list('user_id', flat=True))
+
+    return recipients - get_block_set(post.author_id).hidden_ids
+
+
+def fan_out_post(post, batch_size=1000):
+    """Write post into the timeline of every eligible viewer"""
+    fanned_out = not (post.visibility == 'public' and post.page_id) or _fans_out_to_followers(post)
+    if fanned_out != post.fanned_out:
+        post.fanned_out = fanned_out
+        Post.objects.filter(pk=post.pk).update(fanned_out=fanned_out)
+    entries = [
+        TimelineEntry(user_id=user_id, post=post, created_at=post.created_at)
+        for user_id in timeline_recipient_ids(post)
+    ]
+    TimelineEntry.objects.bulk_create(entries, batch_size=batch_size, ignore_conflicts=True)
+
+
+def refan_post(post):
+    """Recompute a post's recipients (and whether it is pulled), e.g. after its visibility changed"""
+    TimelineEntry.objects.filter(post=post).delete()
+    fan_out_post(post)
+
+
+def _eligible_posts(user_id):
+    """Posts user_id may see in their timeline, by the same rules as fan-out"""
+    # Subqueries rather than id lists so large friend lists stay in SQL
+    accepted = Friendship.objects.filter(status='accepted')
+    sent = accepted.filter(from_user_id=user_id).values('to_user_id')
+    received = accepted.filter(to_user_id=user_id).values('from_user_id')
+    page_ids = PageFollower.objects.filter(user_id=user_id).values('page_id')
+    return Post.objects.filter(
+        Q(author_id=user_id) |
+        ((Q(author_id__in=sent) | Q(author_id__in=received)) & Q(visibility__in=['public', 'friends'])) |
+        Q(page_id__in=page_ids, visibility='public', fanned_out=True)
+    ).exclude(author_id__in=get_block_set(user_id).hidden_ids)
+
+
+def sync_timeline(user_id, author_ids=(), page_ids=()):
+    """
+    Re-derive the part of user_id's timeline that comes from the given
+    authors and pages. Called when a friendship, page follow or block
+    between them changes.
+    """
+    source = Q(author_id__in=author_ids) | Q(page_id__in=page_ids)
+    TimelineEntry.objects.filter(user_id=user_id).filter(
+        post__in=Post.objects.filter(source).values('pk')
+    ).delete()
+
+    posts = _eligible_posts(user_id).filter(source).values_list('pk', 'created_at')
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=pk, created_at=created_at)
+            for pk, created_at in posts[:settings.TIMELINE_BACKFILL_LIMIT]
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def rebuild_timeline(user_id):
+    """Drop and rebuild user_id's timeline from their most recent eligible posts"""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    posts = _eligible_posts(user_id).values_list('pk', 'created_at')
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=pk, created_at=created_at)
+            for pk, created_at in posts[:settings.TIMELINE_BACKFILL_LIMIT]
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def timeline_queryset(request):
+    """Posts in the request user's home timeline, newest first"""
+    user = request.user
+    queryset = Post.objects.for_feed(user).filter(is_visible=True)
+    hidden_ids = block_set_for(request).hidden_ids
+    if hidden_ids:
+        queryset = queryset.exclude(author_id__in=hidden_ids)
+    pulled = pulled_page_ids(user.id)
+    # Both branches expose the sort key as timeline_at/timeline_post so
+    # HomeTimelineView can keyset-paginate on it
+    if not pulled:
+        # Common case: walk the (user, created_at) index directly
+        return queryset.filter(timeline_entries__user=user).annotate(
+            timeline_at=F('timeline_entries__created_at'),
+            timeline_post=F('timeline_entries__post_id'),
+        ).order_by('-timeline_at', '-timeline_post')
+    return queryset.filter(
+        Q(pk__in=TimelineEntry.objects.filter(user=user).values('post_id')) |
+        Q(page_id__in=pulled, visibility='public', fanned_out=False)
+    ).annotate(
+        timeline_at=F('created_at'),
+        timeline_post=F('id'),
+    ).order_by('-timeline_at', '-timeline_post')
@@ -0,0 +1,129 @@
+"""
+Chunked, resumable video uploads.
+
+A client opens an upload with the final size and SHA-256, then PATCHes
+raw byte ranges starting at the server's `offset`. Each chunk is streamed
+from the request straight into a partial file outside MEDIA_ROOT in small
+pieces, so worker memory stays flat whatever the video size. The offset
+only advances by bytes actually written, so after a dropped connection
+the client asks for the offset and continues from there.
+
+On completion the whole file is hashed (again in pieces), and if it
+matches it is copied into Post.video through the regular storage.
+"""
+import hashlib
+import os
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+from .models import VideoUpload
+
+# Bytes read from the request / file per iteration
+READ_SIZE = 64 * 1024
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+def part_path(upload):
+    return Path(settings.VIDEO_UPLOAD_DIR) / f'{upload.pk}.part'
+
+
+def start_upload(upload):
+    path = part_path(upload)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+
+
+def append_chunk(upload, stream, length, checksum=None):
+    """
+    Write up to `length` bytes from `stream` at the upload's offset.
+    Returns the new offset. With a `checksum` (hex SHA-256 of the chunk) a
+    short or corrupt chunk is discarded as a whole and ChecksumMismatch is
+    raised; without one, whatever arrived before a disconnect is kept.
+    """
+    start = upload.offset
+    hasher = hashlib.sha256()
+    received = 0
+    with open(part_path(upload), 'r+b') as fh:
+        fh.seek(start)
+        try:
+            while received < length:
+                piece = stream.read(min(READ_SIZE, length - received))
+                if not piece:
+                    break
+                fh.write(piece)
+                hasher.update(piece)
+                received += len(piece)
+        except OSError:
+            # Client went away mid-chunk; keep what we have
+            pass
+
+        if checksum and hasher.hexdigest() != checksum.lower():
+            received = 0
+        # Drop anything past the committed offset (retries, failed chunks)
+        fh.truncate(start + received)
+
+    if received:
+        # Conditional on the offset we started from: a concurrent append
+        # for the same range loses (the final checksum catches any damage)
+        VideoUpload.objects.filter(pk=upload.pk, offset=start, status='uploading').update(
+            offset=start + received, updated_at=timezone.now()
+        )
+        upload.refresh_from_db(fields=['offset', 'updated_at'])
+    if checksum and not received:
+        raise ChecksumMismatch
+    return upload.offset
+
+
+def file_checksum(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for piece in iter(lambda: fh.read(READ_SIZE * 16), b''):
+            hasher.update(piece)
+    return hasher.hexdigest()
+
+
+def finish_upload(upload, post):
+    """Verify the assembled file and attach it to `post` as its video"""
+    path = part_path(upload)
+    if file_checksum(path) != upload.checksum.lower():
+        # Somewhere a range is corrupt and we can't tell where: restart
+        with open(path, 'r+b') as fh:
+            fh.truncate(0)
+        VideoUpload.objects.filter(pk=upload.pk).update(offset=0, updated_at=timezone.now())
+        upload.offset = 0
+        raise ChecksumMismatch
+
+    old_video = post.video.name if post.video else None
+    with open(path, 'rb') as fh:
+        post.video.save(os.path.basename(upload.filename), File(fh), save=False)
+    post.save(update_fields=['video', 'updated_at'])
+    if old_video:
+        post.video.storage.delete(old_video)
+
+    upload.status = 'complete'
+    upload.post = post
+    upload.save(update_fields=['status', 'post', 'updated_at'])
+    path.unlink(missing_ok=True)
+
+
+def discard_upload(upload):
+    part_path(upload).unlink(missing_ok=True)
+    upload.delete()
+
+
+def purge_stale_uploads(max_age=None):
+    """Delete unfinished uploads idle for longer than `max_age`"""
+    max_age = max_age or timedelta(hours=settings.VIDEO_UPLOAD_EXPIRY_HOURS)
+    stale = VideoUpload.objects.filter(status='uploading', updated_at__lt=timezone.now() - max_age)
+    purged = 0
+    for upload in list(stale):
+        discard_upload(upload)
+        purged += 1
+    return purged
@@ -1,8 +1,15 @@
 from django.urls import path
-from .views import PostListCreateView, PostDetailView, toggle_like
+from .views import (
+    PostListCreateView, HomeTimelineView, PostDetailView, toggle_like,
+    create_video_upload, video_upload_detail, complete_video_upload,
+)
 
 urlpatterns = [
     path('', PostListCreateView.as_view(), name='post-list-create'),
+    path('timeline/', HomeTimelineView.as_view(), name='post-timeline'),
     path('<int:pk>/', PostDetailView.as_view(), name='post-detail'),
     path('<int:pk>/like/', toggle_like, name='post-like'),
+    path('uploads/', create_video_upload, name='video-upload-create'),
+    path('uploads/<uuid:pk>/', video_upload_detail, name='video-upload-detail'),
+    path('uploads/<uuid:pk>/complete/', complete_video_upload, name='video-upload-complete'),
 ]
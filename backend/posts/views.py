@@ -1,44 +1,74 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
-from .models import Post, Like
-from .serializers import PostSerializer, LikeSerializer
+from django.db import transaction
+from django.db.models import F
+from django.conf import settings
+from django.shortcuts import get_object_or_404
+from lookbook.asyncviews import AsyncListMixin, AsyncRetrieveMixin
+from lookbook.conditional import ConditionalGetMixin
+from lookbook.events import post_channel, publish
+from lookbook.metrics import InstrumentedViewMixin
+from lookbook.response_cache import CachedResponseMixin
+from users.blocks import block_set_for
+from .models import Post, Like, VideoUpload
+from .serializers import PostSerializer, LikeSerializer, VideoUploadSerializer
+from .timeline import fan_out_post, refan_post, timeline_queryset
+from .uploads import ChecksumMismatch, append_chunk, discard_upload, finish_upload, start_upload
 
-class PostListCreateView(generics.ListCreateAPIView):
+# Everything a serialized post depends on (counters bypass updated_at)
+POST_ETAG_FIELDS = (
+    'id', 'updated_at', 'likes_count', 'comments_count',
+    'author__updated_at', 'page__updated_at', 'page__followers_count',
+)
+
+class PostListCreateView(AsyncListMixin, InstrumentedViewMixin, ConditionalGetMixin, CachedResponseMixin, generics.ListCreateAPIView):
+    query_budget = 2
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    cache_scopes = ('posts', 'pages')
+    etag_fields = POST_ETAG_FIELDS
 
     def get_queryset(self):
         # Filter out posts from blocked/disabled users
-        queryset = Post.objects.filter(author__is_active=True)
+        queryset = Post.objects.for_feed(self.request.user).filter(is_visible=True)
         
         # If user is authenticated, also filter out posts from users they have blocked
-        if self.request.user.is_authenticated:
-            from users.models import BlockedUser
-            blocked_user_ids = BlockedUser.objects.filter(
-                blocker=self.request.user
-            ).values_list('blocked_id', flat=True)
+        blocked_user_ids = block_set_for(self.request).blocked_ids
+        if blocked_user_ids:
             queryset = queryset.exclude(author_id__in=blocked_user_ids)
         
         return queryset
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        fan_out_post(post)
 
-class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
+class HomeTimelineView(AsyncListMixin, InstrumentedViewMixin, ConditionalGetMixin, generics.ListAPIView):
+    """Posts from the user, their friends and followed pages, newest first"""
+    query_budget = 3
+    serializer_class = PostSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = ('-timeline_at', '-timeline_post')
+    etag_fields = POST_ETAG_FIELDS
+
+    def get_queryset(self):
+        return timeline_queryset(self.request)
+
+class PostDetailView(AsyncRetrieveMixin, InstrumentedViewMixin, ConditionalGetMixin, CachedResponseMixin, generics.RetrieveUpdateDestroyAPIView):
+    query_budget = 2
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    cache_scopes = ('posts', 'pages')
+    etag_fields = POST_ETAG_FIELDS
 
     def get_queryset(self):
         # Filter out posts from blocked/disabled users
-        queryset = Post.objects.filter(author__is_active=True)
+        queryset = Post.objects.for_feed(self.request.user).filter(is_visible=True)
         
         # If user is authenticated, also filter out posts from users they have blocked
-        if self.request.user.is_authenticated:
-            from users.models import BlockedUser
-            blocked_user_ids = BlockedUser.objects.filter(
-                blocker=self.request.user
-            ).values_list('blocked_id', flat=True)
+        blocked_user_ids = block_set_for(self.request).blocked_ids
+        if blocked_user_ids:
             queryset = queryset.exclude(author_id__in=blocked_user_ids)
         
         return queryset
@@ -60,7 +90,11 @@ class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
                 serializer.instance.video.delete(save=False)
             serializer.instance.video = None
         
-        serializer.save()
+        old_audience = (serializer.instance.visibility, serializer.instance.page_id)
+        post = serializer.save()
+        # Visibility is enforced at fan-out time, so re-fan on changes
+        if (post.visibility, post.page_id) != old_audience:
+            refan_post(post)
 
     def perform_destroy(self, instance):
         # Allow author or admin to delete
@@ -76,10 +110,99 @@ def toggle_like(request, pk):
     except Post.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
     
-    like, created = Like.objects.get_or_create(user=request.user, post=post)
-    
-    if not created:
-        like.delete()
-        return Response({'message': 'Post unliked'}, status=status.HTTP_200_OK)
+    with transaction.atomic():
+        like, created = Like.objects.get_or_create(user=request.user, post=post)
+        
+        if not created:
+            # Only the request that actually removed the row decrements
+            deleted, _ = like.delete()
+            if deleted:
+                Post.objects.filter(pk=post.pk).update(likes_count=F('likes_count') - 1)
+                _publish_likes(post, request.user, liked=False)
+            return Response({'message': 'Post unliked'}, status=status.HTTP_200_OK)
+        
+        Post.objects.filter(pk=post.pk).update(likes_count=F('likes_count') + 1)
+        _publish_likes(post, request.user, liked=True)
     
     return Response({'message': 'Post liked'}, status=status.HTTP_201_CREATED)
+
+def _publish_likes(post, user, liked):
+    likes_count = Post.objects.filter(pk=post.pk).values_list('likes_count', flat=True).first()
+    publish(post_channel(post.pk), 'like', post=post.pk, actor=user.pk, liked=liked, likes_count=likes_count)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def create_video_upload(request):
+    """Start a resumable video upload: {filename, size, checksum (hex SHA-256)}"""
+    serializer = VideoUploadSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    upload = serializer.save(user=request.user)
+    start_upload(upload)
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+@api_view(['GET', 'PATCH', 'DELETE'])
+@permission_classes([permissions.IsAuthenticated])
+def video_upload_detail(request, pk):
+    """
+    GET the current offset to resume from, PATCH the next chunk as the raw
+    request body (Upload-Offset header must equal the offset, optional
+    Upload-Checksum is the chunk's hex SHA-256), DELETE to abandon.
+    """
+    upload = get_object_or_404(VideoUpload, pk=pk, user=request.user)
+
+    if request.method == 'GET':
+        return Response(VideoUploadSerializer(upload).data)
+
+    if request.method == 'DELETE':
+        discard_upload(upload)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    if upload.status != 'uploading':
+        return Response({'error': 'Upload is already complete'}, status=status.HTTP_409_CONFLICT)
+    if request.headers.get('Upload-Offset') != str(upload.offset):
+        # Client is out of sync (e.g. retrying a chunk that did arrive)
+        return Response({'error': 'Offset mismatch', 'offset': upload.offset}, status=status.HTTP_409_CONFLICT)
+
+    try:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        length = 0
+    if length <= 0:
+        return Response({'error': 'Empty chunk'}, status=status.HTTP_400_BAD_REQUEST)
+    if length > settings.VIDEO_UPLOAD_CHUNK_SIZE:
+        return Response({'error': f'Chunks are limited to {settings.VIDEO_UPLOAD_CHUNK_SIZE} bytes'},
+                        status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    if upload.offset + length > upload.size:
+        return Response({'error': 'Chunk goes past the declared size'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Read the raw body as a stream; request.data would buffer it
+    try:
+        offset = append_chunk(upload, request.stream, length, request.headers.get('Upload-Checksum'))
+    except ChecksumMismatch:
+        return Response({'error': 'Chunk checksum mismatch', 'offset': upload.offset},
+                        status=status.HTTP_400_BAD_REQUEST)
+    response = Response({'offset': offset, 'size': upload.size})
+    response['Upload-Offset'] = str(offset)
+    return response
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def complete_video_upload(request, pk):
+    """Verify a fully received upload and attach it to {post} as its video"""
+    upload = get_object_or_404(VideoUpload, pk=pk, user=request.user, status='uploading')
+    try:
+        post_id = int(request.data.get('post'))
+    except (TypeError, ValueError):
+        return Response({'error': 'post must be a post id'}, status=status.HTTP_400_BAD_REQUEST)
+    post = get_object_or_404(Post, pk=post_id)
+    if post.author != request.user and not (request.user.is_staff or request.user.is_superuser):
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    if upload.offset != upload.size:
+        return Response({'error': 'Upload is incomplete', 'offset': upload.offset}, status=status.HTTP_409_CONFLICT)
+
+    try:
+        finish_upload(upload, post)
+    except ChecksumMismatch:
+        return Response({'error': 'File checksum mismatch, upload restarted', 'offset': 0},
+                        status=status.HTTP_400_BAD_REQUEST)
+    return Response(PostSerializer(post, context={'request': request}).data)
@@ -0,0 +1,144 @@
+"""
+Full-text index backends, picked from the database vendor.
+
+* SQLite: an FTS5 virtual table ranked with bm25 (title weighted 10:1),
+  over the newest SEARCH_RANK_WINDOW matches
+* PostgreSQL: a tsvector column (title weight A, body B) with a GIN index,
+  ranked with ts_rank_cd
+* anything else: a plain table scanned with LIKE, unranked, so search
+  keeps working on other databases
+
+All of them store one row per document with `search.documents.doc_id`
+as the primary key.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+
+from .documents import KIND_BITS
+
+TABLE = 'search_index'
+KIND_MASK = (1 << KIND_BITS) - 1
+# Longer queries are truncated; more terms rarely improve results
+MAX_TERMS = 8
+
+
+def query_terms(text):
+    return re.findall(r'\w+', text.lower())[:MAX_TERMS]
+
+
+class SQLiteBackend:
+    def create(self, cursor):
+        # Prefix indexes make "moun*" (search as you type) a lookup instead
+        # of a scan over every term starting with those letters
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE {TABLE} USING fts5(title, body, "
+            f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')"
+        )
+        # Persist the ranking so ORDER BY rank can use FTS5's fast path
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}, rank) VALUES ('rank', 'bm25(10.0, 1.0)')")
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    def upsert(self, cursor, rows):
+        cursor.executemany(f'INSERT OR REPLACE INTO {TABLE}(rowid, title, body) VALUES (%s, %s, %s)', rows)
+
+    def delete(self, cursor, doc_ids):
+        cursor.executemany(f'DELETE FROM {TABLE} WHERE rowid = %s', [(doc_id,) for doc_id in doc_ids])
+
+    def match(self, terms):
+        # Quoted terms are literal tokens; the last one matches as a prefix
+        quoted = [f'"{term}"' for term in terms]
+        quoted[-1] += '*'
+        return ' '.join(quoted)
+
+    def search(self, cursor, code, terms, offset, limit):
+        match = self.match(terms)
+        window = settings.SEARCH_RANK_WINDOW
+        if window:
+            # bm25 scores every match before sorting, which for a common word
+            # is a large share of the table. Only rank the newest `window`
+            # matches of the requested kind: FTS5 walks rowids in order, so
+            # finding the cutoff stops early, and the rowid bound prunes the
+            # ranked scan.
+            cursor.execute(
+                f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s AND rowid >= COALESCE('
+                f'(SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s AND (rowid & {KIND_MASK}) = %s '
+                f'ORDER BY rowid DESC LIMIT 1 OFFSET %s), 0) '
+                f'AND (rowid & {KIND_MASK}) = %s ORDER BY rank LIMIT %s OFFSET %s',
+                [match, match, code, window - 1, code, limit, offset],
+            )
+        else:
+            cursor.execute(
+                f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s AND (rowid & {KIND_MASK}) = %s '
+                f'ORDER BY rank LIMIT %s OFFSET %s',
+                [match, code, limit, offset],
+            )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresBackend:
+    def create(self, cursor):
+        cursor.execute(f'CREATE TABLE {TABLE} (id bigint PRIMARY KEY, document tsvector NOT NULL)')
+        cursor.execute(f'CREATE INDEX {TABLE}_document ON {TABLE} USING GIN (document)')
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    def upsert(self, cursor, rows):
+        config = settings.SEARCH_TEXT_CONFIG
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (id, document) VALUES (%s, '
+            f"setweight(to_tsvector(%s::regconfig, %s), 'A') || setweight(to_tsvector(%s::regconfig, %s), 'B')) "
+            f'ON CONFLICT (id) DO UPDATE SET document = EXCLUDED.document',
+            [(doc_id, config, title, config, body) for doc_id, title, body in rows],
+        )
+
+    def delete(self, cursor, doc_ids):
+        cursor.execute(f'DELETE FROM {TABLE} WHERE id = ANY(%s)', [list(doc_ids)])
+
+    def search(self, cursor, code, terms, offset, limit):
+        query = ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+        cursor.execute(
+            f'SELECT id FROM {TABLE}, to_tsquery(%s::regconfig, %s) query '
+            f'WHERE document @@ query AND (id & {KIND_MASK}) = %s '
+            f'ORDER BY ts_rank_cd(document, query) DESC, id LIMIT %s OFFSET %s',
+            [settings.SEARCH_TEXT_CONFIG, query, code, limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class LikeBackend:
+    def create(self, cursor):
+        cursor.execute(f'CREATE TABLE {TABLE} (id bigint PRIMARY KEY, title text NOT NULL, body text NOT NULL)')
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    def upsert(self, cursor, rows):
+        rows = list(rows)
+        cursor.executemany(f'DELETE FROM {TABLE} WHERE id = %s', [(row[0],) for row in rows])
+        cursor.executemany(f'INSERT INTO {TABLE} (id, title, body) VALUES (%s, %s, %s)', rows)
+
+    def delete(self, cursor, doc_ids):
+        cursor.executemany(f'DELETE FROM {TABLE} WHERE id = %s', [(doc_id,) for doc_id in doc_ids])
+
+    def search(self, cursor, code, terms, offset, limit):
+        clauses = ' AND '.join(['LOWER(CONCAT(title, \' \', body)) LIKE %s'] * len(terms))
+        cursor.execute(
+            f'SELECT id FROM {TABLE} WHERE {clauses} AND MOD(id, {KIND_MASK + 1}) = %s '
+            f'ORDER BY id DESC LIMIT %s OFFSET %s',
+            [f'%{term}%' for term in terms] + [code, limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def get_backend(conn=None):
+    vendor = (conn or connection).vendor
+    if vendor == 'sqlite':
+        return SQLiteBackend()
+    if vendor == 'postgresql':
+        return PostgresBackend()
+    return LikeBackend()
@@ -0,0 +1,35 @@
+"""
+What gets indexed for each searchable kind.
+
+Every document is one row keyed by `doc_id(kind, object_id)`, which packs
+the kind into the low bits of the object id so lookups, replaces and
+deletes are primary-key operations on every backend.
+"""
+from collections import namedtuple
+
+Kind = namedtuple('Kind', 'code model title_fields body_fields')
+
+KINDS = {
+    'posts': Kind(1, 'posts.Post', ('title',), ('content',)),
+    'users': Kind(2, 'users.User', ('username', 'first_name', 'last_name'), ('bio',)),
+    'pages': Kind(3, 'pages.Page', ('name', 'username'), ('description',)),
+    'groups': Kind(4, 'groups.Group', ('name',), ('description',)),
+}
+KIND_BITS = 3
+KINDS_BY_MODEL = {kind.model: name for name, kind in KINDS.items()}
+
+
+def doc_id(kind, object_id):
+    return (object_id << KIND_BITS) | KINDS[kind].code
+
+
+def object_id(doc_id):
+    return doc_id >> KIND_BITS
+
+
+def document(kind, values):
+    """(title, body) text from a mapping of the kind's fields"""
+    spec = KINDS[kind]
+    title = ' '.join(filter(None, (values[f] for f in spec.title_fields)))
+    body = ' '.join(filter(None, (values[f] for f in spec.body_fields)))
+    return title, body
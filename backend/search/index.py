@@ -0,0 +1,49 @@
+"""
+Index maintenance: signal handlers keep single documents current and
+`rebuild` re-indexes everything in batches (migration backfill and the
+rebuild_search_index command).
+"""
+from django.apps import apps as global_apps
+from django.db import connection
+
+from .backends import get_backend
+from .documents import KINDS, KINDS_BY_MODEL, doc_id, document
+
+
+def index_instance(instance):
+    kind = KINDS_BY_MODEL[instance._meta.label]
+    spec = KINDS[kind]
+    title, body = document(kind, {f: getattr(instance, f) for f in spec.title_fields + spec.body_fields})
+    with connection.cursor() as cursor:
+        get_backend().upsert(cursor, [(doc_id(kind, instance.pk), title, body)])
+
+
+def remove_instance(instance):
+    kind = KINDS_BY_MODEL[instance._meta.label]
+    with connection.cursor() as cursor:
+        get_backend().delete(cursor, [doc_id(kind, instance.pk)])
+
+
+def rebuild(kinds=None, apps=global_apps, batch_size=2000, conn=None):
+    """Re-index every object of `kinds` (all by default). Returns the count."""
+    conn = conn or connection
+    backend = get_backend(conn)
+    indexed = 0
+    for kind in kinds or KINDS:
+        spec = KINDS[kind]
+        model = apps.get_model(spec.model)
+        fields = ('pk',) + spec.title_fields + spec.body_fields
+        batch = []
+        with conn.cursor() as cursor:
+            for values in model._default_manager.order_by('pk').values_list(*fields).iterator(chunk_size=batch_size):
+                row = dict(zip(fields, values))
+                title, body = document(kind, row)
+                batch.append((doc_id(kind, row['pk']), title, body))
+                if len(batch) >= batch_size:
+                    backend.upsert(cursor, batch)
+                    indexed += len(batch)
+                    batch = []
+            if batch:
+                backend.upsert(cursor, batch)
+                indexed += len(batch)
+    return indexed
@@ -0,0 +1,72 @@
+import itertools
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from search.backends import get_backend, query_terms
+from search.documents import doc_id
+
+# Synthetic vocabulary: word frequencies follow a rough Zipf curve, like real text
+SYLLABLES = ['ka', 'lo', 'mi', 're', 'su', 'ta', 'ne', 'vi', 'do', 'pa', 'ri', 'be', 'zo', 'fu', 'ge', 'ho']
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Time ranked search queries against N synthetic post documents (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=100_000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        vocabulary = [''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(20_000)]
+        cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+        def text(words):
+            return ' '.join(rng.choices(vocabulary, cum_weights=cum_weights, k=words))
+
+        backend = get_backend()
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    started = time.perf_counter()
+                    # Ids far above real ones so nothing collides before the rollback
+                    base = 1 << 40
+                    for start in range(0, options['documents'], 5000):
+                        stop = min(start + 5000, options['documents'])
+                        backend.upsert(cursor, [
+                            (doc_id('posts', base + n), text(rng.randint(2, 8)), text(rng.randint(10, 60)))
+                            for n in range(start, stop)
+                        ])
+                    self.stdout.write(f'Indexed {options["documents"]} documents in {time.perf_counter() - started:.1f}s')
+
+                    # Mid-frequency words: common enough to match many documents
+                    timings = []
+                    for _ in range(options['queries']):
+                        words = rng.sample(vocabulary[20:2000], rng.randint(1, 2))
+                        if rng.random() < 0.5:
+                            # Typing in progress: a prefix of the last word
+                            words[-1] = words[-1][:3]
+                        terms = query_terms(' '.join(words))
+                        started = time.perf_counter()
+                        backend.search(cursor, 1, terms, 0, options['page_size'])
+                        timings.append((time.perf_counter() - started) * 1000)
+                raise Rollback
+        except Rollback:
+            pass
+
+        timings.sort()
+        p50 = statistics.median(timings)
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        self.stdout.write(self.style.SUCCESS(
+            f'{connection.vendor}: {len(timings)} queries, p50 {p50:.1f}ms, p95 {p95:.1f}ms, max {timings[-1]:.1f}ms'
+        ))
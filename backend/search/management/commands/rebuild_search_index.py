@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from search.backends import get_backend
+from search.documents import KINDS
+from search.index import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recreate the full-text search index from posts, users, pages and groups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        with transaction.atomic():
+            # Recreating (rather than upserting) also drops documents whose
+            # rows were removed behind the signals' back (raw SQL, restored dumps)
+            with connection.cursor() as cursor:
+                backend.drop(cursor)
+                backend.create(cursor)
+            indexed = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} document(s) of {len(KINDS)} kind(s)'))
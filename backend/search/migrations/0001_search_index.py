@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    from search.backends import get_backend
+    from search.index import rebuild
+
+    with schema_editor.connection.cursor() as cursor:
+        get_backend(schema_editor.connection).create(cursor)
+    rebuild(apps=apps, conn=schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    from search.backends import get_backend
+
+    with schema_editor.connection.cursor() as cursor:
+        get_backend(schema_editor.connection).drop(cursor)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('posts', '0011_videoupload'),
+        ('users', '0005_user_cover_photo_renditions_and_more'),
+        ('pages', '0004_page_cover_photo_renditions_and_more'),
+        ('groups', '0006_group_cover_photo_renditions_and_more'),
+    ]
+
+    operations = [
+        # The index table is vendor specific (FTS5 / tsvector + GIN), so it
+        # is created by the backend rather than described as a model
+        migrations.RunPython(create_index, drop_index),
+    ]
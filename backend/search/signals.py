@@ -0,0 +1,51 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.moderation import users_moderated
+from . import typeahead
+from .documents import KINDS, KINDS_BY_MODEL
+from .index import index_instance, remove_instance
+
+
+@receiver(post_save, sender='posts.Post')
+@receiver(post_save, sender='users.User')
+@receiver(post_save, sender='pages.Page')
+@receiver(post_save, sender='groups.Group')
+def searchable_saved(sender, instance, update_fields=None, **kwargs):
+    """Keep the object's search document current"""
+    if update_fields is not None:
+        spec = KINDS[KINDS_BY_MODEL[sender._meta.label]]
+        if not update_fields & set(spec.title_fields + spec.body_fields):
+            # e.g. counters, renditions or last_login: the text is unchanged
+            return
+    index_instance(instance)
+
+
+@receiver(post_delete, sender='posts.Post')
+@receiver(post_delete, sender='users.User')
+@receiver(post_delete, sender='pages.Page')
+@receiver(post_delete, sender='groups.Group')
+def searchable_deleted(sender, instance, **kwargs):
+    remove_instance(instance)
+
+
+@receiver(post_save, sender='users.User')
+@receiver(post_save, sender='pages.Page')
+def typeahead_saved(sender, instance, update_fields=None, **kwargs):
+    """Log name, picture and is_active changes for every process's typeahead index"""
+    label = sender._meta.label
+    if update_fields is not None and not update_fields & typeahead.INDEXED_FIELDS[label]:
+        return
+    typeahead.log_change(typeahead.KINDS_BY_MODEL[label], instance.pk)
+
+
+@receiver(post_delete, sender='users.User')
+@receiver(post_delete, sender='pages.Page')
+def typeahead_deleted(sender, instance, **kwargs):
+    typeahead.log_change(typeahead.KINDS_BY_MODEL[sender._meta.label], instance.pk)
+
+
+@receiver(users_moderated)
+def typeahead_moderated(sender, user_ids, **kwargs):
+    for user_id in user_ids:
+        typeahead.log_change('users', user_id)
@@ -0,0 +1,209 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from friends.models import Friendship
+from groups.models import Group
+from pages.models import Page
+from posts.models import Post
+from users.models import BlockedUser
+from users.moderation import deactivate_users
+from . import typeahead
+from .backends import get_backend, query_terms
+from .documents import KINDS, doc_id
+
+User = get_user_model()
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.viewer = User.objects.create(username='viewer')
+        self.author = User.objects.create(username='hiker', first_name='Alpine', bio='Mountain photographer')
+        self.client.force_authenticate(self.viewer)
+
+    def _search(self, q, **params):
+        response = self.client.get('/api/search/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def _ids(self, response):
+        return [item['id'] for item in response.data['results']]
+
+    def test_matches_are_ranked_title_first(self):
+        in_body = Post.objects.create(author=self.author, content='Sunset over the mountain lake')
+        in_title = Post.objects.create(author=self.author, title='Mountain diary', content='Day one')
+        Post.objects.create(author=self.author, content='Nothing relevant')
+
+        response = self._search('mountain', type='posts')
+        self.assertEqual(self._ids(response), [in_title.id, in_body.id])
+        self.assertIsNone(response.data['next'])
+
+    def test_last_term_matches_as_prefix(self):
+        post = Post.objects.create(author=self.author, content='Crossing the glacier at dawn')
+        self.assertEqual(self._ids(self._search('glac', type='posts')), [post.id])
+        self.assertEqual(self._ids(self._search('dawn glac', type='posts')), [post.id])
+        self.assertEqual(self._ids(self._search('glac dawn', type='posts')), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        post = Post.objects.create(author=self.author, content='Old words')
+        post.content = 'Fresh words'
+        post.save()
+        self.assertEqual(self._ids(self._search('old', type='posts')), [])
+        self.assertEqual(self._ids(self._search('fresh', type='posts')), [post.id])
+
+        post.delete()
+        self.assertEqual(self._ids(self._search('fresh', type='posts')), [])
+
+    def test_hidden_results_are_skipped(self):
+        public = Post.objects.create(author=self.author, content='Canyon public')
+        Post.objects.create(author=self.author, content='Canyon private', visibility='private')
+        friends_only = Post.objects.create(author=self.author, content='Canyon friends', visibility='friends')
+        blocker = User.objects.create(username='blocker')
+        Post.objects.create(author=blocker, content='Canyon blocked')
+        BlockedUser.objects.create(blocker=blocker, blocked=self.viewer)
+
+        self.assertEqual(sorted(self._ids(self._search('canyon', type='posts'))), [public.id])
+
+        cache.clear()
+        Friendship.objects.create(from_user=self.viewer, to_user=self.author, status='accepted')
+        self.assertEqual(sorted(self._ids(self._search('canyon', type='posts'))), [public.id, friends_only.id])
+
+    def test_cursor_pages_through_results(self):
+        posts = [Post.objects.create(author=self.author, content=f'Ridge walk {i}') for i in range(5)]
+        seen = []
+        url = '/api/search/?q=ridge&type=posts&page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen += self._ids(response)
+            url = response.data['next']
+        self.assertEqual(sorted(seen), [post.id for post in posts])
+
+    def test_overview_returns_every_kind(self):
+        Post.objects.create(author=self.author, content='Alpine meadow')
+        Page.objects.create(owner=self.author, name='Alpine Club', username='alpineclub')
+        Group.objects.create(created_by=self.author, name='Alpine routes')
+
+        response = self._search('alpine')
+        self.assertEqual(set(response.data), set(KINDS))
+        for kind in KINDS:
+            self.assertEqual(len(response.data[kind]), 1, kind)
+        self.assertEqual(response.data['users'][0]['id'], self.author.id)
+
+    @override_settings(SEARCH_RANK_WINDOW=10)
+    def test_rank_window_counts_only_the_requested_kind(self):
+        sunny = User.objects.create(username='sunny')
+        Post.objects.bulk_create([Post(author=self.author, content=f'Sunny day {i}') for i in range(30)])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self._ids(self._search('sunny', type='users')), [sunny.id])
+        self.assertEqual(len(self._ids(self._search('sunny', type='posts'))), 10)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.get('/api/search/', {'q': '  !? '}).status_code, 400)
+        self.assertEqual(self.client.get('/api/search/', {'q': 'x', 'type': 'comments'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/search/', {'q': 'x', 'type': 'posts', 'cursor': '%%%'}).status_code, 404)
+
+    def test_query_syntax_is_not_interpreted(self):
+        Post.objects.create(author=self.author, content='Quotes "and" OR NEAR stars*')
+        self.assertEqual(len(self._ids(self._search('"and" OR NEAR(', type='posts'))), 1)
+        self.assertEqual(query_terms('a"b c*d'), ['a', 'b', 'c', 'd'])
+
+    def test_rebuild_command_drops_stale_documents(self):
+        post = Post.objects.create(author=self.author, content='Boulder field')
+        with connection.cursor() as cursor:
+            get_backend().upsert(cursor, [(doc_id('posts', post.id + 1000), 'Boulder ghost', '')])
+
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Indexed', out.getvalue())
+        with connection.cursor() as cursor:
+            found = get_backend().search(cursor, KINDS['posts'].code, ['boulder'], 0, 10)
+        self.assertEqual(found, [doc_id('posts', post.id)])
+
+
+class TypeaheadTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        typeahead.index.generation = None
+        self.viewer = User.objects.create(username='viewer')
+        self.ada = User.objects.create(username='ada', first_name='Ada', last_name='Lovelace')
+        self.adams = User.objects.create(username='jadams', first_name='Ádám', last_name='Adams')
+        self.page = Page.objects.create(owner=self.ada, name='Analytical Engines', username='engines')
+        self.client.force_authenticate(self.viewer)
+
+    def _suggest(self, q, **params):
+        response = self.client.get('/api/search/autocomplete/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(item['type'], item['id']) for item in response.data['results']]
+
+    def test_prefix_matches_usernames_and_name_words(self):
+        self.assertEqual(self._suggest('ada'), [('users', self.ada.id), ('users', self.adams.id)])
+        self.assertEqual(self._suggest('LOVE'), [('users', self.ada.id)])
+        self.assertEqual(self._suggest('engi'), [('pages', self.page.id)])
+        self.assertEqual(self._suggest('an'), [('pages', self.page.id)])
+        self.assertEqual(self._suggest('a', type='pages'), [('pages', self.page.id)])
+        self.assertEqual(self._suggest(''), [])
+
+    def test_blocked_and_inactive_users_are_left_out(self):
+        BlockedUser.objects.create(blocker=self.ada, blocked=self.viewer)
+        self.assertEqual(self._suggest('a'), [('users', self.adams.id)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.adams.is_active = False
+            self.adams.save()
+        self.assertEqual(self._suggest('a'), [])
+
+    def test_bulk_deactivation_reaches_the_index(self):
+        self.assertEqual(self._suggest('jad'), [('users', self.adams.id)])
+        with self.captureOnCommitCallbacks(execute=True):
+            deactivate_users([self.adams.id])
+        self.assertEqual(self._suggest('jad'), [])
+
+    def test_keystrokes_only_check_the_matches_are_active(self):
+        self._suggest('a')
+        with self.assertNumQueries(2):
+            self._suggest('ad')
+            self._suggest('ada')
+
+    def test_deactivations_an_index_has_not_seen_are_left_out(self):
+        self.assertEqual(self._suggest('engi'), [('pages', self.page.id)])
+        # As if deactivated through a process whose log entry this one missed
+        User.objects.filter(pk=self.ada.pk).update(is_active=False)
+        self.assertEqual(self._suggest('a'), [('users', self.adams.id)])
+        self.assertEqual(self._suggest('engi'), [])
+
+    @override_settings(CACHE_SHARED=False)
+    def test_rebuilds_periodically_without_a_shared_cache(self):
+        self._suggest('a')
+        User.objects.filter(pk=self.ada.pk).update(last_name='Countess')
+        self.assertEqual(self._suggest('count'), [])
+        typeahead.index.built_at -= typeahead.LOCAL_REBUILD_INTERVAL + 1
+        self.assertEqual(self._suggest('count'), [('users', self.ada.id)])
+
+    def test_changes_reach_other_processes_incrementally(self):
+        other = typeahead.TypeaheadIndex()
+        other.sync()
+        self.assertEqual([pk for _, pk, _ in other.lookup('count')], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ada.last_name = 'Countess'
+            self.ada.save()
+            self.page.delete()
+        # Only the two changed rows are re-read, one query per kind
+        with self.assertNumQueries(2):
+            self.assertEqual([pk for _, pk, _ in other.lookup('count')], [self.ada.id])
+        self.assertEqual(other.lookup('engi'), [])
+        self.assertEqual(self._suggest('love'), [])
+
+        # Saves of unindexed fields are not logged
+        generation = cache.get(typeahead.GENERATION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ada.save(update_fields=['last_login'])
+        self.assertEqual(cache.get(typeahead.GENERATION_KEY), generation)
@@ -0,0 +1,193 @@
+"""
+Typeahead for @mentions and pickers: users and pages by name prefix.
+
+Each process keeps a sorted array of `(key, kind, id)` over usernames,
+page usernames and every word-start of display names ("ada lovelace",
+"lovelace"), so a keystroke is a bisect plus a short scan and never
+touches the database.
+
+Changes are appended to a log in the shared cache (a counter plus one
+entry per change) after the transaction commits. Before answering, a
+process reads the counter and reloads only the objects changed since
+its last sync; if the log was evicted or has grown too far ahead, it
+rebuilds from scratch. A per-process cache (CACHE_SHARED off) only holds
+the process's own changes, so then the index is also rebuilt every
+LOCAL_REBUILD_INTERVAL seconds. Either way an index can lag a change
+briefly, so the autocomplete view checks its few matches are still active.
+"""
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+KINDS = {
+    'users': ('users.User', ('username', 'first_name', 'last_name', 'profile_picture', 'is_active')),
+    'pages': ('pages.Page', ('username', 'name', 'profile_picture', 'owner_id')),
+}
+KINDS_BY_MODEL = {model: kind for kind, (model, _) in KINDS.items()}
+# Saves touching only other fields (last_login, counters) are not logged
+INDEXED_FIELDS = {
+    'users.User': {'username', 'first_name', 'last_name', 'profile_picture', 'is_active'},
+    'pages.Page': {'username', 'name', 'profile_picture', 'owner'},
+}
+
+GENERATION_KEY = 'typeahead:generation'
+# Beyond this many unseen changes a full rebuild is cheaper than catching up
+MAX_CATCH_UP = 1000
+# Matching keys scanned per lookup, so a one-letter prefix stays bounded
+MAX_SCAN = 500
+# Log entries older than this are gone; processes that far behind rebuild
+CHANGE_TIMEOUT = 24 * 60 * 60
+# Without a shared cache other processes' changes never reach the log
+LOCAL_REBUILD_INTERVAL = 60
+
+
+def normalize(text):
+    """Case- and accent-insensitive form used for keys and queries"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold().strip()
+
+
+def _change_key(generation):
+    return f'typeahead:change:{generation}'
+
+
+def _entry(kind, values):
+    """(keys, payload) for one row of KINDS[kind] fields, or None if it is not listed"""
+    if kind == 'users':
+        if not values['is_active']:
+            return None
+        name = ' '.join(filter(None, (values['first_name'], values['last_name'])))
+        owner_id = None
+    else:
+        name = values['name']
+        owner_id = values['owner_id']
+    words = normalize(name).split()
+    keys = {normalize(values['username'])}
+    keys.update(' '.join(words[i:]) for i in range(len(words)))
+    keys.discard('')
+    payload = (values['username'], name, values['profile_picture'] or '', owner_id)
+    return keys, payload
+
+
+class TypeaheadIndex:
+    def __init__(self):
+        self.keys = []        # sorted (key, kind, id)
+        self.entries = {}     # (kind, id) -> (keys, payload)
+        self.generation = None
+        self.built_at = None
+        self.lock = threading.Lock()
+
+    # -- maintenance --------------------------------------------------------
+
+    def _load(self, kind, ids=None):
+        model_label, fields = KINDS[kind]
+        queryset = apps.get_model(model_label)._default_manager.order_by()
+        if ids is not None:
+            queryset = queryset.filter(pk__in=ids)
+        for values in queryset.values('pk', *fields).iterator(chunk_size=5000):
+            yield values['pk'], _entry(kind, values)
+
+    def rebuild(self):
+        generation = cache.get(GENERATION_KEY, 0)
+        keys, entries = [], {}
+        for kind in KINDS:
+            for pk, entry in self._load(kind):
+                if entry:
+                    entries[(kind, pk)] = entry
+                    keys.extend((key, kind, pk) for key in entry[0])
+        keys.sort()
+        self.keys, self.entries, self.generation = keys, entries, generation
+        self.built_at = time.monotonic()
+
+    def _remove(self, kind, pk):
+        entry = self.entries.pop((kind, pk), None)
+        if entry:
+            for key in entry[0]:
+                i = bisect_left(self.keys, (key, kind, pk))
+                if i < len(self.keys) and self.keys[i] == (key, kind, pk):
+                    del self.keys[i]
+
+    def refresh(self, kind, ids):
+        """Re-read these objects; missing or unlisted ones are dropped"""
+        ids = set(ids)
+        for pk in ids:
+            self._remove(kind, pk)
+        for pk, entry in self._load(kind, ids):
+            if entry:
+                self.entries[(kind, pk)] = entry
+                for key in entry[0]:
+                    insort(self.keys, (key, kind, pk))
+
+    def sync(self):
+        """Apply changes logged by any process since the last sync"""
+        current = cache.get(GENERATION_KEY, 0)
+        stale = not settings.CACHE_SHARED and time.monotonic() - (self.built_at or 0) > LOCAL_REBUILD_INTERVAL
+        if self.generation is None or current < self.generation or current - self.generation > MAX_CATCH_UP or stale:
+            # First use, counter evicted/reset, too far behind, or blind to other processes
+            self.rebuild()
+            return
+        if current == self.generation:
+            return
+        wanted = [_change_key(generation) for generation in range(self.generation + 1, current + 1)]
+        changes = cache.get_many(wanted)
+        if len(changes) < len(wanted):
+            self.rebuild()
+            return
+        changed = {}
+        for kind, pk in changes.values():
+            changed.setdefault(kind, set()).add(pk)
+        for kind, ids in changed.items():
+            self.refresh(kind, ids)
+        self.generation = current
+
+    # -- lookup -------------------------------------------------------------
+
+    def lookup(self, prefix, kinds=KINDS, hidden_ids=frozenset(), limit=10):
+        """
+        Up to `limit` (kind, id, payload) whose name or username starts
+        with `prefix`, shortest completions first. Users in `hidden_ids`
+        and their pages are left out.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        with self.lock:
+            self.sync()
+            start = bisect_left(self.keys, (prefix,))
+            candidates = {}
+            for key, kind, pk in self.keys[start:start + MAX_SCAN]:
+                if not key.startswith(prefix):
+                    break
+                if kind not in kinds:
+                    continue
+                payload = self.entries[(kind, pk)][1]
+                if (pk if kind == 'users' else payload[3]) in hidden_ids:
+                    continue
+                # Rank by the closest of the object's keys ("ada" before "adams")
+                rank = (len(key), key, payload)
+                if (kind, pk) not in candidates or rank < candidates[(kind, pk)]:
+                    candidates[(kind, pk)] = rank
+        ranked = sorted(candidates.items(), key=lambda item: item[1][:2])[:limit]
+        return [(kind, pk, payload) for (kind, pk), (_, _, payload) in ranked]
+
+
+index = TypeaheadIndex()
+
+
+def log_change(kind, pk):
+    """Append a change to the shared log once the transaction commits"""
+    def append():
+        cache.add(GENERATION_KEY, 0, None)
+        try:
+            generation = cache.incr(GENERATION_KEY)
+        except ValueError:
+            # Evicted between add and incr: every process will rebuild
+            return
+        cache.set(_change_key(generation), (kind, pk), CHANGE_TIMEOUT)
+    transaction.on_commit(append)
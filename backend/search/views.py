@@ -0,0 +1,196 @@
+import base64
+import binascii
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db.models import Q
+from rest_framework import permissions, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from friends.models import Friendship
+from groups.models import Group
+from groups.serializers import GroupSerializer
+from lookbook.metrics import query_budget
+from pages.models import Page
+from pages.serializers import PageSerializer
+from posts.models import Post
+from posts.serializers import PostSerializer
+from users.blocks import block_set_for
+from users.serializers import UserSerializer
+from . import typeahead
+from .backends import get_backend, query_terms
+from .documents import KINDS, object_id
+
+User = get_user_model()
+
+MAX_PAGE_SIZE = 50
+OVERVIEW_SIZE = 5
+MAX_SUGGESTIONS = 20
+# Index rows fetched per visible result wanted, and how many rounds to try
+# before handing back a short page (mostly hidden results, e.g. blocked users)
+OVERFETCH = 2
+MAX_ROUNDS = 5
+
+SERIALIZERS = {
+    'posts': PostSerializer,
+    'users': UserSerializer,
+    'pages': PageSerializer,
+    'groups': GroupSerializer,
+}
+
+
+def visible_queryset(kind, request):
+    """What the viewer may see of each kind; index hits outside it are skipped"""
+    hidden = block_set_for(request).hidden_ids
+    if kind == 'posts':
+        queryset = Post.objects.for_feed(request.user).filter(is_visible=True).exclude(author_id__in=hidden)
+        friend_ids = Friendship.objects.friend_ids(request.user.id)
+        return queryset.filter(
+            Q(visibility='public') | Q(author=request.user) | Q(visibility='friends', author_id__in=friend_ids)
+        )
+    if kind == 'users':
+        return User.objects.filter(is_active=True).exclude(id__in=hidden)
+    if kind == 'pages':
+        return Page.objects.for_viewer(request.user)
+    return Group.objects.for_viewer(request.user)
+
+
+def ranked_results(kind, terms, request, start, limit):
+    """
+    Up to `limit` visible objects in rank order, starting at index position
+    `start`, and the position to continue from (None when exhausted)
+    """
+    backend = get_backend()
+    queryset = visible_queryset(kind, request)
+    results = []
+    position = start
+    with connection.cursor() as cursor:
+        for _ in range(MAX_ROUNDS):
+            wanted = limit + 1 - len(results)
+            batch = max(wanted * OVERFETCH, 20)
+            doc_ids = backend.search(cursor, KINDS[kind].code, terms, position, batch)
+            objects = queryset.in_bulk([object_id(doc_id) for doc_id in doc_ids])
+            for i, doc_id in enumerate(doc_ids):
+                obj = objects.get(object_id(doc_id))
+                if obj is not None:
+                    results.append((position + i + 1, obj))
+                    if len(results) > limit:
+                        # One extra result found: there is a next page
+                        return [obj for _, obj in results[:limit]], results[limit - 1][0]
+            position += len(doc_ids)
+            if len(doc_ids) < batch:
+                return [obj for _, obj in results], None
+    # Gave up scanning; let the client continue where we stopped
+    return [obj for _, obj in results], position
+
+
+def _encode_cursor(position):
+    return base64.urlsafe_b64encode(str(position).encode()).decode().rstrip('=')
+
+
+def _decode_cursor(encoded):
+    try:
+        position = int(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+    except (binascii.Error, ValueError):
+        raise NotFound('Invalid cursor')
+    if position < 0:
+        raise NotFound('Invalid cursor')
+    return position
+
+
+def _page_size(request):
+    try:
+        size = int(request.query_params.get('page_size', api_settings.PAGE_SIZE))
+    except ValueError:
+        return api_settings.PAGE_SIZE
+    return min(size, MAX_PAGE_SIZE) if size > 0 else api_settings.PAGE_SIZE
+
+
+# The block set, then an index query and an in_bulk per ranking round:
+# one round per kind for the overview, up to MAX_ROUNDS for one kind
+@query_budget(1 + 2 * MAX_ROUNDS)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def search(request):
+    """
+    Full-text search. `?q=` with `type=posts|users|pages|groups` returns
+    ranked results with a `next` cursor; without `type`, the top few
+    results of every kind.
+    """
+    terms = query_terms(request.query_params.get('q', ''))
+    if not terms:
+        return Response({'error': 'Query is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    kind = request.query_params.get('type')
+    context = {'request': request}
+    if not kind:
+        overview = {}
+        for name, serializer_class in SERIALIZERS.items():
+            objects, _ = ranked_results(name, terms, request, 0, OVERVIEW_SIZE)
+            overview[name] = serializer_class(objects, many=True, context=context).data
+        return Response(overview)
+
+    if kind not in SERIALIZERS:
+        return Response({'error': f'type must be one of {", ".join(SERIALIZERS)}'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    cursor = request.query_params.get('cursor')
+    start = _decode_cursor(cursor) if cursor else 0
+    objects, position = ranked_results(kind, terms, request, start, _page_size(request))
+
+    url = request.build_absolute_uri()
+    return Response({
+        'next': replace_query_param(url, 'cursor', _encode_cursor(position)) if position is not None else None,
+        'results': SERIALIZERS[kind](objects, many=True, context=context).data,
+    })
+
+
+# The block set, loading users and pages when the process index is cold, and
+# the matches' is_active check
+@query_budget(4)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def autocomplete(request):
+    """
+    Users and pages whose name or username starts with `?q=`, for
+    @mentions and pickers. `type=users|pages` narrows it, `limit` (max 20)
+    caps it. Served from the in-process typeahead index; the only query
+    beyond the viewer's (cached) block set checks the matched users (and
+    page owners) are still active, in case this process hasn't seen a
+    deactivation yet.
+    """
+    kind = request.query_params.get('type')
+    if kind and kind not in typeahead.KINDS:
+        return Response({'error': f'type must be one of {", ".join(typeahead.KINDS)}'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = min(max(int(request.query_params.get('limit', 10)), 1), MAX_SUGGESTIONS)
+    except ValueError:
+        limit = 10
+
+    matches = typeahead.index.lookup(
+        request.query_params.get('q', ''),
+        kinds=(kind,) if kind else typeahead.KINDS,
+        hidden_ids=block_set_for(request).hidden_ids,
+        limit=limit,
+    )
+    user_ids = {pk if kind == 'users' else owner_id for kind, pk, (*_, owner_id) in matches}
+    active_ids = set()
+    if user_ids:
+        active_ids = set(User.objects.filter(pk__in=user_ids, is_active=True).values_list('pk', flat=True))
+    results = []
+    for kind, pk, (username, name, picture, owner_id) in matches:
+        if (pk if kind == 'users' else owner_id) not in active_ids:
+            continue
+        results.append({
+            'type': kind,
+            'id': pk,
+            'username': username,
+            'name': name,
+            'profile_picture': request.build_absolute_uri(default_storage.url(picture)) if picture else None,
+        })
+    return Response({'results': results})
@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils import timezone
 from .models import User, BlockedUser, UnblockRequest
+from . import moderation
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
@@ -43,8 +44,8 @@ class CustomUserAdmin(UserAdmin):
     
     def activate_users(self, request, queryset):
         """Bulk action to activate users"""
-        updated = queryset.update(is_active=True)
-        self.message_user(request, f'{updated} user(s) activated.')
+        report = moderation.reactivate_users(queryset.values_list('pk', flat=True))
+        self.message_user(request, f'{report["users"]} user(s) activated.')
     activate_users.short_description = 'Activate selected users'
     
     def deactivate_users(self, request, queryset):
@@ -55,16 +56,11 @@ class CustomUserAdmin(UserAdmin):
             self.message_user(request, 'Cannot deactivate superuser accounts!', level='error')
             return
         
-        # Remove all pending friend requests for these users
-        from friends.models import Friendship
-        from django.db.models import Q
-        
-        for user in queryset:
-            # Delete all pending friendships where this user is involved
-            Friendship.objects.filter(
-                Q(from_user=user, status='pending') | Q(to_user=user, status='pending')
-            ).delete()
-        
-        updated = queryset.update(is_active=False)
-        self.message_user(request, f'{updated} user(s) deactivated/blocked and their pending friend requests removed.')
+        # Set-based: pending friend requests removed, posts/comments hidden
+        report = moderation.deactivate_users(queryset.values_list('pk', flat=True))
+        self.message_user(
+            request,
+            f'{report["users"]} user(s) deactivated/blocked and their '
+            f'{report["friend_requests"]} pending friend request(s) removed.',
+        )
     deactivate_users.short_description = 'Block/Deactivate selected users'
@@ -0,0 +1,94 @@
+"""
+Per-viewer block sets.
+
+Every "has X blocked Y" check on a read goes through here. A user's block
+set (who they blocked, who blocked them) is loaded with one query, stored
+in the Django cache across requests and memoized on the request, so after
+the first lookup block filtering costs no queries. BlockedUser signals (see
+users.signals) invalidate both users' entries. A per-process cache
+(CACHE_SHARED off) would only be invalidated in the worker that handled
+the block, so then block sets are only memoized per request. Writes that
+must not get past a block (friend requests) check the database.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from .models import BlockedUser
+
+
+class BlockSet:
+    __slots__ = ('blocked_ids', 'blocked_me_ids')
+
+    def __init__(self, blocked_ids=(), blocked_me_ids=()):
+        self.blocked_ids = frozenset(blocked_ids)
+        self.blocked_me_ids = frozenset(blocked_me_ids)
+
+    @property
+    def hidden_ids(self):
+        """Users blocked in either direction"""
+        return self.blocked_ids | self.blocked_me_ids
+
+    def blocks_either_way(self, user_id):
+        return user_id in self.blocked_ids or user_id in self.blocked_me_ids
+
+
+EMPTY_BLOCK_SET = BlockSet()
+
+
+def _cache_key(user_id):
+    return f'users:blockset:{user_id}'
+
+
+def get_block_sets(user_ids):
+    """
+    {user_id: BlockSet} from the shared cache, loading every miss with a
+    single query
+    """
+    user_ids = set(user_ids)
+    keys = {_cache_key(user_id): user_id for user_id in user_ids}
+    found = {}
+    if settings.CACHE_SHARED:
+        found = {keys[key]: value for key, value in cache.get_many(list(keys)).items()}
+
+    missing = user_ids - set(found)
+    if missing:
+        loaded = {user_id: ([], []) for user_id in missing}
+        rows = BlockedUser.objects.filter(
+            Q(blocker_id__in=missing) | Q(blocked_id__in=missing)
+        ).values_list('blocker_id', 'blocked_id')
+        for blocker_id, blocked_id in rows:
+            if blocker_id in loaded:
+                loaded[blocker_id][0].append(blocked_id)
+            if blocked_id in loaded:
+                loaded[blocked_id][1].append(blocker_id)
+        if settings.CACHE_SHARED:
+            cache.set_many(
+                {_cache_key(user_id): value for user_id, value in loaded.items()},
+                settings.BLOCK_SET_CACHE_TIMEOUT,
+            )
+        found.update(loaded)
+    return {user_id: BlockSet(*value) for user_id, value in found.items()}
+
+
+def get_block_set(user_id):
+    """Block set of user_id from the shared cache, loading it on a miss"""
+    if user_id is None:
+        return EMPTY_BLOCK_SET
+    return get_block_sets([user_id])[user_id]
+
+
+def block_set_for(request):
+    """The request user's block set, memoized on the request"""
+    if request is None or not request.user.is_authenticated:
+        return EMPTY_BLOCK_SET
+    memo = getattr(request, '_block_set', None)
+    if memo is None or memo[0] != request.user.id:
+        memo = (request.user.id, get_block_set(request.user.id))
+        request._block_set = memo
+    return memo[1]
+
+
+def invalidate_block_sets(*user_ids):
+    if settings.CACHE_SHARED:
+        cache.delete_many([_cache_key(user_id) for user_id in user_ids])
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users.moderation import deactivate_users, reactivate_users, sync_visibility
+
+
+class Command(BaseCommand):
+    help = 'Deactivate or reactivate users in bulk, or re-sync post/comment visibility with is_active'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['deactivate', 'reactivate', 'sync'])
+        parser.add_argument('user_ids', nargs='*', type=int)
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        action, user_ids = options['action'], options['user_ids']
+        if action == 'sync':
+            report = sync_visibility(batch_size=options['batch_size'])
+        elif not user_ids:
+            raise CommandError(f'{action} needs at least one user id')
+        elif action == 'deactivate':
+            report = deactivate_users(user_ids, batch_size=options['batch_size'])
+        else:
+            report = reactivate_users(user_ids, batch_size=options['batch_size'])
+        for name in ('users', 'friend_requests', 'posts', 'comments'):
+            if name in report:
+                self.stdout.write(f'{name}: {report[name]}')
+        self.stdout.write(self.style.SUCCESS(f'{action.capitalize()} done'))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_unblockrequest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='cover_photo_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='profile_picture_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
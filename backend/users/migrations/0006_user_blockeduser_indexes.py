@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0005_user_cover_photo_renditions_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blockeduser',
+            index=models.Index(fields=['blocked', 'blocker'], name='users_blocked_by'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at'], name='users_user_active_recent'),
+        ),
+    ]
@@ -5,6 +5,9 @@ class User(AbstractUser):
     bio = models.TextField(max_length=500, blank=True)
     profile_picture = models.ImageField(upload_to='profile_pics/', null=True, blank=True)
     cover_photo = models.ImageField(upload_to='cover_photos/', null=True, blank=True)
+    # Resized copies, filled in by lookbook.images
+    profile_picture_renditions = models.JSONField(default=dict, blank=True, editable=False)
+    cover_photo_renditions = models.JSONField(default=dict, blank=True, editable=False)
     date_of_birth = models.DateField(null=True, blank=True)
     location = models.CharField(max_length=100, blank=True)
     website = models.URLField(max_length=200, blank=True)
@@ -29,6 +32,10 @@ class User(AbstractUser):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Newest active users (cold-start friend suggestions)
+            models.Index(fields=['-created_at'], condition=models.Q(is_active=True), name='users_user_active_recent'),
+        ]
 
 class BlockedUser(models.Model):
     blocker = models.ForeignKey(User, on_delete=models.CASCADE, related_name='blocking')
@@ -38,6 +45,10 @@ class BlockedUser(models.Model):
     class Meta:
         unique_together = ('blocker', 'blocked')
         ordering = ['-created_at']
+        indexes = [
+            # "Who blocked me": the unique constraint only serves the blocker side
+            models.Index(fields=['blocked', 'blocker'], name='users_blocked_by'),
+        ]
 
     def __str__(self):
         return f"{self.blocker.username} blocked {self.blocked.username}"
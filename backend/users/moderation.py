@@ -0,0 +1,119 @@
+"""
+Bulk deactivation and reactivation of accounts.
+
+Everything is done with set-based statements per batch of users: one
+UPDATE for the accounts, one DELETE for their pending friend requests,
+one UPDATE each for the `is_visible` flag of their posts and comments,
+and one UPDATE recounting `comments_count` on the posts they commented
+on. Reads then filter on `is_visible` instead of joining the author.
+
+Single saves that flip `is_active` (the admin change form, the setup
+views) are covered by a post_save handler in users.signals, through
+apply_activity().
+"""
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import OuterRef, Q
+from django.dispatch import Signal
+
+from lookbook.response_cache import bump_generation
+
+User = get_user_model()
+
+# Sent after a batch commits, with `user_ids` and `active`, for caches
+# that don't see queryset updates (e.g. the search typeahead)
+users_moderated = Signal()
+
+
+def set_content_visibility(user_ids, visible):
+    """Show or hide the posts and comments of `user_ids`; returns row counts"""
+    from comments.models import Comment
+    from posts.models import Post, count_subquery
+
+    report = Counter()
+    report['posts'] = Post.objects.filter(author_id__in=user_ids).exclude(is_visible=visible).update(is_visible=visible)
+
+    comments = Comment.objects.filter(author_id__in=user_ids).exclude(is_visible=visible)
+    post_ids = list(comments.order_by().values_list('post_id', flat=True).distinct())
+    if post_ids:
+        report['comments'] = comments.update(is_visible=visible)
+        visible_comments = Comment.objects.filter(post=OuterRef('pk'), is_visible=True, is_deleted=False)
+        Post.objects.filter(pk__in=post_ids).update(comments_count=count_subquery(visible_comments, 'post'))
+    return report
+
+
+def apply_activity(user_ids, active):
+    """
+    What follows setting is_active on `user_ids`: pending friend requests
+    dropped on deactivation, posts and comments hidden or shown. Returns
+    row counts.
+    """
+    from friends.models import Friendship
+
+    report = Counter()
+    if not active:
+        deleted, _ = Friendship.objects.filter(
+            Q(from_user_id__in=user_ids) | Q(to_user_id__in=user_ids), status='pending'
+        ).delete()
+        report['friend_requests'] += deleted
+    report.update(set_content_visibility(user_ids, active))
+    return report
+
+
+def _moderate(user_ids, active, batch_size):
+    user_ids = sorted(set(user_ids))
+    report = Counter()
+    changed = []
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        with transaction.atomic():
+            users = User.objects.filter(pk__in=batch, is_active=not active)
+            if not active:
+                users = users.exclude(is_superuser=True)
+            batch = list(users.values_list('pk', flat=True))
+            if not batch:
+                continue
+            report['users'] += User.objects.filter(pk__in=batch).update(is_active=active)
+            report.update(apply_activity(batch, active))
+        changed.extend(batch)
+
+    if changed:
+        bump_generation('posts')
+        users_moderated.send(sender=User, user_ids=changed, active=active)
+    return report
+
+
+def deactivate_users(user_ids, batch_size=500):
+    """
+    Deactivate users (superusers are skipped), drop their pending friend
+    requests and hide their posts and comments. Returns a Counter of
+    affected rows: users, friend_requests, posts, comments.
+    """
+    return _moderate(user_ids, False, batch_size)
+
+
+def reactivate_users(user_ids, batch_size=500):
+    """Reactivate users and show their posts and comments again"""
+    return _moderate(user_ids, True, batch_size)
+
+
+def sync_visibility(batch_size=500):
+    """Fix is_visible wherever it disagrees with the author, e.g. after raw edits to is_active"""
+    from comments.models import Comment
+    from posts.models import Post
+
+    report = Counter()
+    for active in (True, False):
+        stale = Q(is_visible=not active, author__is_active=active)
+        author_ids = sorted(
+            set(Post.objects.filter(stale).order_by().values_list('author_id', flat=True).distinct())
+            | set(Comment.objects.filter(stale).order_by().values_list('author_id', flat=True).distinct())
+        )
+        for start in range(0, len(author_ids), batch_size):
+            with transaction.atomic():
+                report.update(set_content_visibility(author_ids[start:start + batch_size], active))
+    if report:
+        bump_generation('posts')
+    return report
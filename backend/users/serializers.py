@@ -1,16 +1,20 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from lookbook.images import RenditionsField
 
 User = get_user_model()
 
 class UserSerializer(serializers.ModelSerializer):
     can_use_rich_editor = serializers.SerializerMethodField()
     has_blocked_me = serializers.SerializerMethodField()
+    profile_picture_renditions = RenditionsField()
+    cover_photo_renditions = RenditionsField()
     
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'bio', 
-                  'profile_picture', 'cover_photo', 'date_of_birth', 'location', 
+                  'profile_picture', 'cover_photo', 'profile_picture_renditions', 
+                  'cover_photo_renditions', 'date_of_birth', 'location', 
                   'website', 'created_at', 'is_staff', 'is_superuser', 
                   'can_use_rich_editor', 'rich_editor_requested', 'is_active', 'has_blocked_me']
         read_only_fields = ['id', 'created_at', 'is_staff', 'is_superuser', 
@@ -27,11 +31,8 @@ class UserSerializer(serializers.ModelSerializer):
         """
         Check if this user has blocked the current request user
         """
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            from .models import BlockedUser
-            return BlockedUser.objects.filter(blocker=obj, blocked=request.user).exists()
-        return False
+        from .blocks import block_set_for
+        return obj.id in block_set_for(self.context.get('request')).blocked_me_ids
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -0,0 +1,31 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from lookbook.response_cache import bump_generation_on_commit
+from .blocks import invalidate_block_sets
+from .models import BlockedUser, User
+from .moderation import apply_activity
+
+
+@receiver([post_save, post_delete], sender=BlockedUser)
+def blocked_user_changed(sender, instance, **kwargs):
+    """Drop cached block sets of both sides of a block"""
+    invalidate_block_sets(instance.blocker_id, instance.blocked_id)
+
+
+@receiver(post_init, sender=User)
+def remember_is_active(sender, instance, **kwargs):
+    # __dict__ so a deferred is_active (only()) is not loaded here
+    instance._saved_is_active = instance.__dict__.get('is_active')
+
+
+@receiver(post_save, sender=User)
+def user_activity_changed(sender, instance, created, update_fields=None, **kwargs):
+    """Moderate the user's content when is_active is flipped on a single save"""
+    if update_fields is not None and 'is_active' not in update_fields:
+        return
+    previous, instance._saved_is_active = instance._saved_is_active, instance.is_active
+    if created or previous == instance.is_active:
+        return
+    apply_activity([instance.pk], instance.is_active)
+    bump_generation_on_commit('posts')
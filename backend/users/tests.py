@@ -1,3 +1,156 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from comments.models import Comment
+from friends.models import Friendship
+from posts.models import Post
+from .blocks import get_block_set
+from .models import BlockedUser
+from .moderation import deactivate_users, reactivate_users
+
+User = get_user_model()
+
+
+class BlockSetCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.me = User.objects.create(username='me')
+        self.other = User.objects.create(username='other')
+        self.client.force_authenticate(self.me)
+
+    def test_cached_after_first_load(self):
+        with self.assertNumQueries(1):
+            get_block_set(self.me.id)
+        with self.assertNumQueries(0):
+            get_block_set(self.me.id)
+
+    def test_block_and_unblock_invalidate_both_sides(self):
+        get_block_set(self.me.id)
+        get_block_set(self.other.id)
+
+        self.client.post(f'/api/users/{self.other.id}/block/')
+        self.assertEqual(get_block_set(self.me.id).blocked_ids, {self.other.id})
+        self.assertEqual(get_block_set(self.other.id).blocked_me_ids, {self.me.id})
+        self.assertEqual(
+            self.client.post(f'/api/friends/request/{self.other.id}/').status_code, 400
+        )
+
+        self.client.post(f'/api/users/{self.other.id}/unblock/')
+        self.assertEqual(get_block_set(self.me.id).blocked_ids, set())
+
+    @override_settings(CACHE_SHARED=False)
+    def test_per_process_cache_is_not_used_across_requests(self):
+        with self.assertNumQueries(1):
+            get_block_set(self.me.id)
+        with self.assertNumQueries(1):
+            get_block_set(self.me.id)
+
+    def test_friend_requests_check_blocks_in_the_database(self):
+        get_block_set(self.me.id)
+        # As if blocked through a worker whose invalidation this one never saw
+        BlockedUser.objects.bulk_create([BlockedUser(blocker=self.other, blocked=self.me)])
+        self.assertFalse(get_block_set(self.me.id).blocks_either_way(self.other.id))
+        self.assertEqual(self.client.post(f'/api/friends/request/{self.other.id}/').status_code, 400)
+
+    def test_admin_side_deletes_invalidate(self):
+        BlockedUser.objects.create(blocker=self.other, blocked=self.me)
+        self.assertTrue(get_block_set(self.me.id).blocks_either_way(self.other.id))
+        BlockedUser.objects.all().delete()
+        self.assertFalse(get_block_set(self.me.id).blocks_either_way(self.other.id))
+
+
+class ModerationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.viewer = User.objects.create(username='viewer')
+        self.post = Post.objects.create(author=self.viewer, content='Hello')
+        self.client.force_authenticate(self.viewer)
+
+    def _make_users(self, count):
+        users = []
+        for i in range(count):
+            user = User.objects.create(username=f'spammer{User.objects.count()}')
+            Post.objects.create(author=user, content='spam')
+            Comment.objects.create(author=user, post=self.post, content='spam')
+            Friendship.objects.create(from_user=user, to_user=self.viewer)
+            users.append(user)
+        Post.objects.filter(pk=self.post.pk).update(comments_count=Comment.objects.filter(post=self.post).count())
+        return users
+
+    def _moderation_queries(self, user_ids):
+        with CaptureQueriesContext(connection) as ctx:
+            deactivate_users(user_ids)
+        return len(ctx.captured_queries)
+
+    def test_deactivation_is_set_based(self):
+        small = self._moderation_queries([user.id for user in self._make_users(2)])
+        large = self._moderation_queries([user.id for user in self._make_users(8)])
+        self.assertEqual(small, large)
+
+    def test_deactivation_hides_content_and_reactivation_restores_it(self):
+        spammer, other = self._make_users(2)
+        accepted = Friendship.objects.create(from_user=spammer, to_user=other, status='accepted')
+
+        report = deactivate_users([spammer.id])
+        self.assertEqual((report['users'], report['friend_requests'], report['posts'], report['comments']), (1, 1, 1, 1))
+        self.assertFalse(User.objects.get(pk=spammer.pk).is_active)
+        self.assertFalse(Friendship.objects.filter(from_user=spammer, status='pending').exists())
+        self.assertTrue(Friendship.objects.filter(pk=accepted.pk).exists())
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        feed_authors = {post['author']['id'] for post in self.client.get('/api/posts/').data['results']}
+        self.assertNotIn(spammer.id, feed_authors)
+        comments = self.client.get(f'/api/comments/post/{self.post.id}/').data['results']
+        self.assertEqual([c['author']['id'] for c in comments], [other.id])
+
+        reactivate_users([spammer.id])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+        self.assertTrue(Post.objects.filter(author=spammer, is_visible=True).exists())
+
+    def test_friend_requests_are_counted_across_batches(self):
+        users = self._make_users(5)
+        report = deactivate_users([user.id for user in users], batch_size=2)
+        self.assertEqual((report['users'], report['friend_requests']), (5, 5))
+
+    def test_superusers_are_skipped(self):
+        admin = User.objects.create(username='root', is_superuser=True)
+        self.assertEqual(deactivate_users([admin.id])['users'], 0)
+        self.assertTrue(User.objects.get(pk=admin.pk).is_active)
+
+    def test_single_save_and_sync_command(self):
+        spammer = self._make_users(1)[0]
+        self.client.force_authenticate(None)
+        self.client.get('/api/posts/')
+        spammer.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            spammer.save()
+        self.assertFalse(Comment.objects.get(author=spammer).is_visible)
+        self.assertFalse(Friendship.objects.filter(from_user=spammer, status='pending').exists())
+        # The cached anonymous feed is dropped
+        feed = self.client.get('/api/posts/')
+        self.assertEqual(feed['X-Cache'], 'MISS')
+        self.assertNotIn(spammer.id, {post['author']['id'] for post in feed.data['results']})
+
+        # Saves that leave is_active alone do not touch the content
+        spammer.first_name = 'Still blocked'
+        with CaptureQueriesContext(connection) as ctx:
+            spammer.save()
+        tables = ('posts_post', 'comments_comment', 'friends_friendship')
+        self.assertFalse([q['sql'] for q in ctx.captured_queries if any(t in q['sql'] for t in tables)])
+
+        # A raw update bypasses the signals; the sync command repairs it
+        User.objects.filter(pk=spammer.pk).update(is_active=True)
+        out = StringIO()
+        call_command('moderate_users', 'sync', stdout=out)
+        self.assertIn('posts: 1', out.getvalue())
+        self.assertTrue(Post.objects.get(author=spammer).is_visible)
+        self.assertTrue(Comment.objects.get(author=spammer).is_visible)
@@ -12,6 +12,8 @@ from .serializers import (
     PromoteUserRequestSerializer,
 )
 from .models import BlockedUser, UnblockRequest
+from lookbook.conditional import ConditionalGetMixin
+from lookbook.metrics import InstrumentedViewMixin, query_budget
 import os
 from drf_spectacular.utils import extend_schema, OpenApiResponse, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
@@ -43,13 +45,18 @@ class UserRegistrationView(generics.CreateAPIView):
     serializer_class = UserRegistrationSerializer
     permission_classes = [permissions.AllowAny]
 
-class UserProfileView(generics.RetrieveUpdateAPIView):
+class UserProfileView(InstrumentedViewMixin, ConditionalGetMixin, generics.RetrieveUpdateAPIView):
+    query_budget = 1
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
         return self.request.user
+
+    def get_etag_state(self, request, rows=None):
+        # The user is already loaded by authentication
+        return {'updated_at': request.user.updated_at}
     
     def perform_update(self, serializer):
         # Handle profile picture removal
@@ -66,7 +73,8 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
         
         serializer.save()
 
-class UserDetailView(generics.RetrieveAPIView):
+class UserDetailView(InstrumentedViewMixin, ConditionalGetMixin, generics.RetrieveAPIView):
+    query_budget = 2
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -237,6 +245,12 @@ def block_user(request, user_id):
         blocked=user_to_block
     )
     
+    from posts.timeline import sync_timeline
+    from friends.suggestions import discard_suggestion
+    sync_timeline(request.user.id, author_ids=[user_to_block.id])
+    sync_timeline(user_to_block.id, author_ids=[request.user.id])
+    discard_suggestion(request.user.id, user_to_block.id)
+    
     if created:
         return Response({'message': 'User blocked successfully'}, status=status.HTTP_201_CREATED)
     return Response({'message': 'User already blocked'}, status=status.HTTP_200_OK)
@@ -253,10 +267,14 @@ def unblock_user(request, user_id):
     try:
         blocked = BlockedUser.objects.get(blocker=request.user, blocked=user_to_unblock)
         blocked.delete()
+        from posts.timeline import sync_timeline
+        sync_timeline(request.user.id, author_ids=[user_to_unblock.id])
+        sync_timeline(user_to_unblock.id, author_ids=[request.user.id])
         return Response({'message': 'User unblocked successfully'}, status=status.HTTP_200_OK)
     except BlockedUser.DoesNotExist:
         return Response({'error': 'User is not blocked'}, status=status.HTTP_400_BAD_REQUEST)
 
+@query_budget(1)
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def blocked_users_list(request):
@@ -85,7 +85,9 @@ export const authAPI = {
 
 // Posts API
 export const postsAPI = {
-  getPosts: (page = 1) => api.get(`/posts/?page=${page}`),
+  // Pass the opaque `cursor` from a previous response's `next` link to load more
+  getPosts: (cursor) => api.get('/posts/', { params: cursor ? { cursor } : {} }),
+  getTimeline: (cursor) => api.get('/posts/timeline/', { params: cursor ? { cursor } : {} }),
   getPost: (id) => api.get(`/posts/${id}/`),
   createPost: (data) => {
     const config = data instanceof FormData 
@@ -162,4 +164,42 @@ export const blockAPI = {
   getBlockedUsers: () => api.get('/users/blocked/'),
 }
 
+// Live updates (server-sent events). onEvent receives deltas such as
+// { type: 'like', post, likes_count }; on { type: 'reset' } refetch what is shown.
+// Returns a function that closes the stream.
+const EVENTS_BASE_URL = import.meta.env.VITE_EVENTS_BASE_URL || API_BASE_URL
+
+export const eventsAPI = {
+  subscribe: ({ posts = [], groups = [] } = {}, onEvent) => {
+    let source = null
+    let closed = false
+
+    const connect = async () => {
+      try {
+        // EventSource cannot send the Authorization header, so trade it for a short-lived ticket
+        const { data } = await api.post('/events/ticket/')
+        if (closed) return
+        const params = new URLSearchParams({ ticket: data.ticket })
+        if (posts.length) params.set('posts', posts.join(','))
+        if (groups.length) params.set('groups', groups.join(','))
+        source = new EventSource(`${EVENTS_BASE_URL}/events/?${params}`)
+        source.onmessage = (message) => onEvent(JSON.parse(message.data))
+        source.onerror = () => {
+          // Streams end every few minutes and tickets expire: reconnect with a new ticket
+          source.close()
+          if (!closed) setTimeout(connect, 3000)
+        }
+      } catch {
+        if (!closed) setTimeout(connect, 10000)
+      }
+    }
+
+    connect()
+    return () => {
+      closed = true
+      source?.close()
+    }
+  },
+}
+
 export default api